@@ -122,13 +122,19 @@ async function loadStats() {
     }
 }
 
-// Load verifications
+// Load verifications, page by page
 async function loadVerifications() {
-    const response = await apiCall('/verifications/');
-    if (response) {
-        verifications = response.verifications;
-        renderVerificationsTable(verifications);
-    }
+    const loaded = [];
+    let cursor = null;
+    do {
+        const query = cursor ? `?page_size=200&cursor=${encodeURIComponent(cursor)}` : '?page_size=200';
+        const response = await apiCall(`/verifications/${query}`);
+        if (!response) return;
+        loaded.push(...response.results);
+        cursor = response.next;
+    } while (cursor);
+    verifications = loaded;
+    renderVerificationsTable(verifications);
 }
 
 // Render verifications table
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("admin_site", "0002_alter_adminuser_managers_alter_adminuser_username"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="systemlog",
+            index=models.Index(
+                fields=["timestamp", "id"], name="system_log_timestamp_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="verificationrequest",
+            index=models.Index(
+                fields=["submitted_at", "id"], name="verification_submitted_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="verificationrequest",
+            index=models.Index(
+                fields=["status", "submitted_at", "id"], name="verification_status_idx"
+            ),
+        ),
+    ]
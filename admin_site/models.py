@@ -75,6 +75,11 @@ class VerificationRequest(models.Model):
         verbose_name = "Verification Request"
         verbose_name_plural = "Verification Requests"
         ordering = ['-submitted_at']
+        indexes = [
+            # keyset pages of the list, all and per status (see backend/pagination.py)
+            models.Index(fields=["submitted_at", "id"], name="verification_submitted_idx"),
+            models.Index(fields=["status", "submitted_at", "id"], name="verification_status_idx"),
+        ]
     
     def __str__(self):
         return f"Verification for {self.user_full_name} ({self.user_email}) - {self.status}"
@@ -118,6 +123,9 @@ class SystemLog(models.Model):
         verbose_name = "System Log"
         verbose_name_plural = "System Logs"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=["timestamp", "id"], name="system_log_timestamp_idx"),
+        ]
     
     def __str__(self):
         return f"{self.admin_user.full_name} - {self.action} - {self.timestamp}"
@@ -11,6 +11,7 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 import os
 
+from backend import pagination
 from .models import AdminUser, VerificationRequest, SystemLog
 from .serializers import (
     AdminUserSerializer, AdminLoginSerializer, VerificationRequestSerializer,
@@ -152,7 +153,8 @@ def admin_dashboard_stats(request):
 @permission_classes([IsAuthenticated])
 def verification_requests_list(request):
     """
-    Get all verification requests with filtering
+    Get verification requests with filtering, newest first
+    - Pages of page_size (default 50, at most 200), the next one with cursor
     """
     if not isinstance(request.user, AdminUser):
         return Response({
@@ -163,7 +165,7 @@ def verification_requests_list(request):
     status_filter = request.GET.get('status', '')
     search_query = request.GET.get('search', '')
     
-    queryset = VerificationRequest.objects.all()
+    queryset = VerificationRequest.objects.select_related('reviewed_by')
     
     # Filter by status
     if status_filter and status_filter != 'all':
@@ -176,14 +178,19 @@ def verification_requests_list(request):
             models.Q(user_email__icontains=search_query)
         )
     
-    # Order by submitted date (newest first)
-    queryset = queryset.order_by('-submitted_at')
+    # Page by submitted date (newest first)
+    try:
+        verifications, next_cursor = pagination.paginate(
+            queryset, request.GET, ('submitted_at', 'id'), descending=True
+        )
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    serializer = VerificationRequestSerializer(queryset, many=True)
+    serializer = VerificationRequestSerializer(verifications, many=True)
     
-    return Response({
-        'verifications': serializer.data
-    }, status=status.HTTP_200_OK)
+    return Response(pagination.page(serializer.data, next_cursor), status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -397,7 +404,8 @@ def update_verification(request, verification_id):
 @permission_classes([IsAuthenticated])
 def system_logs(request):
     """
-    Get system logs for audit purposes
+    Get system logs for audit purposes, newest first
+    - Pages of page_size (default 100, at most 500), the next one with cursor
     """
     if not isinstance(request.user, AdminUser):
         return Response({
@@ -410,12 +418,18 @@ def system_logs(request):
             'error': 'Access denied. Super admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    logs = SystemLog.objects.all()[:100]  # Limit to last 100 logs
+    try:
+        logs, next_cursor = pagination.paginate(
+            SystemLog.objects.select_related('admin_user'), request.GET, ('timestamp', 'id'),
+            descending=True, default_size=100, max_size=500
+        )
+    except ValueError as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     serializer = SystemLogSerializer(logs, many=True)
     
-    return Response({
-        'logs': serializer.data
-    }, status=status.HTTP_200_OK)
+    return Response(pagination.page(serializer.data, next_cursor), status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
@@ -2,6 +2,8 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The live queue streams (/api/operations/queue/stream/...) are async views and
+should be served through this entry point, e.g. ``uvicorn backend.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
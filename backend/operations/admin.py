@@ -1,11 +1,17 @@
 from django.contrib import admin
 from .models import (
     AppointmentManagement,
+    DoctorWorkingHours,
     MedicineInventory,
     Messaging,
     Notification,
+    PatientFlow,
     PriorityQueue,
+    QueueEvent,
+    QueueHistory,
     QueueManagement,
+    ServiceTimeQuantile,
+    ServiceTimeStats,
 )
 
 
@@ -23,6 +29,48 @@ class QueueManagementAdmin(admin.ModelAdmin):
     search_fields = ('patient__user__full_name', 'queue_number')
 
 
+@admin.register(ServiceTimeStats)
+class ServiceTimeStatsAdmin(admin.ModelAdmin):
+    list_display = ('department', 'sample_count', 'mean_seconds', 'ewma_seconds', 'updated_at')
+    readonly_fields = ('sample_count', 'mean_seconds', 'm2_seconds', 'ewma_seconds', 'updated_at')
+
+
+@admin.register(ServiceTimeQuantile)
+class ServiceTimeQuantileAdmin(admin.ModelAdmin):
+    list_display = ('department', 'weekday', 'hour', 'sample_count', 'p50_seconds', 'p90_seconds', 'built_at')
+    list_filter = ('department', 'weekday')
+
+
+@admin.register(PatientFlow)
+class PatientFlowAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'flow', 'current_stage', 'status', 'stages_completed', 'started_at', 'flow_time')
+    list_filter = ('flow', 'status', 'current_stage')
+    search_fields = ('patient__user__full_name',)
+
+
+@admin.register(QueueEvent)
+class QueueEventAdmin(admin.ModelAdmin):
+    list_display = ('occurred_at', 'event_type', 'lane', 'entry_id', 'department', 'patient')
+    list_filter = ('event_type', 'lane', 'department')
+    search_fields = ('entry_id',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(QueueHistory)
+class QueueHistoryAdmin(admin.ModelAdmin):
+    list_display = ('queue_date', 'department', 'queue_number', 'lane', 'patient', 'status', 'archived_at')
+    list_filter = ('department', 'lane', 'status', 'queue_date')
+    search_fields = ('patient__user__full_name',)
+
+
 @admin.register(MedicineInventory)
 class MedicineInventoryAdmin(admin.ModelAdmin):
     list_display = ('medicine_name', 'current_stock', 'unit_price', 'expiry_date', 'is_expired')
@@ -38,6 +86,13 @@ class AppointmentManagementAdmin(admin.ModelAdmin):
     search_fields = ('patient__user__full_name', 'doctor__user__full_name')
 
 
+@admin.register(DoctorWorkingHours)
+class DoctorWorkingHoursAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekday', 'start_time', 'end_time')
+    list_filter = ('weekday',)
+    search_fields = ('doctor__user__full_name',)
+
+
 @admin.register(PriorityQueue)
 class PriorityQueueAdmin(admin.ModelAdmin):
     list_display = ('patient', 'priority_level', 'queue_number', 'created_at')
@@ -0,0 +1,108 @@
+"""
+Doctor appointment calendar.
+
+Month and date-range reads filter appointment_date with a half-open range
+between local midnights (``>= start`` and ``< end``) rather than ``__date``
+or ``__month`` lookups, which wrap the column in a function the database
+cannot match against an index. With the (doctor, appointment_date) index a
+doctor's month is one index range scan.
+
+``day_counts`` groups a range by local day, status and type in a single
+aggregate query, so a month grid gets a few small rows per day instead of
+every appointment.
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AppointmentManagement
+
+# longest range one request may ask for, in days
+MAX_RANGE_DAYS = 366
+
+
+def month_range(year, month):
+    """
+    First day of the month and first day of the next one.
+    """
+    start = date(year, month, 1)
+    return start, start + timedelta(days=calendar.monthrange(year, month)[1])
+
+
+def requested_range(params):
+    """
+    ``(start, end)`` dates, end exclusive, from ``year`` and ``month`` or
+    from ``start`` and ``end`` (YYYY-MM-DD, end inclusive). None when the
+    parameters ask for no range. Raises ValueError for invalid ones.
+    """
+    if params.get("year") or params.get("month"):
+        try:
+            return month_range(int(params.get("year")), int(params.get("month")))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid year or month")
+
+    if not (params.get("start") or params.get("end")):
+        return None
+    try:
+        start = datetime.strptime(params.get("start", ""), "%Y-%m-%d").date()
+        end = datetime.strptime(params.get("end", ""), "%Y-%m-%d").date() + timedelta(days=1)
+    except ValueError:
+        raise ValueError("Invalid start or end date, use YYYY-MM-DD")
+    if end <= start:
+        raise ValueError("End date is before start date")
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f"Date range is longer than {MAX_RANGE_DAYS} days")
+    return start, end
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def appointments_between(doctor_id, start, end):
+    """
+    Appointments of a doctor from local day ``start`` up to, not including,
+    ``end``.
+    """
+    return AppointmentManagement.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date__gte=local_midnight(start),
+        appointment_date__lt=local_midnight(end),
+    )
+
+
+def day_counts(doctor_id, start, end):
+    """
+    One entry per day of the range with the total and the counts by status
+    and by type, zeros included.
+    """
+    rows = (
+        appointments_between(doctor_id, start, end)
+        .annotate(day=TruncDate("appointment_date", tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values("day", "status", "appointment_type")
+        .annotate(count=Count("appointment_id"))
+    )
+
+    statuses = [value for value, _ in AppointmentManagement._meta.get_field("status").choices]
+    types = [value for value, _ in AppointmentManagement._meta.get_field("appointment_type").choices]
+    days = {}
+    for offset in range((end - start).days):
+        day = start + timedelta(days=offset)
+        days[day] = {
+            "date": day.isoformat(),
+            "total": 0,
+            "by_status": dict.fromkeys(statuses, 0),
+            "by_type": dict.fromkeys(types, 0),
+        }
+    for row in rows:
+        counts = days[row["day"]]
+        counts["total"] += row["count"]
+        counts["by_status"][row["status"]] = counts["by_status"].get(row["status"], 0) + row["count"]
+        counts["by_type"][row["appointment_type"]] = (
+            counts["by_type"].get(row["appointment_type"], 0) + row["count"]
+        )
+    return list(days.values())
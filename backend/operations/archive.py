@@ -0,0 +1,190 @@
+"""
+Hot/cold split of the queue tables.
+
+The queue tables only need today's active entries; everything the waiting
+queries filter out is dead weight in their indexes. ``archive`` moves
+finished entries, and whatever is left over from earlier days, into the
+``queue_history`` table in batches. It is meant to run after hours (see the
+archive_queue command): the scheduler reads today's calls from the queue
+tables.
+
+``history`` reads both sides, so callers do not need to know whether an
+entry has been archived yet. It pages newest first by the key
+(enqueue_time, lane, entry_id), which orders active and archived entries
+alike, so each page is an indexed range read of every source after the
+previous page's last key (see backend/pagination.py).
+"""
+import heapq
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from backend import pagination
+
+from .models import QueueHistory
+from . import events, scheduler
+
+FINISHED_STATUSES = ["completed", "cancelled"]
+# order of history pages, newest first
+HISTORY_KEYS = ("enqueue_time", "lane", "entry_id")
+
+# columns every history row has, whichever table it is read from
+HISTORY_FIELDS = [
+    "patient_id", "department", "queue_number", "queue_date", "status",
+    "started_at", "finished_at", "actual_wait_time", "served_by_id",
+]
+
+
+def archivable(model, today=None):
+    today = today or timezone.localdate()
+    return model.objects.filter(Q(status__in=FINISHED_STATUSES) | Q(queue_date__lt=today))
+
+
+def to_history(lane, entry, archived_at):
+    return QueueHistory(
+        lane=lane,
+        entry_id=entry.id,
+        priority_level=getattr(entry, "priority_level", ""),
+        enqueue_time=entry.enqueue_time if lane == "normal" else entry.created_at,
+        archived_at=archived_at,
+        **{field: getattr(entry, field) for field in HISTORY_FIELDS},
+    )
+
+
+def delete_rows(model, ids):
+    """
+    Delete queue rows by id. No table references the queue tables, so one
+    plain DELETE leaves nothing behind, while ``QuerySet.delete()`` would
+    add a SELECT and one post_delete signal per row, each a queue version
+    bump and broadcast. Should a relation to them ever be added, the
+    deletion collector is used so its cascades still run.
+    """
+    if model._meta.related_objects:
+        model.objects.filter(id__in=ids).delete()
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)} "
+            f"WHERE {connection.ops.quote_name(model._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+def archive(today=None, batch_size=1000):
+    """
+    Move archivable entries of both queues to the history table, one batch
+    per transaction. A batch that already reached the history table before
+    an interrupted run is skipped on insert and still removed.
+    Returns the number of moved entries per lane.
+    """
+    moved = {}
+    departments = set()
+    for lane, model in scheduler.LANES.items():
+        moved[lane] = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    archivable(model, today).filter(id__gt=last_id).order_by("id")[:batch_size]
+                )
+                if not batch:
+                    break
+                archived_at = timezone.now()
+                QueueHistory.objects.bulk_create(
+                    [to_history(lane, entry, archived_at) for entry in batch],
+                    ignore_conflicts=True,
+                )
+                # no per-row signals, the changed departments are reported once below
+                delete_rows(model, [entry.id for entry in batch])
+            last_id = batch[-1].id
+            moved[lane] += len(batch)
+            departments.update(entry.department for entry in batch)
+
+    for department in departments:
+        events.queue_changed(department)
+    return moved
+
+
+def _filtered(queryset, department=None, patient_id=None, start=None, end=None, status=None):
+    if department:
+        queryset = queryset.filter(department=department)
+    if patient_id:
+        queryset = queryset.filter(patient_id=patient_id)
+    if start:
+        queryset = queryset.filter(queue_date__gte=start)
+    if end:
+        queryset = queryset.filter(queue_date__lte=end)
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def decode_history_cursor(cursor):
+    return pagination.decode_cursor(cursor, QueueHistory, HISTORY_KEYS)
+
+
+def _after_active(lane, time_field, after):
+    """
+    Entries of one lane's queue table that come after the ``after`` key
+    in newest-first history order.
+    """
+    time, after_lane, entry_id = after
+    if lane < after_lane:
+        return Q(**{f"{time_field}__lte": time})
+    if lane > after_lane:
+        return Q(**{f"{time_field}__lt": time})
+    # the first term bounds the index range, see pagination.after
+    return Q(**{f"{time_field}__lte": time}) & (Q(**{f"{time_field}__lt": time}) | Q(**{time_field: time, "id__lt": entry_id}))
+
+
+def history(department=None, patient_id=None, start=None, end=None, status=None, limit=100, after=None):
+    """
+    Queue entries of both queues, active and archived, newest first, from
+    the ``after`` key of the previous page on. Each source is read with its
+    own indexed query limited to ``limit + 1`` rows and the three sorted
+    results are merged. Returns the page and the cursor of the next one,
+    None on the last page.
+    """
+    filters = {
+        "department": department, "patient_id": patient_id,
+        "start": start, "end": end, "status": status,
+    }
+    normal = _filtered(scheduler.LANES["normal"].objects.all(), **filters)
+    priority = _filtered(scheduler.LANES["priority"].objects.all(), **filters)
+    archived = _filtered(QueueHistory.objects.all(), **filters)
+    if after is not None:
+        normal = normal.filter(_after_active("normal", "enqueue_time", after))
+        priority = priority.filter(_after_active("priority", "created_at", after))
+        archived = archived.filter(pagination.after(HISTORY_KEYS, after, descending=True))
+
+    sources = [
+        _rows(
+            normal.order_by("-enqueue_time", "-id")
+            .values("enqueue_time", *HISTORY_FIELDS, entry_id=F("id"))[:limit + 1],
+            lane="normal", priority_level="", archived=False,
+        ),
+        _rows(
+            priority.order_by("-created_at", "-id")
+            .values("priority_level", *HISTORY_FIELDS, entry_id=F("id"), enqueue_time=F("created_at"))[:limit + 1],
+            lane="priority", archived=False,
+        ),
+        _rows(
+            archived.order_by("-enqueue_time", "-lane", "-entry_id")
+            .values("lane", "entry_id", "priority_level", "enqueue_time", *HISTORY_FIELDS)[:limit + 1],
+            archived=True,
+        ),
+    ]
+    merged = heapq.merge(*sources, key=lambda row: pagination.key_values(row, HISTORY_KEYS), reverse=True)
+    rows = list(islice(merged, limit + 1))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, pagination.encode_cursor(pagination.key_values(rows[-1], HISTORY_KEYS))
+
+
+def _rows(rows, **extra):
+    for row in rows:
+        row.update(extra)
+        yield row
@@ -0,0 +1,115 @@
+"""
+Public display boards for lobby TVs and kiosks.
+
+A board shows who is being served and the next few queue numbers of a
+department, no names. The payload is built once per queue version and
+cached (see queue_cache.py), so a screen polling an unchanged queue costs
+two cache reads and no queries, and the version and time step are the
+ETag.
+
+Screens can long-poll: with ``?wait=<seconds>`` and the ETag they already
+show in If-None-Match, the request is held until the queue changes or the
+wait runs out (then 304). Held requests wait on an event-broker
+subscription like the queue streams and need an ASGI server to scale.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import QueueManagement
+from . import events, queue_cache, scheduler
+
+# how many numbers "now serving" and "next" show
+BOARD_SIZE = 5
+LONG_POLL_MAX_SECONDS = 30
+
+
+def _departments():
+    return dict(QueueManagement._meta.get_field("department").choices)
+
+
+def board_label(lane, queue_number):
+    return f"P{queue_number}" if lane == "priority" else str(queue_number)
+
+
+def build_board(department):
+    serving = []
+    waiting = 0
+    for lane, model in scheduler.LANES.items():
+        rows = (
+            model.objects.filter(department=department, status="in_progress")
+            .order_by("-started_at")
+            .values_list("queue_number", "started_at")[:BOARD_SIZE]
+        )
+        serving.extend((started_at, lane, queue_number) for queue_number, started_at in rows)
+        waiting += model.objects.filter(department=department, status="waiting").count()
+    serving.sort(reverse=True)
+
+    return {
+        "department": department,
+        "department_name": _departments()[department],
+        "now_serving": [
+            {"label": board_label(lane, number), "lane": lane}
+            for _, lane, number in serving[:BOARD_SIZE]
+        ],
+        "next": [
+            {"label": board_label(lane, entry.queue_number), "lane": lane}
+            for lane, entry in scheduler.next_patients(department, limit=BOARD_SIZE)
+        ],
+        "waiting": waiting,
+    }
+
+
+def board_snapshot(department, version):
+    return queue_cache.cached_snapshot("board", department, lambda: build_board(department), version)
+
+
+def _wait_seconds(request):
+    try:
+        wait = float(request.GET.get("wait", 0))
+    except ValueError:
+        return 0
+    # nan would pass both bounds below and hold the request forever
+    if not math.isfinite(wait):
+        return 0
+    return min(max(wait, 0), LONG_POLL_MAX_SECONDS)
+
+
+@require_GET
+async def display_board(request, department):
+    """
+    Board of a department, answered with 304 while the queue is unchanged.
+    """
+    if department not in _departments():
+        return JsonResponse({"error": "Invalid department"}, status=404)
+
+    if_none_match = request.headers.get("If-None-Match")
+    # the board also changes when the time step runs out (see queue_cache)
+    wait = min(_wait_seconds(request), queue_cache.seconds_to_next_step()) if if_none_match else 0
+    broker = events.get_broker()
+    # subscribe before reading the version so no change can slip in between
+    subscription = broker.subscribe(events.department_channel(department)) if wait else None
+    try:
+        version = queue_cache.get_version(department)
+        if subscription is not None and queue_cache.etag_matches(
+            if_none_match, queue_cache.etag(department, version)
+        ):
+            message = await subscription.get(timeout=wait)
+            if message is not None:
+                version = message["version"]
+    finally:
+        if subscription is not None:
+            broker.unsubscribe(subscription)
+
+    etag = queue_cache.etag(department, version)
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if queue_cache.etag_matches(if_none_match, etag):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    version, payload = await sync_to_async(board_snapshot)(department, version)
+    return JsonResponse({**payload, "version": version}, headers=headers)
@@ -0,0 +1,100 @@
+"""
+Concurrent appointment booking, shared by the appointment_booking_stress
+command and the booking tests.
+
+Every booker is a thread with its own database connection. The bookers
+wait on a barrier and then book their ``(start, end)`` spans of one
+doctor at the same time. A booking that fails with a database error (e.g.
+SQLite's busy timeout under write contention) is retried a few times with
+a short pause. A booker that runs out of attempts records the failure
+instead of spinning.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.db import connections
+from django.db.utils import OperationalError
+
+from .models import AppointmentManagement
+from . import bookings
+
+MAX_ATTEMPTS = 20
+RETRY_SECONDS = 0.05
+
+
+def book(doctor_id, patient_id, start, end, use_save=False):
+    """
+    Book one appointment through ``bookings.book_many`` or ``Model.save()``.
+    Returns its id, or None when the time is taken.
+    """
+    if use_save:
+        try:
+            appointment = AppointmentManagement.objects.create(
+                patient_id=patient_id, doctor_id=doctor_id, appointment_date=start, appointment_end=end,
+            )
+        except ValueError:
+            return None
+        return appointment.appointment_id
+    result, = bookings.book_many(doctor_id, [{
+        "patient_id": patient_id, "appointment_date": start,
+        "appointment_end": end, "appointment_type": "consultation",
+    }])
+    return result.get("appointment_id")
+
+
+class Booker(threading.Thread):
+
+    def __init__(self, doctor_id, patient_id, spans, barrier, use_save=False):
+        super().__init__()
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+        self.spans = spans
+        self.barrier = barrier
+        self.use_save = use_save
+        self.booked = []
+        self.rejected = 0
+        # database errors that were retried
+        self.errors = Counter()
+        # bookings given up on, and unexpected exceptions
+        self.failures = []
+
+    def book(self, start, end):
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return book(self.doctor_id, self.patient_id, start, end, self.use_save)
+            except OperationalError as error:
+                self.errors[str(error)] += 1
+                time.sleep(RETRY_SECONDS * (attempt + 1))
+        raise OperationalError(f"Booking at {start} failed {MAX_ATTEMPTS} times")
+
+    def run(self):
+        try:
+            self.barrier.wait()
+            for start, end in self.spans:
+                appointment_id = self.book(start, end)
+                if appointment_id is None:
+                    self.rejected += 1
+                else:
+                    self.booked.append(appointment_id)
+        except Exception as error:
+            self.failures.append(error)
+        finally:
+            connections.close_all()
+
+
+def run_bookers(doctor_id, spans_by_patient, use_save=False):
+    """
+    Let one booker per ``{patient_id: spans}`` item book at the same time.
+    Returns the finished bookers.
+    """
+    barrier = threading.Barrier(len(spans_by_patient))
+    bookers = [
+        Booker(doctor_id, patient_id, spans, barrier, use_save)
+        for patient_id, spans in spans_by_patient.items()
+    ]
+    for booker in bookers:
+        booker.start()
+    for booker in bookers:
+        booker.join()
+    return bookers
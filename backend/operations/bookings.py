@@ -0,0 +1,367 @@
+"""
+Booking appointments, one or in batches, without double-booking a doctor.
+
+An appointment is the interval ``[appointment_date, appointment_end)``.
+Two booked appointments of a doctor overlap when each starts before the
+other ends. Appointments are at most MAX_DURATION long, so the overlap
+query also bounds the start from below and stays a short range scan of
+the (doctor, appointment_date, appointment_end) index instead of reading
+every earlier appointment of the doctor.
+
+The check and the insert must not interleave with another booking of the
+same doctor and day. Every booking transaction therefore first updates the
+DoctorDayLock row of each day it touches. On databases with row locks the
+update holds the row until commit. SQLite takes its single write lock.
+
+A follow-up series or a list of appointments is validated in one
+set-based pass: one query for the patients, one read of the doctor's free
+slot bitmaps for the whole date span (see slots.py), and the slots taken by
+earlier items of the same batch. The accepted items are then locked,
+checked against the appointments in the database with one overlap query,
+numbered with one block reservation per day from the doctor's daily
+sequence (see sequences.py), and written with one ``bulk_create``. Every item gets a result, so a
+caller can tell which dates of a series were booked and why the others
+were not.
+
+Edits go through ``update_appointment`` rather than ``save()``: one
+conditional UPDATE of the changed columns that only matches the row
+version the editor read, so of two concurrent edits the second gets a
+Conflict instead of silently overwriting the first.
+"""
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from backend.users.models import PatientProfile
+
+from .models import AppointmentManagement, DoctorDayLock
+from . import sequences, slots
+
+# most appointments one batch may create
+MAX_BATCH_SIZE = 100
+# longest appointment, bounds how far back an overlap check looks
+MAX_DURATION = timedelta(hours=4)
+BOOKED_STATUSES = slots.BOOKED_STATUSES
+APPOINTMENT_TYPES = [value for value, _ in AppointmentManagement._meta.get_field("appointment_type").choices]
+APPOINTMENT_STATUSES = [value for value, _ in AppointmentManagement._meta.get_field("status").choices]
+# fields a partial update may change
+EDITABLE_FIELDS = ("status", "appointment_type", "appointment_date", "appointment_end")
+
+STALE_VERSION = "The appointment was changed by someone else, reload it"
+
+_ETAG = re.compile(r'^(?:W/)?"appointment-(\d+)-(\d+)"$')
+
+
+class Conflict(Exception):
+    """
+    An update lost to another one: the appointment changed since the
+    version the caller read, or its new time was taken.
+    """
+
+
+def parse_appointment_date(value):
+    """
+    Aware datetime from an ISO date and time, local time when it has no
+    offset. Raises ValueError.
+    """
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError("Invalid appointment date, use YYYY-MM-DDTHH:MM")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def recurrence_dates(start, count, every_days=7):
+    """
+    ``count`` dates from ``start``, ``every_days`` apart, at the same local
+    time of day.
+    """
+    if not 1 <= count <= MAX_BATCH_SIZE:
+        raise ValueError(f"count must be between 1 and {MAX_BATCH_SIZE}")
+    if every_days < 1:
+        raise ValueError("every_days must be at least 1")
+    local = timezone.localtime(start)
+    return [
+        timezone.make_aware(local.replace(tzinfo=None) + timedelta(days=every_days * n))
+        for n in range(count)
+    ]
+
+
+def default_duration():
+    return timedelta(minutes=slots.slot_minutes())
+
+
+def check_duration(start, end):
+    if end <= start:
+        raise ValueError("Appointment end must be after its start.")
+    if end - start > MAX_DURATION:
+        raise ValueError(f"Appointments cannot be longer than {MAX_DURATION.total_seconds() / 3600:g} hours.")
+
+
+def _overlaps(start, end):
+    return Q(appointment_date__gt=start - MAX_DURATION, appointment_date__lt=end, appointment_end__gt=start)
+
+
+def overlapping(doctor_id, start, end):
+    """
+    Booked appointments of a doctor that overlap ``[start, end)``.
+    """
+    return AppointmentManagement.objects.filter(
+        _overlaps(start, end), doctor_id=doctor_id, status__in=BOOKED_STATUSES
+    )
+
+
+def lock_doctor_days(doctor_id, spans):
+    """
+    Lock the days of a doctor that the ``(start, end)`` spans touch until
+    the current transaction ends, with two statements whatever the number
+    of days.
+    """
+    days = set()
+    for start, end in spans:
+        day = timezone.localdate(start)
+        while day <= timezone.localdate(end - timedelta(microseconds=1)):
+            days.add(day)
+            day += timedelta(days=1)
+
+    DoctorDayLock.objects.bulk_create(
+        [DoctorDayLock(doctor_id=doctor_id, day=day) for day in sorted(days)], ignore_conflicts=True
+    )
+    DoctorDayLock.objects.filter(doctor_id=doctor_id, day__in=days).update(lock_count=F("lock_count") + 1)
+
+
+def number_appointments(doctor_id, appointments):
+    """
+    Give unsaved appointments of a doctor their day and queue number, with
+    one block of numbers reserved per day from the doctor's daily sequence.
+    """
+    by_day = defaultdict(list)
+    for appointment in appointments:
+        appointment.appointment_day = timezone.localdate(appointment.appointment_date)
+        by_day[appointment.appointment_day].append(appointment)
+    numbers = sequences.reserve_days(
+        sequences.appointment_scope(doctor_id), {day: len(group) for day, group in by_day.items()}
+    )
+    for day, group in by_day.items():
+        for appointment, number in zip(group, numbers[day]):
+            appointment.queue_number = number
+    return appointments
+
+
+def _slot_conflicts(doctor_id, items, masks):
+    """
+    Indexes of the items whose slots are not free in ``masks`` or are taken
+    by an earlier item of the batch.
+    """
+    taken = defaultdict(int)
+    conflicts = set()
+    for index, item in items:
+        day = timezone.localdate(item["appointment_date"])
+        needed = slots.span_mask(item["appointment_date"], item["appointment_end"])
+        if masks[(doctor_id, day)] & needed != needed or taken[day] & needed:
+            conflicts.add(index)
+        else:
+            taken[day] |= needed
+    return conflicts
+
+
+def _overlap_conflicts(doctor_id, items):
+    """
+    Indexes of the items that overlap a booked appointment in the database
+    or an earlier item of the batch, read with one overlap query.
+    """
+    spans = Q()
+    for _, item in items:
+        spans |= _overlaps(item["appointment_date"], item["appointment_end"])
+    booked = list(
+        AppointmentManagement.objects.filter(spans, doctor_id=doctor_id, status__in=BOOKED_STATUSES)
+        .values_list("appointment_date", "appointment_end")
+    )
+    conflicts = set()
+    for index, item in items:
+        start, end = item["appointment_date"], item["appointment_end"]
+        if any(other_start < end and start < other_end for other_start, other_end in booked):
+            conflicts.add(index)
+        else:
+            booked.append((start, end))
+    return conflicts
+
+
+def book_many(doctor_id, items, all_or_nothing=False):
+    """
+    Book appointments with a doctor. ``items`` are dicts with
+    ``patient_id``, ``appointment_date`` (aware datetime),
+    ``appointment_type`` and optionally ``appointment_end``. Returns one
+    result per item, in order:
+    ``{"index", "appointment_date", "status", "appointment_id" | "error"}``
+    where status is created, rejected, or not_created when
+    ``all_or_nothing`` stopped an otherwise valid item.
+    """
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} appointments can be booked at once")
+
+    now = timezone.now()
+    for item in items:
+        if item.get("appointment_end") is None:
+            item["appointment_end"] = item["appointment_date"] + default_duration()
+    patients = set(
+        PatientProfile.objects.filter(id__in={item["patient_id"] for item in items}).values_list("id", flat=True)
+    )
+    errors = {}
+    for index, item in enumerate(items):
+        if item["patient_id"] not in patients:
+            errors[index] = "Patient not found"
+        elif item["appointment_type"] not in APPOINTMENT_TYPES:
+            errors[index] = "Invalid appointment type"
+        elif item["appointment_date"] < now:
+            errors[index] = "Appointment date cannot be in the past"
+        else:
+            try:
+                check_duration(item["appointment_date"], item["appointment_end"])
+            except ValueError as e:
+                errors[index] = str(e)
+
+    candidates = [(index, item) for index, item in enumerate(items) if index not in errors]
+    created = {}
+    if candidates:
+        days = [timezone.localdate(item["appointment_date"]) for _, item in candidates]
+        span = (min(days), max(days) + timedelta(days=1))
+        for index in _slot_conflicts(doctor_id, candidates, slots.day_masks([doctor_id], *span)):
+            errors[index] = "The doctor has no free slot at this time"
+        candidates = [(index, item) for index, item in candidates if index not in errors]
+
+    if candidates and not (all_or_nothing and errors):
+        with transaction.atomic():
+            lock_doctor_days(doctor_id, [(item["appointment_date"], item["appointment_end"]) for _, item in candidates])
+            # the cached bitmaps may be behind, check against the database
+            for index in _overlap_conflicts(doctor_id, candidates):
+                errors[index] = "The doctor already has an appointment at this time"
+            candidates = [(index, item) for index, item in candidates if index not in errors]
+            if candidates and not (all_or_nothing and errors):
+                appointments = AppointmentManagement.objects.bulk_create(number_appointments(doctor_id, [
+                    AppointmentManagement(
+                        patient_id=item["patient_id"],
+                        doctor_id=doctor_id,
+                        appointment_date=item["appointment_date"],
+                        appointment_time=timezone.localtime(item["appointment_date"]).time(),
+                        appointment_end=item["appointment_end"],
+                        appointment_type=item["appointment_type"],
+                        status="scheduled",
+                    )
+                    for _, item in candidates
+                ]))
+                created = {index: appointment for (index, _), appointment in zip(candidates, appointments)}
+                # bulk_create sends no signals
+                slots.invalidate(doctor_id)
+
+    results = []
+    for index, item in enumerate(items):
+        result = {"index": index, "appointment_date": timezone.localtime(item["appointment_date"]).isoformat()}
+        if index in created:
+            result.update(status="created", appointment_id=created[index].appointment_id)
+        elif index in errors:
+            result.update(status="rejected", error=errors[index])
+        else:
+            result.update(status="not_created", error="Another appointment of the batch was rejected")
+        results.append(result)
+    return results
+
+
+def appointment_etag(appointment_id, version):
+    return f'"appointment-{appointment_id}-{version}"'
+
+
+def version_from_etag(appointment_id, if_match):
+    """
+    Version named by an If-Match header for the appointment. Raises
+    ValueError when the header is not one of its ETags.
+    """
+    match = _ETAG.match(if_match.strip())
+    if match is None or int(match.group(1)) != appointment_id:
+        raise ValueError("If-Match is not an ETag of this appointment")
+    return int(match.group(2))
+
+
+def update_appointment(appointment_id, changes, version=None, doctor_id=None):
+    """
+    Apply ``changes`` (a dict of EDITABLE_FIELDS, dates as aware datetimes)
+    to an appointment with one conditional UPDATE of the changed columns,
+    only while its version is still ``version`` (any version when None).
+    With ``doctor_id``, only an appointment of that doctor is changed.
+    Returns the new version.
+
+    Moving the appointment or booking it again checks the new time against
+    the doctor's working hours, blocked dates and other appointments under
+    the doctor-day lock, like ``book_many``. A move to another day takes a
+    queue number on that day, and a moved appointment is reminded again.
+
+    Raises AppointmentManagement.DoesNotExist, Conflict, or ValueError for
+    invalid changes.
+    """
+    unknown = set(changes) - set(EDITABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot change {', '.join(sorted(unknown))}")
+    if not changes:
+        raise ValueError("Nothing to change")
+    values = {}
+    if "status" in changes:
+        if changes["status"] not in APPOINTMENT_STATUSES:
+            raise ValueError("Invalid status")
+        values["status"] = changes["status"]
+    if "appointment_type" in changes:
+        if changes["appointment_type"] not in APPOINTMENT_TYPES:
+            raise ValueError("Invalid appointment type")
+        values["appointment_type"] = changes["appointment_type"]
+    moving = "appointment_date" in changes or "appointment_end" in changes
+
+    appointments = AppointmentManagement.objects.filter(pk=appointment_id)
+    if doctor_id is not None:
+        appointments = appointments.filter(doctor_id=doctor_id)
+    with transaction.atomic():
+        if moving or values.get("status") in BOOKED_STATUSES:
+            current = appointments.values(
+                "doctor_id", "appointment_date", "appointment_end", "appointment_day", "status", "version"
+            ).get()
+            if version is not None and current["version"] != version:
+                raise Conflict(STALE_VERSION)
+            start = changes.get("appointment_date") or current["appointment_date"]
+            # a new start keeps the length unless a new end is given
+            end = changes.get("appointment_end") or start + (current["appointment_end"] - current["appointment_date"])
+            if moving:
+                if start < timezone.now():
+                    raise ValueError("Appointment date cannot be in the past")
+                check_duration(start, end)
+                values.update(
+                    appointment_date=start,
+                    appointment_time=timezone.localtime(start).time(),
+                    appointment_end=end,
+                    reminder_sent_at=None,
+                )
+                day = timezone.localdate(start)
+                if day != current["appointment_day"]:
+                    values.update(
+                        appointment_day=day,
+                        queue_number=sequences.reserve(sequences.appointment_scope(current["doctor_id"]), 1, day)[0],
+                    )
+            if values.get("status", current["status"]) in BOOKED_STATUSES:
+                lock_doctor_days(current["doctor_id"], [(start, end)])
+                rebooking = current["status"] not in BOOKED_STATUSES
+                if (moving or rebooking) and not slots.is_open(current["doctor_id"], start, end):
+                    raise Conflict("The doctor has no free slot at this time")
+                if overlapping(current["doctor_id"], start, end).exclude(pk=appointment_id).exists():
+                    raise Conflict("The doctor already has an appointment at this time")
+
+        conditional = appointments if version is None else appointments.filter(version=version)
+        if not conditional.update(**values, version=F("version") + 1, updated_at=timezone.now()):
+            if appointments.exists():
+                raise Conflict(STALE_VERSION)
+            raise AppointmentManagement.DoesNotExist
+        doctor_id, new_version = appointments.values_list("doctor_id", "version").get()
+        # update() sends no signals
+        if moving or "status" in values:
+            slots.invalidate(doctor_id)
+    return new_version
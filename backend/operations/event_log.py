@@ -0,0 +1,71 @@
+"""
+Recording of queue events.
+
+Every state change of a queue entry appends one ``QueueEvent`` in the same
+transaction that changes the row. An event stores the values of the fields
+it changed (``EVENT_FIELDS``), so replaying the events of an entry in order
+reproduces the row (see projections.py).
+"""
+from .models import QueueEvent
+
+# fields each event writes, by lane; attnames so foreign keys store their ids
+EVENT_FIELDS = {
+    "normal": {
+        "enqueue": ["queue_number", "queue_date", "sort_key", "status", "enqueue_time", "flow_id"],
+        "call": ["status", "started_at", "dequeue_time", "served_by_id"],
+        "start": ["status", "started_at", "dequeue_time"],
+        "complete": ["status", "started_at", "finished_at", "actual_wait_time"],
+        "cancel": ["status", "dequeue_time"],
+        "transfer": ["queue_number", "queue_date", "sort_key", "status", "enqueue_time"],
+        "reposition": ["sort_key"],
+    },
+    "priority": {
+        "enqueue": [
+            "appointment_id_id", "queue_number", "queue_date", "priority_level",
+            "priority_position", "skip_normal_queues", "status", "created_at",
+        ],
+        "call": ["status", "started_at", "served_by_id"],
+        "start": ["status", "started_at"],
+        "complete": ["status", "started_at", "finished_at", "actual_wait_time"],
+        "cancel": ["status"],
+        "transfer": ["queue_number", "queue_date", "priority_position", "status"],
+        "reposition": ["priority_position"],
+    },
+}
+
+
+def lane_of(entry):
+    return "normal" if entry._meta.model_name == "queuemanagement" else "priority"
+
+
+def build(event_type, entry, occurred_at=None, **data):
+    """
+    Unsaved event for an entry, carrying the entry's current values of the
+    fields the event type writes plus any ``data`` given.
+    """
+    lane = lane_of(entry)
+    values = {field: getattr(entry, field) for field in EVENT_FIELDS[lane][event_type]}
+    values.update(data)
+    event = QueueEvent(
+        event_type=event_type,
+        lane=lane,
+        entry_id=entry.id,
+        department=entry.department,
+        patient_id=entry.patient_id,
+        data=values,
+    )
+    if occurred_at is not None:
+        event.occurred_at = occurred_at
+    return event
+
+
+def record(event_type, entry, occurred_at=None, **data):
+    event = build(event_type, entry, occurred_at, **data)
+    event.save()
+    return event
+
+
+def record_many(event_type, entries, occurred_at=None):
+    return QueueEvent.objects.bulk_create(
+        [build(event_type, entry, occurred_at) for entry in entries], batch_size=500
+    )
@@ -0,0 +1,138 @@
+"""
+Queue change notifications.
+
+``queue_changed`` is the single place queue mutations are reported to. Once
+the mutating transaction commits it bumps the department version (see
+queue_cache.py) and publishes a message on the department channel of the
+event broker, which the streaming endpoints fan out to their subscribers.
+
+The broker is loaded from ``settings.QUEUE_EVENT_BROKER``. The default
+``InProcessBroker`` only reaches subscribers of the same process; a broker
+backed by an external pub/sub implements the same ``subscribe``,
+``unsubscribe`` and ``publish`` methods.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from . import queue_cache
+
+DEFAULT_BROKER = "backend.operations.events.InProcessBroker"
+
+
+def department_channel(department):
+    return f"department:{department}"
+
+
+class Subscription:
+    """
+    Messages of one channel for one consumer, delivered on the event loop
+    the subscription was created on.
+    """
+
+    def __init__(self, channel, max_pending):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.messages = asyncio.Queue(maxsize=max_pending)
+
+    def deliver(self, message):
+        # a slow consumer only needs the latest state, drop the oldest message
+        if self.messages.full():
+            self.messages.get_nowait()
+        self.messages.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """
+        Next message, or None when ``timeout`` seconds pass without one.
+        """
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Fans messages out to subscribers living in this process. ``publish`` can
+    be called from any thread, including sync views and signal handlers.
+    """
+
+    def __init__(self, max_pending=16):
+        self.max_pending = max_pending
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, self.max_pending)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscriptions.get(channel, ()))
+            return sum(len(subscribers) for subscribers in self._subscriptions.values())
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # the subscriber's event loop is gone
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, "QUEUE_EVENT_BROKER", DEFAULT_BROKER))()
+    return _broker
+
+
+def entry_summary(entry):
+    lane = "normal" if entry._meta.model_name == "queuemanagement" else "priority"
+    return {
+        "lane": lane,
+        "id": entry.id,
+        "queue_number": entry.queue_number,
+        "status": entry.status,
+    }
+
+
+def publish_change(department, entry=None):
+    version = queue_cache.bump_version(department)
+    message = {"department": department, "version": version}
+    if entry is not None:
+        message["entry"] = entry_summary(entry)
+    get_broker().publish(department_channel(department), message)
+    return message
+
+
+def queue_changed(department, entry=None):
+    """
+    Report a queue mutation. Runs after the current transaction commits so
+    listeners never read rows that are not committed yet.
+    """
+    transaction.on_commit(lambda: publish_change(department, entry))
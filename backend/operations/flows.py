@@ -0,0 +1,143 @@
+"""
+Patient flows across department queues.
+
+A flow is a graph of department stages (``QUEUE_FLOWS``): each stage lists
+the stages a patient can go to next, the first one being the default, and
+the first stage of the graph is where the flow starts. Completing a stage
+and queueing the patient at the next one happen in one transaction, so a
+patient is never completed at OPD without being in the Billing queue.
+
+``advance_many`` moves a whole batch, e.g. everyone OPD just finished, with
+bulk writes: one update for the completed entries, one block of queue
+numbers and one insert per next department, and bulk event inserts.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PatientFlow, QueueManagement
+from . import queue_engine
+
+DEFAULT_FLOWS = {
+    "outpatient": {"OPD": ["Billing"], "Billing": ["Pharmacy"], "Pharmacy": []},
+    "appointment": {"Appointment": ["OPD"], "OPD": ["Billing"], "Billing": ["Pharmacy"], "Pharmacy": []},
+}
+
+
+def get_flows():
+    return getattr(settings, "QUEUE_FLOWS", DEFAULT_FLOWS)
+
+
+def stage_graph(flow):
+    try:
+        return get_flows()[flow]
+    except KeyError:
+        raise ValueError(f"Unknown patient flow: {flow}.")
+
+
+def first_stage(flow):
+    return next(iter(stage_graph(flow)))
+
+
+def next_stage(flow, stage, to=None):
+    """
+    Stage after ``stage``, ``to`` when given and allowed, else the default.
+    None when ``stage`` ends the flow.
+    """
+    options = stage_graph(flow).get(stage, [])
+    if to is not None:
+        if to not in options:
+            raise ValueError(f"{flow} flow cannot go from {stage} to {to}.")
+        return to
+    return options[0] if options else None
+
+
+def start(patient, flow):
+    """
+    Start a flow for a patient and queue them at its first stage.
+    Returns ``(patient_flow, entry)``.
+    """
+    stage = first_stage(flow)
+    with transaction.atomic():
+        patient_flow = PatientFlow.objects.create(patient=patient, flow=flow, current_stage=stage)
+        entry = QueueManagement.objects.create(patient=patient, department=stage, flow=patient_flow)
+    return patient_flow, entry
+
+
+def advance(entry, to=None):
+    """
+    Complete an entry's stage and queue the patient at the next one.
+    Returns the new entry, or None when the flow is finished.
+    """
+    return advance_many([entry], to)[0]
+
+
+def advance_many(entries, to=None):
+    """
+    Complete the stages of several entries and queue each patient at their
+    next stage, all in one transaction. Raises ValueError, and changes
+    nothing, when any entry is not the current stage of an active flow.
+    Returns the new entries in input order, None for finished flows.
+    """
+    ids = [entry.id for entry in entries]
+    with transaction.atomic():
+        current = {
+            entry.id: entry
+            for entry in QueueManagement.objects.select_for_update()
+            .select_related("flow")
+            .filter(id__in=ids)
+        }
+        for entry_id in ids:
+            entry = current.get(entry_id)
+            if entry is None or entry.flow is None:
+                raise ValueError(f"Queue entry {entry_id} is not part of a patient flow.")
+            if entry.flow.status != "active" or entry.flow.current_stage != entry.department:
+                raise ValueError(f"Queue entry {entry_id} is not the current stage of its flow.")
+            if entry.status not in ("waiting", "in_progress"):
+                raise ValueError(f"Queue entry {entry_id} is already {entry.status}.")
+
+        batch = [current[entry_id] for entry_id in dict.fromkeys(ids)]
+        queue_engine.complete_many(batch)
+
+        now = timezone.now()
+        next_entries = {}
+        for entry in batch:
+            patient_flow = entry.flow
+            patient_flow.stages_completed += 1
+            stage = next_stage(patient_flow.flow, entry.department, to)
+            if stage is None:
+                patient_flow.status = "completed"
+                patient_flow.finished_at = now
+                patient_flow.flow_time = now - patient_flow.started_at
+            else:
+                patient_flow.current_stage = stage
+                next_entries[entry.id] = QueueManagement(
+                    patient_id=entry.patient_id, department=stage, flow=patient_flow
+                )
+        queue_engine.enqueue_many(list(next_entries.values()))
+        PatientFlow.objects.bulk_update(
+            [entry.flow for entry in batch],
+            ["current_stage", "status", "stages_completed", "finished_at", "flow_time"],
+            batch_size=500,
+        )
+
+    # the caller's instances reflect the completion
+    for entry in entries:
+        completed = current[entry.id]
+        entry.status = completed.status
+        entry.finished_at = completed.finished_at
+        entry.actual_wait_time = completed.actual_wait_time
+    return [next_entries.get(entry.id) for entry in entries]
+
+
+def cancel(patient_flow):
+    """
+    Stop a flow and cancel its waiting entry.
+    """
+    with transaction.atomic():
+        for entry in patient_flow.entries.filter(status="waiting"):
+            queue_engine.cancel(entry)
+        patient_flow.status = "cancelled"
+        patient_flow.finished_at = timezone.now()
+        patient_flow.save(update_fields=["status", "finished_at"])
+    return patient_flow
@@ -0,0 +1,231 @@
+"""
+iCalendar (RFC 5545) feeds of doctor schedules.
+
+A doctor subscribes their calendar app to a feed URL with a signed token
+in it (see ``feed_token``), since calendar apps cannot log in. The token
+carries the doctor's feed secret (``CalendarFeedKey``), so a doctor whose
+URL leaked revokes it by generating a new secret. The feed has the
+doctor's appointments from PAST_DAYS ago on and their blocked dates.
+
+The feed is streamed: the appointments are read with a server-side
+iterator and written out event by event, so a year of appointments never
+sits in memory as one document. Calendar apps poll it every few minutes,
+so before any of that the feed's state is read with two aggregate
+queries. The newest ``updated_at`` is the Last-Modified date, and it goes
+into the ETag together with the row counts, which also change when a row
+is deleted. An unchanged feed is answered with a 304 after those two
+queries and the one that checks the token's secret.
+"""
+import secrets
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_GET
+
+from .models import AppointmentManagement, CalendarFeedKey, DoctorAvailability
+from . import queue_cache
+
+# how far back the feed reaches
+PAST_DAYS = 90
+# events read from the database at a time
+CHUNK_SIZE = 500
+SALT = "operations.ical"
+CANCELLED_STATUSES = ("cancelled", "no_show")
+APPOINTMENT_TYPES = dict(AppointmentManagement._meta.get_field("appointment_type").choices)
+
+
+def feed_secret(doctor_id, regenerate=False):
+    """
+    A doctor's feed secret, created on first use. ``regenerate`` replaces
+    it, which revokes every URL handed out before.
+    """
+    secret = secrets.token_urlsafe(24)
+    if regenerate:
+        CalendarFeedKey.objects.update_or_create(doctor_id=doctor_id, defaults={"secret": secret})
+        return secret
+    key, _ = CalendarFeedKey.objects.get_or_create(doctor_id=doctor_id, defaults={"secret": secret})
+    return key.secret
+
+
+def feed_token(doctor_id, secret):
+    """
+    Token of a doctor's feed URL. It does not expire, a new feed secret
+    revokes it.
+    """
+    return signing.dumps([doctor_id, secret], salt=SALT, compress=True)
+
+
+def doctor_from_token(token):
+    """
+    ``(doctor_id, doctor name)`` of a feed token, or None when the token is
+    not valid or its secret has been replaced.
+    """
+    try:
+        doctor_id, secret = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if not isinstance(doctor_id, int) or not isinstance(secret, str):
+        return None
+    name = (
+        CalendarFeedKey.objects.filter(doctor_id=doctor_id, secret=secret)
+        .values_list("doctor__user__full_name", flat=True)
+        .first()
+    )
+    return None if name is None else (doctor_id, name)
+
+
+def feed_appointments(doctor_id):
+    since = timezone.now() - timedelta(days=PAST_DAYS)
+    return AppointmentManagement.objects.filter(doctor_id=doctor_id, appointment_date__gte=since)
+
+
+def feed_blocks(doctor_id):
+    since = timezone.localdate() - timedelta(days=PAST_DAYS)
+    return DoctorAvailability.objects.filter(doctor_id=doctor_id, is_blocked=True, date__gte=since)
+
+
+def feed_state(doctor_id):
+    """
+    ``(etag, last_modified)`` of a doctor's feed, last_modified is None for
+    an empty feed.
+    """
+    appointments = feed_appointments(doctor_id).aggregate(count=Count("pk"), last=Max("updated_at"))
+    blocks = feed_blocks(doctor_id).aggregate(count=Count("pk"), last=Max("updated_at"))
+    last_modified = max(filter(None, [appointments["last"], blocks["last"]]), default=None)
+    stamp = int(last_modified.timestamp() * 1_000_000) if last_modified else 0
+    return f'"ical-{doctor_id}-{stamp}-{appointments["count"]}-{blocks["count"]}"', last_modified
+
+
+def not_modified(request, etag, last_modified):
+    """
+    Whether the client's copy is current. If-None-Match wins over
+    If-Modified-Since when both are sent.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return queue_cache.etag_matches(if_none_match, etag)
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+
+def escape(text):
+    return (
+        str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def fold(line):
+    """
+    Content line split into lines of at most 75 octets, without splitting
+    a character.
+    """
+    if len(line) <= 75 and line.isascii():
+        return line + "\r\n"
+    parts = []
+    current, size = "", 0
+    for char in line:
+        width = len(char.encode())
+        # continuation lines start with a space, which counts
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = "", 0
+        current += char
+        size += width
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def utc(value):
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def appointment_event(appointment, host):
+    kind = APPOINTMENT_TYPES.get(appointment["appointment_type"], "Appointment")
+    summary = f"{kind}: {appointment['patient__user__full_name']}"
+    description = f"Queue number {appointment['queue_number']}, {appointment['status']}"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:appointment-{appointment['appointment_id']}@{host}",
+        f"DTSTAMP:{utc(appointment['updated_at'])}",
+        f"LAST-MODIFIED:{utc(appointment['updated_at'])}",
+        f"SEQUENCE:{appointment['version']}",
+        f"DTSTART:{utc(appointment['appointment_date'])}",
+        f"DTEND:{utc(appointment['appointment_end'])}",
+        f"SUMMARY:{escape(summary)}",
+        f"DESCRIPTION:{escape(description)}",
+        f"STATUS:{'CANCELLED' if appointment['status'] in CANCELLED_STATUSES else 'CONFIRMED'}",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) for line in lines)
+
+
+def block_event(block, host):
+    summary = f"Unavailable: {block['reason']}" if block["reason"] else "Unavailable"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:blocked-{block['id']}@{host}",
+        f"DTSTAMP:{utc(block['updated_at'])}",
+        f"LAST-MODIFIED:{utc(block['updated_at'])}",
+        f"DTSTART;VALUE=DATE:{block['date']:%Y%m%d}",
+        f"DTEND;VALUE=DATE:{block['date'] + timedelta(days=1):%Y%m%d}",
+        f"SUMMARY:{escape(summary)}",
+        "TRANSP:OPAQUE",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) for line in lines)
+
+
+def calendar(doctor_id, name, host):
+    """
+    The feed as an iterator of text chunks.
+    """
+    yield "".join(fold(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:-//{host}//Doctor schedule//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape('Dr. ' + name + ' schedule')}",
+    ])
+    blocks = feed_blocks(doctor_id).values("id", "date", "reason", "updated_at")
+    for block in blocks.iterator(chunk_size=CHUNK_SIZE):
+        yield block_event(block, host)
+    appointments = feed_appointments(doctor_id).order_by("appointment_date").values(
+        "appointment_id", "appointment_date", "appointment_end", "appointment_type", "status",
+        "queue_number", "version", "updated_at", "patient__user__full_name",
+    )
+    for appointment in appointments.iterator(chunk_size=CHUNK_SIZE):
+        yield appointment_event(appointment, host)
+    yield "END:VCALENDAR\r\n"
+
+
+@require_GET
+def doctor_feed(request, token):
+    """
+    A doctor's schedule as an iCalendar feed, 304 while unchanged.
+    """
+    doctor = doctor_from_token(token)
+    if doctor is None:
+        raise Http404("Unknown calendar feed")
+    doctor_id, name = doctor
+
+    etag, last_modified = feed_state(doctor_id)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified.timestamp())
+    if not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = StreamingHttpResponse(
+            calendar(doctor_id, name, request.get_host().split(":")[0]),
+            content_type="text/calendar; charset=utf-8",
+        )
+        response["Content-Disposition"] = 'inline; filename="schedule.ics"'
+    for header, value in headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,110 @@
+"""
+Stress test of concurrent appointment booking.
+
+Creates one doctor and lets many threads, each with its own database
+connection, book the same few slots of the doctor's next working day at
+the same time, with a mix of one- and two-slot appointments so bookings
+overlap without starting at the same time. Afterwards no two booked
+appointments of the doctor may overlap, and every booking a thread was
+told succeeded must be in the database.
+
+The rows are committed so the threads can see them, point it at a
+development database. Everything it created is removed afterwards unless
+--keep is given.
+
+    python manage.py appointment_booking_stress --threads 8 --slots 6
+"""
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from backend.operations import booking_stress, bookings, slots
+from backend.operations.models import AppointmentManagement
+from backend.users.models import GeneralDoctorProfile, PatientProfile, User
+
+
+class Command(BaseCommand):
+    help = "Let many threads book the same slots of a doctor concurrently and check that nothing overlaps."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent bookers.")
+        parser.add_argument("--slots", type=int, default=6, help="Consecutive slots every booker tries.")
+        parser.add_argument("--save", action="store_true", help="Book through Model.save() instead of bookings.book_many.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--keep", action="store_true", help="Keep the created users and appointments.")
+
+    def handle(self, *args, **options):
+        tag = f"stress{time.time_ns()}"
+        password = make_password(None)
+        doctor_user = User.objects.create(
+            email=f"{tag}-doctor@example.com", full_name="Stress Doctor", role=User.Role.DOCTOR, password=password
+        )
+        doctor = GeneralDoctorProfile.objects.create(user=doctor_user, license_number=f"{tag}-license")
+        patients = PatientProfile.objects.bulk_create([
+            PatientProfile(user=user) for user in User.objects.bulk_create([
+                User(email=f"{tag}-patient{i}@example.com", full_name=f"Stress Patient {i}",
+                     role=User.Role.PATIENT, password=password)
+                for i in range(options["threads"])
+            ])
+        ])
+
+        try:
+            self.run(doctor, patients, options)
+        finally:
+            if not options["keep"]:
+                User.objects.filter(id__in=[doctor_user.id, *(patient.user_id for patient in patients)]).delete()
+
+    def run(self, doctor, patients, options):
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        found = slots.first_free_slot([doctor.id], tomorrow, tomorrow + timedelta(days=14))
+        if found is None:
+            raise CommandError("The doctor has no working day in the next two weeks.")
+        _, first = found
+        starts = [first + bookings.default_duration() * n for n in range(options["slots"])]
+
+        spans_by_patient = {}
+        for i, patient in enumerate(patients):
+            rng = random.Random(options["seed"] + i)
+            spans_by_patient[patient.id] = [
+                (start, start + bookings.default_duration() * rng.choice([1, 1, 2])) for start in starts
+            ]
+        started = time.perf_counter()
+        threads = booking_stress.run_bookers(doctor.id, spans_by_patient, options["save"])
+        elapsed = time.perf_counter() - started
+
+        attempts = len(threads) * len(starts)
+        booked = [appointment_id for thread in threads for appointment_id in thread.booked]
+        errors = sum((thread.errors for thread in threads), Counter())
+        self.stdout.write(
+            f"{len(threads)} bookers made {attempts} attempts on {len(starts)} slots in {elapsed:.2f}s "
+            f"on {connection.vendor}: {len(booked)} booked, {sum(thread.rejected for thread in threads)} rejected"
+        )
+        for error, count in errors.items():
+            self.stdout.write(self.style.WARNING(f"{count} x {error} (retried)"))
+        failures = [failure for thread in threads for failure in thread.failures]
+        if failures:
+            raise CommandError(f"{len(failures)} bookers failed, first: {failures[0]}")
+
+        stored = list(
+            AppointmentManagement.objects.filter(doctor=doctor, status__in=bookings.BOOKED_STATUSES)
+            .order_by("appointment_date")
+            .values_list("appointment_id", "appointment_date", "appointment_end")
+        )
+        overlaps = [
+            (previous[0], current[0])
+            for previous, current in zip(stored, stored[1:])
+            if current[1] < previous[2]
+        ]
+        missing = set(booked) - {appointment_id for appointment_id, _, _ in stored}
+        if overlaps or missing:
+            raise CommandError(
+                f"{len(overlaps)} pairs of appointments overlap and "
+                f"{len(missing)} reported bookings are not in the database."
+            )
+        self.stdout.write(self.style.SUCCESS(f"No overlapping appointments among {len(stored)} booked."))
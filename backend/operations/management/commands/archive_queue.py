@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from backend.operations import archive
+
+
+class Command(BaseCommand):
+    help = "Move finished queue entries into the queue history table. Run nightly, after hours."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--today",
+            help="Day whose active entries stay in the queue tables, YYYY-MM-DD (default: today).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        today = None
+        if options["today"]:
+            today = parse_date(options["today"])
+            if today is None:
+                raise CommandError("--today must be a date in YYYY-MM-DD format.")
+
+        moved = archive.archive(today=today, batch_size=options["batch_size"])
+        for lane, count in moved.items():
+            self.stdout.write(f"{lane}: archived {count} entries")
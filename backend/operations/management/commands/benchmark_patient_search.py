@@ -0,0 +1,119 @@
+"""
+Benchmark of the patient typeahead.
+
+Adds synthetic patients, indexes them, and times typeahead queries (name
+prefixes as typed, e.g. "ma", "mar", "maria sa") against the search index
+and against the old ``full_name__icontains`` lookup. Everything happens in
+one transaction that is rolled back, so the database is left as it was.
+
+    python manage.py benchmark_patient_search --patients 100000 --target-ms 20
+"""
+import random
+import statistics
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from backend.operations import patient_search
+from backend.users.models import PatientProfile, User
+
+FIRST_NAMES = [
+    "Maria", "Jose", "Juan", "Ana", "Mark", "John", "Michael", "Angelica", "Kristine", "Paolo",
+    "Carlo", "Patricia", "Jerome", "Liza", "Ramon", "Rosalie", "Francis", "Joy", "Christian", "Teresa",
+]
+LAST_NAMES = [
+    "Santos", "Reyes", "Cruz", "Bautista", "Ocampo", "Garcia", "Mendoza", "Torres", "Tomas", "Andrada",
+    "Castillo", "Flores", "Villanueva", "Ramos", "Castro", "Rivera", "Aquino", "Navarro", "Salazar", "Mercado",
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+class Command(BaseCommand):
+    help = "Time patient typeahead queries on synthetic patients, rolled back afterwards."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=100000, help="Synthetic patients to add.")
+        parser.add_argument("--queries", type=int, default=500, help="Typeahead queries to time.")
+        parser.add_argument("--baseline-queries", type=int, default=20, help="icontains queries to time for comparison.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--target-ms", type=float, help="Fail when the p99 typeahead latency is above this.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        tag = f"search{time.time_ns()}"
+        password = make_password(None)
+
+        started = time.perf_counter()
+        names = [
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES) if rng.random() < 0.3 else ''} "
+            f"{rng.choice(LAST_NAMES)}{rng.randrange(1000) if rng.random() < 0.5 else ''}".replace("  ", " ")
+            for _ in range(options["patients"])
+        ]
+        users = User.objects.bulk_create([
+            User(email=f"{tag}-{i}@example.com", full_name=name, role=User.Role.PATIENT, password=password)
+            for i, name in enumerate(names)
+        ], batch_size=5000)
+        profiles = PatientProfile.objects.bulk_create(
+            [PatientProfile(user=user) for user in users], batch_size=5000
+        )
+        patient_search.index_many(
+            (profile.id, user.full_name, user.email) for profile, user in zip(profiles, users)
+        )
+        self.stdout.write(
+            f"Added and indexed {len(profiles)} patients in {time.perf_counter() - started:.1f}s "
+            f"({'FTS5 index' if patient_search.available() else 'prefix fallback'} on {connection.vendor})"
+        )
+
+        queries = []
+        for _ in range(options["queries"]):
+            first, *_, last = rng.choice(names).split()
+            typed = rng.choice([
+                first[:rng.randint(2, len(first))],
+                f"{first[:rng.randint(2, len(first))]} {last[:rng.randint(1, len(last))]}",
+                last[:rng.randint(3, len(last))],
+            ])
+            queries.append(typed)
+
+        latencies = []
+        hits = []
+        for query in queries:
+            started = time.perf_counter()
+            hits.append(len(patient_search.search(query, limit=10)))
+            latencies.append(time.perf_counter() - started)
+
+        baseline = []
+        for query in queries[:options["baseline_queries"]]:
+            started = time.perf_counter()
+            list(PatientProfile.objects.filter(user__full_name__icontains=query).select_related("user")[:10])
+            baseline.append(time.perf_counter() - started)
+
+        p99 = percentile(latencies, 0.99) * 1000
+        self.stdout.write(
+            f"typeahead: {len(latencies)} queries, p50 {statistics.median(latencies) * 1000:.2f} ms, "
+            f"p99 {p99:.2f} ms, {statistics.mean(hits):.1f} results on average"
+        )
+        if baseline:
+            self.stdout.write(
+                f"icontains: {len(baseline)} queries, p50 {statistics.median(baseline) * 1000:.2f} ms, "
+                f"p99 {percentile(baseline, 0.99) * 1000:.2f} ms"
+            )
+        if options["target_ms"] is not None and p99 > options["target_ms"]:
+            raise CommandError(f"p99 typeahead latency {p99:.2f} ms is above the {options['target_ms']} ms target.")
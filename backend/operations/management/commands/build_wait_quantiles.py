@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from backend.operations import wait_model
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per department, weekday and hour service time quantiles. Run nightly."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, default=12, help="How many weeks of completed services to use.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        buckets = wait_model.rebuild(weeks=options["weeks"], chunk_size=options["chunk_size"])
+        self.stdout.write(f"Wrote {buckets} service time buckets.")
@@ -0,0 +1,146 @@
+"""
+Stress test of concurrent call-next.
+
+Fills one department queue with waiting patients, then lets many threads,
+each with its own database connection and staff user, call the next patient
+at the same time until the queue is empty. Every entry must be claimed
+exactly once and by the user whose call returned it.
+
+The rows are committed so the threads can see them, point it at a
+development database. Everything it created is removed afterwards unless
+--keep is given.
+
+    python manage.py queue_claim_stress --doctors 8 --patients 2000
+"""
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.utils import OperationalError
+
+from backend.operations import scheduler
+from backend.operations.models import QueueEvent, QueueManagement
+from backend.users.models import PatientProfile, User
+
+DEPARTMENTS = [value for value, _ in QueueManagement._meta.get_field("department").choices]
+
+
+class Doctor(threading.Thread):
+
+    def __init__(self, user, department, barrier):
+        super().__init__()
+        self.user = user
+        self.department = department
+        self.barrier = barrier
+        self.claims = []
+        self.latencies = []
+        self.errors = Counter()
+
+    def run(self):
+        try:
+            self.barrier.wait()
+            while True:
+                started = time.perf_counter()
+                try:
+                    called = scheduler.call_next(self.department, self.user)
+                except OperationalError as error:
+                    # e.g. SQLite's busy timeout under heavy write contention
+                    self.errors[str(error)] += 1
+                    continue
+                if called is None:
+                    break
+                self.latencies.append(time.perf_counter() - started)
+                lane, entry = called
+                self.claims.append((lane, entry.id))
+        finally:
+            connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Let many threads call the next patient concurrently and check that nobody is claimed twice."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=8, help="Concurrent callers.")
+        parser.add_argument("--patients", type=int, default=1000, help="Waiting entries to claim.")
+        parser.add_argument("--department", choices=DEPARTMENTS, default="OPD")
+        parser.add_argument("--keep", action="store_true", help="Keep the created users and queue entries.")
+
+    def handle(self, *args, **options):
+        department = options["department"]
+        if QueueManagement.objects.filter(department=department, status="waiting").exists():
+            raise CommandError(f"The {department} queue is not empty, use an idle department or database.")
+
+        tag = f"stress{time.time_ns()}"
+        password = make_password(None)
+        patients = PatientProfile.objects.bulk_create([
+            PatientProfile(user=user) for user in User.objects.bulk_create([
+                User(email=f"{tag}-patient{i}@example.com", full_name=f"Stress Patient {i}",
+                     role=User.Role.PATIENT, password=password)
+                for i in range(options["patients"])
+            ])
+        ])
+        doctors = User.objects.bulk_create([
+            User(email=f"{tag}-doctor{i}@example.com", full_name=f"Stress Doctor {i}",
+                 role=User.Role.DOCTOR, password=password)
+            for i in range(options["doctors"])
+        ])
+        entries = [QueueManagement.objects.create(patient=patient, department=department) for patient in patients]
+
+        try:
+            self.run(department, doctors, entries)
+        finally:
+            if not options["keep"]:
+                patient_ids = [patient.id for patient in patients]
+                QueueEvent.objects.filter(patient_id__in=patient_ids).delete()
+                User.objects.filter(id__in=[user.id for user in doctors]).delete()
+                User.objects.filter(patient_profile__id__in=patient_ids).delete()
+
+    def run(self, department, doctors, entries):
+        barrier = threading.Barrier(len(doctors))
+        threads = [Doctor(user, department, barrier) for user in doctors]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        claims = Counter(claim for thread in threads for claim in thread.claims)
+        double_claims = [claim for claim, count in claims.items() if count > 1]
+        latencies = sorted(latency for thread in threads for latency in thread.latencies)
+        errors = sum((thread.errors for thread in threads), Counter())
+
+        self.stdout.write(
+            f"{len(threads)} callers claimed {sum(claims.values())} of {len(entries)} entries "
+            f"in {elapsed:.2f}s on {connection.vendor}: {sum(claims.values()) / elapsed:.0f} claims/s"
+        )
+        if latencies:
+            self.stdout.write(
+                f"call-next latency p50 {statistics.median(latencies) * 1000:.1f} ms, "
+                f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms"
+            )
+        self.stdout.write("Claims per caller: " + ", ".join(str(len(thread.claims)) for thread in threads))
+        for error, count in errors.items():
+            self.stdout.write(self.style.WARNING(f"{count} x {error} (retried)"))
+
+        # every entry claimed once, and stored as served by the caller that got it
+        claimed_by = {
+            (lane, entry_id): thread.user.id for thread in threads for lane, entry_id in thread.claims
+        }
+        stored = dict(
+            QueueManagement.objects.filter(id__in=[entry.id for entry in entries])
+            .values_list("id", "served_by_id")
+        )
+        mismatched = [
+            entry.id for entry in entries if claimed_by.get(("normal", entry.id)) != stored[entry.id]
+        ]
+        if double_claims or mismatched:
+            raise CommandError(
+                f"{len(double_claims)} entries were claimed more than once and "
+                f"{len(mismatched)} are not served by the caller that claimed them."
+            )
+        self.stdout.write(self.style.SUCCESS("No double claims."))
@@ -0,0 +1,130 @@
+"""
+Load test of the live queue stream.
+
+Opens many idle subscribers on /api/operations/queue/stream/<department>/
+inside one event loop, the way a single ASGI worker would hold them, then
+publishes queue changes and measures memory per subscriber and how long it
+takes until every subscriber has received each change.
+
+    python manage.py queue_stream_loadtest --subscribers 5000 --events 20
+"""
+import asyncio
+import resource
+import statistics
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+
+from backend.operations import events
+
+
+class Subscriber:
+    """A fake ASGI client that stays connected until told to leave."""
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+        self.versions = {}
+        self.connected = asyncio.Event()
+        self.leave = asyncio.Event()
+        self._request_sent = False
+
+    async def receive(self):
+        if not self._request_sent:
+            self._request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.leave.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] != "http.response.body":
+            return
+        self.connected.set()
+        now = time.perf_counter()
+        for line in message.get("body", b"").decode().splitlines():
+            if line.startswith("id: "):
+                self.versions.setdefault(int(line[4:]), now)
+
+    async def run(self):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": self.path,
+            "raw_path": self.path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"localhost"), (b"accept", b"text/event-stream")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 8000),
+        }
+        await self.application(scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = "Measure how many idle queue stream subscribers one worker can hold and fan out to."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, default=2000)
+        parser.add_argument("--events", type=int, default=10, dest="event_count")
+        parser.add_argument("--department", default="OPD")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for one fan-out.")
+        parser.add_argument("--connect-timeout", type=float, default=600.0, help="Seconds to wait for all subscribers to connect.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(**options))
+
+    async def run(self, subscribers, event_count, department, timeout, connect_timeout, **options):
+        application = get_asgi_application()
+        broker = events.get_broker()
+        path = f"/api/operations/queue/stream/{department}/"
+
+        # peak resident size in KiB on Linux; a rough per-subscriber figure
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        clients = [Subscriber(application, path) for _ in range(subscribers)]
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+        await asyncio.wait_for(
+            asyncio.gather(*(client.connected.wait() for client in clients)), connect_timeout
+        )
+        connect_seconds = time.perf_counter() - started
+        connected_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        self.stdout.write(
+            f"{subscribers} subscribers connected in {connect_seconds:.2f}s, "
+            f"{broker.subscriber_count(events.department_channel(department))} on the broker, "
+            f"~{(connected_memory - baseline) / subscribers:.1f} KiB RSS each"
+        )
+
+        latencies = []
+        for _ in range(event_count):
+            published_at = time.perf_counter()
+            # publish from another thread, as a sync view committing a change would
+            message = await asyncio.to_thread(events.publish_change, department)
+            version = message["version"]
+            while not all(version in client.versions for client in clients):
+                if time.perf_counter() - published_at > timeout:
+                    raise TimeoutError(f"Fan-out of version {version} did not finish in {timeout}s.")
+                await asyncio.sleep(0.001)
+            latencies.append(max(client.versions[version] for client in clients) - published_at)
+
+        latencies.sort()
+        self.stdout.write(
+            f"{event_count} events fanned out to {subscribers} subscribers: "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.1f} ms, "
+            f"max {latencies[-1] * 1000:.1f} ms, "
+            f"{subscribers * event_count / sum(latencies):.0f} deliveries/s"
+        )
+
+        for client in clients:
+            client.leave.set()
+        await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), connect_timeout)
+        await asyncio.sleep(0)
+        self.stdout.write(
+            f"Disconnected, {broker.subscriber_count()} subscriptions left on the broker."
+        )
+
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.operations import patient_search
+
+
+class Command(BaseCommand):
+    help = "Reindex every patient in the patient search index, e.g. after a bulk import."
+
+    def handle(self, *args, **options):
+        if not patient_search.available():
+            raise CommandError("This database has no patient search index, searches use the prefix fallback.")
+        with transaction.atomic():
+            count = patient_search.rebuild()
+        self.stdout.write(f"Indexed {count} patients.")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from backend.operations import projections
+
+
+class Command(BaseCommand):
+    help = "Rebuild the queue tables from the append-only queue event log."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lane", choices=sorted(projections.LANE_MODELS), action="append",
+            help="Queue table to rebuild (default: both).",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report rows that differ from the event log, do not write.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for lane in options["lane"] or sorted(projections.LANE_MODELS):
+            summary = projections.rebuild(
+                lane, write=not options["check"], chunk_size=options["chunk_size"]
+            )
+            verb = "differ" if options["check"] else "rewritten"
+            self.stdout.write(
+                f"{lane}: {summary['events']} events, {summary['entries']} entries, "
+                f"{summary['updated']} {verb}, {summary['created']} missing, "
+                f"{summary['unchanged']} unchanged, {summary['archived']} archived"
+            )
@@ -0,0 +1,27 @@
+"""
+Send the reminders of the appointments starting within the reminder window.
+Safe to rerun and to run from cron every few minutes: an appointment is
+reminded once.
+
+    python manage.py send_appointment_reminders --window-hours 24
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from backend.operations import reminders
+
+
+class Command(BaseCommand):
+    help = "Notify patients and doctors of their upcoming appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window-hours", type=float, help="How far ahead to remind, APPOINTMENT_REMINDER_HOURS by default.")
+        parser.add_argument("--batch-size", type=int, default=reminders.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        window = timedelta(hours=options["window_hours"]) if options["window_hours"] else None
+        started = time.perf_counter()
+        count = reminders.send_due(window=window, batch_size=options["batch_size"])
+        self.stdout.write(f"Reminded {count} appointments in {time.perf_counter() - started:.2f}s.")
@@ -0,0 +1,332 @@
+"""
+Discrete-event simulation of the department queues, used as a benchmark.
+
+Patients arrive at OPD, Billing, Pharmacy and Appointment with exponential
+inter-arrival times, a share of them through the priority queue. Every
+department has a few servers that call the next patient as soon as they
+are free and complete the service after an exponential service time. Each
+operation runs against the real models and is timed and its SQL statements
+counted. ``timezone.now`` follows the simulated clock while the simulation
+runs, so waits, aging and service-time stats see simulated time.
+
+Waits are reported per lane and priority level, with how many calls went
+past the QUEUE_LANE_MAX_WAIT_MINUTES bound; --no-aging runs the old strict
+level order for comparison.
+
+Everything runs in one transaction that is rolled back at the end unless
+--keep is given, so it can be pointed at a development database.
+
+    python manage.py simulate_queue --patients 500 --seed 1
+    python manage.py simulate_queue --json bench.json
+    python manage.py simulate_queue --compare bench.json --tolerance 0.25
+    python manage.py simulate_queue --priority-share 0.6 --no-aging
+"""
+import heapq
+import json
+import random
+import statistics
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from backend.operations import bookings, scheduler
+from backend.operations.models import AppointmentManagement, PriorityQueue, QueueManagement
+from backend.operations.views import queue_patients_payload
+from backend.users.models import GeneralDoctorProfile, PatientProfile, User
+
+DEPARTMENTS = [value for value, _ in QueueManagement._meta.get_field("department").choices]
+PRIORITY_LEVELS = [value for value, _ in PriorityQueue._meta.get_field("priority_level").choices]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class Metrics:
+    """Latency and SQL statement count of every operation, by name."""
+
+    def __init__(self):
+        self.seconds = defaultdict(list)
+        self.queries = defaultdict(list)
+
+    def measure(self, name, func, *args, **kwargs):
+        # counted with an execute wrapper, the debug query log is capped
+        count = 0
+
+        def counter(execute, sql, params, many, context):
+            nonlocal count
+            count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.seconds[name].append(time.perf_counter() - started)
+        self.queries[name].append(count)
+        return result
+
+    def summary(self):
+        return {
+            name: {
+                "count": len(seconds),
+                "ops_per_second": len(seconds) / sum(seconds) if sum(seconds) else 0.0,
+                "p50_ms": percentile(seconds, 0.5) * 1000,
+                "p99_ms": percentile(seconds, 0.99) * 1000,
+                "queries_per_op": statistics.mean(self.queries[name]),
+                "max_queries": max(self.queries[name]),
+            }
+            for name, seconds in sorted(self.seconds.items())
+        }
+
+
+class Simulation:
+
+    def __init__(self, rng, metrics, departments, patients, servers, arrival_seconds,
+                 service_seconds, priority_share, list_every):
+        self.rng = rng
+        self.metrics = metrics
+        self.departments = departments
+        self.patients_per_department = patients
+        self.arrival_seconds = arrival_seconds
+        self.service_seconds = service_seconds
+        self.priority_share = priority_share
+        self.list_every = list_every
+        self.server_count = servers
+        self.clock = 0.0
+        self.epoch = timezone.now()
+        self.events = []
+        self.sequence = 0
+        # simulated bookkeeping, the database is the source of truth for order
+        self.waiting = defaultdict(int)
+        self.max_waiting = defaultdict(int)
+        self.arrived_at = {}
+        self.waits = defaultdict(list)
+
+    def now(self):
+        return self.epoch + timedelta(seconds=self.clock)
+
+    def schedule(self, delay, kind, *payload):
+        self.sequence += 1
+        heapq.heappush(self.events, (self.clock + delay, self.sequence, kind, payload))
+
+    def setup(self):
+        """
+        Patients, staff and an appointment per patient for the priority queue,
+        created in bulk and not measured.
+        """
+        tag = f"sim{time.time_ns()}"
+        total = self.patients_per_department * len(self.departments)
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(email=f"{tag}-patient{i}@example.com", full_name=f"Sim Patient {i}",
+                 role=User.Role.PATIENT, password=password)
+            for i in range(total)
+        ])
+        self.patients = PatientProfile.objects.bulk_create([PatientProfile(user=user) for user in users])
+
+        staff = User.objects.bulk_create([
+            User(email=f"{tag}-staff-{department}-{i}@example.com".lower(),
+                 full_name=f"Sim Staff {department} {i}", role=User.Role.DOCTOR, password=password)
+            for department in self.departments for i in range(self.server_count)
+        ])
+        self.free_servers = {department: deque() for department in self.departments}
+        for index, user in enumerate(staff):
+            self.free_servers[self.departments[index // self.server_count]].append(user)
+
+        doctor = GeneralDoctorProfile.objects.create(user=staff[0], license_number=f"{tag}-license")
+        tomorrow = timezone.now() + timedelta(days=1)
+        self.appointments = {
+            appointment.patient_id: appointment
+            for appointment in AppointmentManagement.objects.bulk_create(bookings.number_appointments(doctor.id, [
+                AppointmentManagement(
+                    patient=patient, doctor=doctor, appointment_date=tomorrow,
+                    appointment_time=tomorrow.time(), appointment_end=tomorrow + timedelta(minutes=15),
+                )
+                for patient in self.patients
+            ]))
+        }
+
+    def run(self):
+        with mock.patch.object(timezone, "now", self.now):
+            self._run()
+
+    def _run(self):
+        patients = iter(self.patients)
+        for department in self.departments:
+            clock = 0.0
+            for _ in range(self.patients_per_department):
+                clock += self.rng.expovariate(1 / self.arrival_seconds)
+                self.sequence += 1
+                heapq.heappush(self.events, (clock, self.sequence, "arrival", (department, next(patients))))
+
+        arrivals = 0
+        while self.events:
+            self.clock, _, kind, payload = heapq.heappop(self.events)
+            if kind == "arrival":
+                department, patient = payload
+                self.arrive(department, patient)
+                arrivals += 1
+                if self.list_every and arrivals % self.list_every == 0:
+                    self.metrics.measure("list", queue_patients_payload, department)
+                self.dispatch(department)
+            elif kind == "done":
+                department, server, entry = payload
+                self.metrics.measure("complete", entry.complete_service)
+                self.free_servers[department].append(server)
+                self.dispatch(department)
+
+    def arrive(self, department, patient):
+        if self.rng.random() < self.priority_share:
+            entry = self.metrics.measure(
+                "enqueue_priority", PriorityQueue.objects.create,
+                patient=patient, department=department,
+                appointment_id=self.appointments[patient.id],
+                priority_level=self.rng.choice(PRIORITY_LEVELS),
+            )
+            lane = "priority"
+        else:
+            # enqueue_time's default is bound to the real clock
+            entry = self.metrics.measure(
+                "enqueue", QueueManagement.objects.create,
+                patient=patient, department=department, enqueue_time=self.now(),
+            )
+            lane = "normal"
+        self.arrived_at[(lane, entry.id)] = self.clock
+        self.waiting[department] += 1
+        self.max_waiting[department] = max(self.max_waiting[department], self.waiting[department])
+
+    def dispatch(self, department):
+        while self.free_servers[department] and self.waiting[department]:
+            server = self.free_servers[department].popleft()
+            called = self.metrics.measure("call_next", scheduler.call_next, department, server)
+            if called is None:
+                self.free_servers[department].appendleft(server)
+                return
+            lane, entry = called
+            self.waiting[department] -= 1
+            group = lane if lane == "normal" else f"priority/{entry.priority_level}"
+            self.waits[group].append(self.clock - self.arrived_at.pop((lane, entry.id)))
+            self.schedule(self.rng.expovariate(1 / self.service_seconds), "done", department, server, entry)
+
+
+class Command(BaseCommand):
+    help = "Run a seeded discrete-event simulation of the queues and report per-operation latency and SQL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--patients", type=int, default=500, help="Arrivals per department.")
+        parser.add_argument("--department", action="append", choices=DEPARTMENTS,
+                            help="Department to simulate (default: all).")
+        parser.add_argument("--servers", type=int, default=3, help="Staff calling patients per department.")
+        parser.add_argument("--arrival-seconds", type=float, default=60.0, help="Mean simulated time between arrivals.")
+        parser.add_argument("--service-seconds", type=float, default=170.0, help="Mean simulated service time.")
+        parser.add_argument("--priority-share", type=float, default=0.15, help="Share of arrivals in the priority queue.")
+        parser.add_argument("--list-every", type=int, default=10, help="Build the queue listing every N arrivals (0: never).")
+        parser.add_argument("--no-aging", action="store_true",
+                            help="Strict priority level order and no lane wait bound, for comparison.")
+        parser.add_argument("--keep", action="store_true", help="Commit the simulated rows instead of rolling back.")
+        parser.add_argument("--json", dest="json_path", help="Write the results to this file.")
+        parser.add_argument("--compare", help="Fail when results regress against this earlier --json file.")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed relative p50 slowdown for --compare.")
+
+    def handle(self, *args, **options):
+        departments = options["department"] or DEPARTMENTS
+        metrics = Metrics()
+        simulation = Simulation(
+            random.Random(options["seed"]), metrics, departments, options["patients"],
+            options["servers"], options["arrival_seconds"], options["service_seconds"],
+            options["priority_share"], options["list_every"],
+        )
+
+        overrides = {}
+        if options["no_aging"]:
+            # seniors always first, waiting time ignored
+            overrides = {
+                "QUEUE_PRIORITY_AGING": {
+                    level: {"base": len(PRIORITY_LEVELS) - index, "rate": 0}
+                    for index, level in enumerate(sorted(PRIORITY_LEVELS, reverse=True))
+                },
+                "QUEUE_LANE_MAX_WAIT_MINUTES": None,
+            }
+        with override_settings(**overrides), transaction.atomic():
+            simulation.setup()
+            started = time.perf_counter()
+            simulation.run()
+            elapsed = time.perf_counter() - started
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        bound = scheduler.get_lane_max_wait()
+        bound_seconds = None if options["no_aging"] or bound is None else bound.total_seconds()
+
+        operations = metrics.summary()
+        total = sum(operation["count"] for operation in operations.values())
+        self.stdout.write(
+            f"{options['patients']} patients x {len(departments)} departments, seed {options['seed']}: "
+            f"{total} operations in {elapsed:.2f}s ({total / elapsed:.0f} ops/s)"
+        )
+        self.stdout.write(f"{'operation':<18}{'count':>7}{'ops/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'sql/op':>8}{'max sql':>9}")
+        for name, operation in operations.items():
+            self.stdout.write(
+                f"{name:<18}{operation['count']:>7}{operation['ops_per_second']:>9.0f}"
+                f"{operation['p50_ms']:>9.2f}{operation['p99_ms']:>9.2f}"
+                f"{operation['queries_per_op']:>8.1f}{operation['max_queries']:>9}"
+            )
+        waits = {}
+        for group, seconds in sorted(simulation.waits.items()):
+            waits[group] = {
+                "count": len(seconds),
+                "mean_minutes": statistics.mean(seconds) / 60,
+                "p99_minutes": percentile(seconds, 0.99) / 60,
+                "max_minutes": max(seconds) / 60,
+                "over_bound": sum(1 for wait in seconds if bound_seconds and wait > bound_seconds),
+            }
+            self.stdout.write(
+                f"{group} simulated wait: mean {waits[group]['mean_minutes']:.1f} min, "
+                f"p99 {waits[group]['p99_minutes']:.1f} min, max {waits[group]['max_minutes']:.1f} min"
+                + (f", {waits[group]['over_bound']} over {bound_seconds / 60:.0f} min" if bound_seconds else "")
+            )
+        self.stdout.write("Longest queue: " + ", ".join(
+            f"{department} {simulation.max_waiting[department]}" for department in departments
+        ))
+
+        results = {
+            "seed": options["seed"],
+            "patients": options["patients"],
+            "departments": departments,
+            "elapsed_seconds": elapsed,
+            "operations": operations,
+            "waits": waits,
+        }
+        if options["json_path"]:
+            with open(options["json_path"], "w") as handle:
+                json.dump(results, handle, indent=2)
+        if options["compare"]:
+            self.compare(results, options["compare"], options["tolerance"])
+
+    def compare(self, results, path, tolerance):
+        with open(path) as handle:
+            baseline = json.load(handle)["operations"]
+        regressions = []
+        for name, operation in results["operations"].items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            # statement counts are deterministic for a seed, any increase is a regression
+            if operation["queries_per_op"] > before["queries_per_op"] + 0.01:
+                regressions.append(
+                    f"{name}: {before['queries_per_op']:.2f} -> {operation['queries_per_op']:.2f} queries/op"
+                )
+            if operation["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+                regressions.append(f"{name}: p50 {before['p50_ms']:.2f} -> {operation['p50_ms']:.2f} ms")
+        if regressions:
+            raise CommandError("Benchmark regressed:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}."))
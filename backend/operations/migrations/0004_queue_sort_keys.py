@@ -0,0 +1,87 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:59
+
+from django.db import migrations, models
+
+# keep in sync with queue_engine.KEY_GAP
+KEY_GAP = 1 << 16
+
+
+def positions_to_sort_keys(apps, schema_editor):
+    """
+    Convert the dense ``position_in_queue`` of every row into a sparse key,
+    keeping the existing service order within each department.
+    """
+    QueueManagement = apps.get_model("operations", "QueueManagement")
+    rows = QueueManagement.objects.order_by(
+        "department", "position_in_queue", "enqueue_time", "id"
+    ).only("id", "department")
+    updated = []
+    department, index = None, 0
+    for row in rows.iterator(chunk_size=2000):
+        if row.department != department:
+            department, index = row.department, 0
+        index += 1
+        row.sort_key = index * KEY_GAP
+        updated.append(row)
+    QueueManagement.objects.bulk_update(updated, ["sort_key"], batch_size=500)
+
+
+def sort_keys_to_positions(apps, schema_editor):
+    QueueManagement = apps.get_model("operations", "QueueManagement")
+    rows = QueueManagement.objects.order_by("department", "sort_key", "id").only(
+        "id", "department"
+    )
+    updated = []
+    department, index = None, 0
+    for row in rows.iterator(chunk_size=2000):
+        if row.department != department:
+            department, index = row.department, 0
+        index += 1
+        row.position_in_queue = index
+        updated.append(row)
+    QueueManagement.objects.bulk_update(updated, ["position_in_queue"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0003_doctoravailability"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="queuemanagement",
+            options={
+                "ordering": ["department", "sort_key", "enqueue_time"],
+                "verbose_name": "Queue Management",
+                "verbose_name_plural": "Queue Management",
+            },
+        ),
+        migrations.AddField(
+            model_name="queuemanagement",
+            name="sort_key",
+            field=models.BigIntegerField(
+                default=0, help_text="Sparse ordering key within the department queue."
+            ),
+        ),
+        migrations.RunPython(positions_to_sort_keys, sort_keys_to_positions),
+        migrations.RemoveField(
+            model_name="queuemanagement",
+            name="position_in_queue",
+        ),
+        migrations.AddField(
+            model_name="queuemanagement",
+            name="started_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Timestamp when the queue started.", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="queuemanagement",
+            index=models.Index(
+                fields=["department", "status", "sort_key"],
+                name="queue_dept_status_key_idx",
+            ),
+        ),
+    ]
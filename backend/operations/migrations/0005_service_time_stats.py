@@ -0,0 +1,137 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+EWMA_ALPHA = 0.2
+
+
+def backfill_service_time_stats(apps, schema_editor):
+    """
+    Seed the per-department statistics from the completed queue history,
+    in one streaming pass ordered by completion time.
+    """
+    QueueManagement = apps.get_model("operations", "QueueManagement")
+    ServiceTimeStats = apps.get_model("operations", "ServiceTimeStats")
+    completed = (
+        QueueManagement.objects.filter(
+            status="completed", started_at__isnull=False, finished_at__isnull=False
+        )
+        .order_by("finished_at")
+        .values_list("department", "started_at", "finished_at")
+    )
+    stats = {}
+    for department, started_at, finished_at in completed.iterator(chunk_size=2000):
+        seconds = (finished_at - started_at).total_seconds()
+        if seconds < 0:
+            continue
+        row = stats.setdefault(department, ServiceTimeStats(department=department))
+        # same update as ServiceTimeStats.add_sample
+        row.sample_count += 1
+        delta = seconds - row.mean_seconds
+        row.mean_seconds += delta / row.sample_count
+        row.m2_seconds += delta * (seconds - row.mean_seconds)
+        if row.sample_count == 1:
+            row.ewma_seconds = seconds
+        else:
+            row.ewma_seconds = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * row.ewma_seconds
+    ServiceTimeStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0004_queue_sort_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceTimeStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        choices=[
+                            ("OPD", "Out Patient Department"),
+                            ("Billing", "Billing"),
+                            ("Pharmacy", "Pharmacy"),
+                            ("Appointment", "Appointment"),
+                        ],
+                        help_text="Department the statistics belong to.",
+                        max_length=100,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "sample_count",
+                    models.PositiveBigIntegerField(
+                        default=0, help_text="Number of completed services recorded."
+                    ),
+                ),
+                (
+                    "mean_seconds",
+                    models.FloatField(
+                        default=0.0,
+                        help_text="Running mean of the service time in seconds.",
+                    ),
+                ),
+                (
+                    "m2_seconds",
+                    models.FloatField(
+                        default=0.0,
+                        help_text="Sum of squared deviations from the mean (Welford).",
+                    ),
+                ),
+                (
+                    "ewma_seconds",
+                    models.FloatField(
+                        default=0.0,
+                        help_text="Exponentially weighted moving average of the service time.",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Service Time Statistics",
+                "verbose_name_plural": "Service Time Statistics",
+                "db_table": "service_time_stats",
+            },
+        ),
+        migrations.AddField(
+            model_name="priorityqueue",
+            name="finished_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Timestamp when the service finished.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="priorityqueue",
+            name="started_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Timestamp when the service started.", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="priorityqueue",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("waiting", "Waiting"),
+                    ("in_progress", "In Progress"),
+                    ("completed", "Completed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="waiting",
+                max_length=50,
+            ),
+        ),
+        migrations.RunPython(backfill_service_time_stats, migrations.RunPython.noop),
+    ]
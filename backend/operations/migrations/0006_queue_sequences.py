@@ -0,0 +1,135 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:01
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_queue_dates(apps, schema_editor):
+    """
+    Date existing entries by the day they were queued and seed the daily
+    counters so new numbers continue after the existing ones.
+    """
+    QueueSequence = apps.get_model("operations", "QueueSequence")
+    last_values = {}
+    for model_name, prefix, timestamp in (
+        ("QueueManagement", "queue", "enqueue_time"),
+        ("PriorityQueue", "priority", "created_at"),
+    ):
+        model = apps.get_model("operations", model_name)
+        rows = model.objects.only("id", "department", "queue_number", timestamp)
+        updated = []
+        for row in rows.iterator(chunk_size=2000):
+            row.queue_date = timezone.localdate(getattr(row, timestamp))
+            key = (f"{prefix}:{row.department}", row.queue_date)
+            last_values[key] = max(last_values.get(key, 0), row.queue_number)
+            updated.append(row)
+        model.objects.bulk_update(updated, ["queue_date"], batch_size=500)
+    QueueSequence.objects.bulk_create(
+        QueueSequence(scope=scope, day=day, last_value=last_value)
+        for (scope, day), last_value in last_values.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0005_service_time_stats"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueueSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        help_text="What the numbers are for, e.g. queue:OPD.",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "day",
+                    models.DateField(
+                        help_text="Day the counter is valid for, numbering restarts every day."
+                    ),
+                ),
+                (
+                    "last_value",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Last number handed out."
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Queue Sequence",
+                "verbose_name_plural": "Queue Sequences",
+                "db_table": "queue_sequences",
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name="queuemanagement",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="priorityqueue",
+            name="queue_date",
+            field=models.DateField(
+                default=django.utils.timezone.localdate,
+                help_text="Day the queue number was issued for.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="queuemanagement",
+            name="queue_date",
+            field=models.DateField(
+                default=django.utils.timezone.localdate,
+                help_text="Day the queue number was issued for.",
+            ),
+        ),
+        migrations.RunPython(backfill_queue_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="priorityqueue",
+            name="queue_number",
+            field=models.PositiveIntegerField(
+                help_text="Queue number for the priority patient, restarts every day per department."
+            ),
+        ),
+        migrations.AlterField(
+            model_name="queuemanagement",
+            name="queue_number",
+            field=models.PositiveIntegerField(
+                help_text="Queue number, restarts every day per department."
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="priorityqueue",
+            constraint=models.UniqueConstraint(
+                fields=("department", "queue_date", "queue_number"),
+                name="unique_priority_number_per_department_day",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="queuemanagement",
+            constraint=models.UniqueConstraint(
+                fields=("department", "queue_date", "queue_number"),
+                name="unique_queue_number_per_department_day",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="queuesequence",
+            constraint=models.UniqueConstraint(
+                fields=("scope", "day"), name="unique_queue_sequence_scope_day"
+            ),
+        ),
+    ]
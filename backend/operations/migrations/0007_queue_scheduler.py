@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0006_queue_sequences"),
+        ("users", "0005_nurseprofile_department"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="priorityqueue",
+            name="served_by",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Staff member who called the patient.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="served_priority_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="queuemanagement",
+            name="served_by",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Staff member who called the patient.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="served_queue_entries",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="priorityqueue",
+            index=models.Index(
+                fields=["department", "status", "priority_level", "priority_position"],
+                name="priority_dept_status_pos_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="priorityqueue",
+            index=models.Index(
+                fields=["department", "started_at"], name="priority_dept_started_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="queuemanagement",
+            index=models.Index(
+                fields=["department", "started_at"], name="queue_dept_started_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,170 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:12
+
+import backend.operations.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# fields each seeded event carries, mirrors event_log.EVENT_FIELDS
+SEED_FIELDS = {
+    "normal": {
+        "enqueue": ["queue_number", "queue_date", "sort_key", "enqueue_time"],
+        "call": ["status", "started_at", "dequeue_time", "served_by_id"],
+        "complete": ["status", "started_at", "finished_at", "actual_wait_time"],
+        "cancel": ["status", "dequeue_time"],
+    },
+    "priority": {
+        "enqueue": [
+            "appointment_id_id", "queue_number", "queue_date", "priority_level",
+            "priority_position", "skip_normal_queues", "created_at",
+        ],
+        "call": ["status", "started_at", "served_by_id"],
+        "complete": ["status", "started_at", "finished_at", "actual_wait_time"],
+        "cancel": ["status"],
+    },
+}
+STATUS_EVENTS = {
+    "in_progress": ["call"],
+    "completed": ["call", "complete"],
+    "cancelled": ["cancel"],
+}
+
+
+def seed_queue_events(apps, schema_editor):
+    """
+    Give every existing entry an enqueue event and the events that led to
+    its current status, so the log can rebuild rows created before it.
+    """
+    QueueEvent = apps.get_model("operations", "QueueEvent")
+    for model_name, lane, queued_at in (
+        ("QueueManagement", "normal", "enqueue_time"),
+        ("PriorityQueue", "priority", "created_at"),
+    ):
+        model = apps.get_model("operations", model_name)
+        fields = SEED_FIELDS[lane]
+        batch = []
+        for row in model.objects.order_by("id").iterator(chunk_size=2000):
+            for event_type in ["enqueue"] + STATUS_EVENTS.get(row.status, []):
+                data = {field: getattr(row, field) for field in fields[event_type]}
+                if event_type == "enqueue":
+                    data["status"] = "waiting"
+                occurred_at = {
+                    "enqueue": getattr(row, queued_at),
+                    "call": row.started_at,
+                    "complete": row.finished_at,
+                }.get(event_type) or row.updated_at
+                batch.append(QueueEvent(
+                    event_type=event_type,
+                    lane=lane,
+                    entry_id=row.id,
+                    department=row.department,
+                    patient_id=row.patient_id,
+                    data=data,
+                    occurred_at=occurred_at,
+                ))
+            if len(batch) >= 2000:
+                QueueEvent.objects.bulk_create(batch)
+                batch = []
+        QueueEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0007_queue_scheduler"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueueEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "event_type",
+                    models.CharField(
+                        choices=[
+                            ("enqueue", "Enqueue"),
+                            ("call", "Call"),
+                            ("start", "Start"),
+                            ("complete", "Complete"),
+                            ("cancel", "Cancel"),
+                            ("transfer", "Transfer"),
+                            ("reposition", "Reposition"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "lane",
+                    models.CharField(
+                        choices=[
+                            ("normal", "Normal Queue"),
+                            ("priority", "Priority Queue"),
+                        ],
+                        help_text="Queue table the entry lives in.",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "entry_id",
+                    models.PositiveBigIntegerField(
+                        help_text="Id of the queue entry the event belongs to."
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        help_text="Department of the entry after the event.",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        encoder=backend.operations.models.QueueEventEncoder,
+                        help_text="Fields changed by the event.",
+                    ),
+                ),
+                (
+                    "occurred_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="users.patientprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Queue Event",
+                "verbose_name_plural": "Queue Events",
+                "db_table": "queue_events",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["department", "occurred_at"],
+                        name="queue_event_dept_time_idx",
+                    ),
+                    models.Index(
+                        fields=["lane", "entry_id", "id"], name="queue_event_entry_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(seed_queue_events, migrations.RunPython.noop),
+    ]
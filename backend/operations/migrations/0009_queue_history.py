@@ -0,0 +1,123 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0008_queue_events"),
+        ("users", "0005_nurseprofile_department"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QueueHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "lane",
+                    models.CharField(
+                        choices=[
+                            ("normal", "Normal Queue"),
+                            ("priority", "Priority Queue"),
+                        ],
+                        help_text="Queue table the entry came from.",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "entry_id",
+                    models.PositiveBigIntegerField(
+                        help_text="Id of the entry in its queue table."
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        help_text="Department the entry was queued in.", max_length=100
+                    ),
+                ),
+                ("queue_number", models.PositiveIntegerField()),
+                (
+                    "queue_date",
+                    models.DateField(help_text="Day the queue number was issued for."),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        help_text="Status of the entry when it was archived.",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "priority_level",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="Priority level, priority queue only.",
+                        max_length=50,
+                    ),
+                ),
+                ("enqueue_time", models.DateTimeField()),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("actual_wait_time", models.DurationField(blank=True, null=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="queue_history",
+                        to="users.patientprofile",
+                    ),
+                ),
+                (
+                    "served_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Queue History",
+                "verbose_name_plural": "Queue History",
+                "db_table": "queue_history",
+                "ordering": ["-enqueue_time"],
+                "indexes": [
+                    models.Index(
+                        fields=["department", "queue_date"],
+                        name="queue_history_dept_day_idx",
+                    ),
+                    models.Index(
+                        fields=["patient", "enqueue_time"],
+                        name="queue_history_patient_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("lane", "entry_id"), name="unique_queue_history_entry"
+                    )
+                ],
+            },
+        ),
+    ]
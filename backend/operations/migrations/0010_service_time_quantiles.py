@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0009_queue_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceTimeQuantile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        help_text="Department the quantiles belong to.", max_length=100
+                    ),
+                ),
+                (
+                    "weekday",
+                    models.PositiveSmallIntegerField(
+                        help_text="Day of the week, 0 is Monday."
+                    ),
+                ),
+                (
+                    "hour",
+                    models.PositiveSmallIntegerField(
+                        help_text="Hour of the day the services started, local time."
+                    ),
+                ),
+                (
+                    "sample_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Completed services in the bucket."
+                    ),
+                ),
+                (
+                    "p50_seconds",
+                    models.FloatField(help_text="Median service time in seconds."),
+                ),
+                (
+                    "p90_seconds",
+                    models.FloatField(
+                        help_text="90th percentile service time in seconds."
+                    ),
+                ),
+                ("built_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Service Time Quantile",
+                "verbose_name_plural": "Service Time Quantiles",
+                "db_table": "service_time_quantiles",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("department", "weekday", "hour"),
+                        name="unique_service_quantile_bucket",
+                    )
+                ],
+            },
+        ),
+    ]
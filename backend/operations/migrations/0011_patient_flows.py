@@ -0,0 +1,98 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0010_service_time_quantiles"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatientFlow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "flow",
+                    models.CharField(
+                        help_text="Name of the stage graph, a key of QUEUE_FLOWS.",
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "current_stage",
+                    models.CharField(
+                        help_text="Department the patient is queued in or was last served by.",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                        ],
+                        default="active",
+                        max_length=20,
+                    ),
+                ),
+                ("stages_completed", models.PositiveSmallIntegerField(default=0)),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "flow_time",
+                    models.DurationField(
+                        blank=True,
+                        help_text="Time from entering the first stage to completing the last.",
+                        null=True,
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="flows",
+                        to="users.patientprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Patient Flow",
+                "verbose_name_plural": "Patient Flows",
+                "db_table": "patient_flows",
+            },
+        ),
+        migrations.AddField(
+            model_name="queuemanagement",
+            name="flow",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Patient flow this entry is a stage of.",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="entries",
+                to="operations.patientflow",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientflow",
+            index=models.Index(
+                fields=["flow", "status", "started_at"], name="patient_flow_status_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0011_patient_flows"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointmentmanagement",
+            index=models.Index(
+                fields=["doctor", "appointment_date"],
+                name="appointment_doctor_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0012_appointment_doctor_date_index"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorWorkingHours",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "weekday",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Monday"),
+                            (1, "Tuesday"),
+                            (2, "Wednesday"),
+                            (3, "Thursday"),
+                            (4, "Friday"),
+                            (5, "Saturday"),
+                            (6, "Sunday"),
+                        ]
+                    ),
+                ),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                (
+                    "doctor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="working_hours",
+                        to="users.generaldoctorprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Doctor Working Hours",
+                "verbose_name_plural": "Doctor Working Hours",
+                "db_table": "doctor_working_hours",
+                "ordering": ["doctor", "weekday", "start_time"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("doctor", "weekday", "start_time"),
+                        name="unique_doctor_working_hours",
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(("end_time__gt", models.F("start_time"))),
+                        name="working_hours_end_after_start",
+                    ),
+                ],
+            },
+        ),
+    ]
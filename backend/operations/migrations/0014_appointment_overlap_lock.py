@@ -0,0 +1,104 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from datetime import timedelta
+
+
+def backfill_appointment_end(apps, schema_editor):
+    # existing appointments last one slot
+    AppointmentManagement = apps.get_model("operations", "AppointmentManagement")
+    duration = timedelta(minutes=getattr(settings, "APPOINTMENT_SLOT_MINUTES", 30))
+    AppointmentManagement.objects.filter(appointment_end__isnull=True).update(
+        appointment_end=ExpressionWrapper(F("appointment_date") + duration, output_field=models.DateTimeField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0013_doctor_working_hours"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DoctorDayLock",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "lock_count",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Times the day was locked for a booking."
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Doctor Day Lock",
+                "verbose_name_plural": "Doctor Day Locks",
+                "db_table": "doctor_day_locks",
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="appointmentmanagement",
+            name="appointment_doctor_date_idx",
+        ),
+        migrations.AddField(
+            model_name="appointmentmanagement",
+            name="appointment_end",
+            field=models.DateTimeField(
+                help_text="End of the appointment, the start plus its duration.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(backfill_appointment_end, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="appointmentmanagement",
+            name="appointment_end",
+            field=models.DateTimeField(
+                help_text="End of the appointment, the start plus its duration."
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointmentmanagement",
+            index=models.Index(
+                fields=["doctor", "appointment_date", "appointment_end"],
+                name="appointment_doctor_span_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="appointmentmanagement",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("appointment_end__gt", models.F("appointment_date"))
+                ),
+                name="appointment_end_after_start",
+            ),
+        ),
+        migrations.AddField(
+            model_name="doctordaylock",
+            name="doctor",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="day_locks",
+                to="users.generaldoctorprofile",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="doctordaylock",
+            constraint=models.UniqueConstraint(
+                fields=("doctor", "day"), name="unique_doctor_day_lock"
+            ),
+        ),
+    ]
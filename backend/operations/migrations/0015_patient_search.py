@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_patient_search(apps, schema_editor):
+    # FTS5 index of patient names, SQLite only (see patient_search.py)
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    PatientProfile = apps.get_model("users", "PatientProfile")
+    User = apps.get_model("users", "User")
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5("
+            "full_name, email, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5, search falls back to a prefix match
+        return
+    schema_editor.execute(
+        "INSERT INTO patient_search (rowid, full_name, email) "
+        f"SELECT p.id, u.full_name, u.email FROM {PatientProfile._meta.db_table} p "
+        f"JOIN {User._meta.db_table} u ON u.id = p.user_id"
+    )
+
+
+def drop_patient_search(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS patient_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0014_appointment_overlap_lock"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_patient_search, drop_patient_search),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0015_patient_search"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentmanagement",
+            name="reminder_sent_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the reminder notifications were sent.",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointmentmanagement",
+            index=models.Index(
+                condition=models.Q(
+                    ("reminder_sent_at__isnull", True), ("status", "scheduled")
+                ),
+                fields=["appointment_date"],
+                name="appointment_reminder_due_idx",
+            ),
+        ),
+    ]
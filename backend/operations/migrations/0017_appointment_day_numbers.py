@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:53
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_appointment_day(apps, schema_editor):
+    # existing appointments keep their numbers, each doctor's daily sequence
+    # starts after the highest one already used on that day
+    AppointmentManagement = apps.get_model("operations", "AppointmentManagement")
+    QueueSequence = apps.get_model("operations", "QueueSequence")
+    appointments = []
+    last_values = {}
+    for appointment in AppointmentManagement.objects.only("appointment_date", "doctor_id", "queue_number").iterator():
+        appointment.appointment_day = timezone.localdate(appointment.appointment_date)
+        appointments.append(appointment)
+        key = (f"appointment:{appointment.doctor_id}", appointment.appointment_day)
+        last_values[key] = max(last_values.get(key, 0), appointment.queue_number)
+    AppointmentManagement.objects.bulk_update(appointments, ["appointment_day"], batch_size=1000)
+    QueueSequence.objects.bulk_create(
+        [QueueSequence(scope=scope, day=day, last_value=last_value) for (scope, day), last_value in last_values.items()],
+        batch_size=1000,
+    )
+
+
+def remove_appointment_sequences(apps, schema_editor):
+    QueueSequence = apps.get_model("operations", "QueueSequence")
+    QueueSequence.objects.filter(scope__startswith="appointment:").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0016_appointment_reminders"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentmanagement",
+            name="appointment_day",
+            field=models.DateField(
+                help_text="Local day of the appointment, queue numbers restart every day per doctor.",
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="appointmentmanagement",
+            name="queue_number",
+            field=models.PositiveIntegerField(
+                help_text="Queue number for the appointment, restarts every day per doctor."
+            ),
+        ),
+        migrations.RunPython(backfill_appointment_day, remove_appointment_sequences),
+        migrations.AlterField(
+            model_name="appointmentmanagement",
+            name="appointment_day",
+            field=models.DateField(
+                help_text="Local day of the appointment, queue numbers restart every day per doctor."
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="appointmentmanagement",
+            constraint=models.UniqueConstraint(
+                fields=("doctor", "appointment_day", "queue_number"),
+                name="unique_appointment_number_per_doctor_day",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0017_appointment_day_numbers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointmentmanagement",
+            name="version",
+            field=models.PositiveIntegerField(
+                default=1, help_text="Row version, incremented by every update."
+            ),
+        ),
+    ]
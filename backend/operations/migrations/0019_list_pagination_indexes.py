@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0018_appointment_version"),
+        ("users", "0005_nurseprofile_department"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="notification_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="queuehistory",
+            index=models.Index(
+                fields=["enqueue_time", "lane", "entry_id"],
+                name="queue_history_time_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("operations", "0019_list_pagination_indexes"),
+        ("users", "0005_nurseprofile_department"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CalendarFeedKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("secret", models.CharField(max_length=32)),
+                (
+                    "updated_at",
+                    models.DateTimeField(
+                        auto_now=True, help_text="When the secret was last generated."
+                    ),
+                ),
+                (
+                    "doctor",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="calendar_feed_key",
+                        to="users.generaldoctorprofile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Calendar Feed Key",
+                "verbose_name_plural": "Calendar Feed Keys",
+                "db_table": "calendar_feed_keys",
+            },
+        ),
+    ]
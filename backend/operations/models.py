@@ -1,8 +1,9 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from backend.users.models import GeneralDoctorProfile, NurseProfile, PatientProfile
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 
 # Custom User Model
@@ -32,10 +33,35 @@ class Notification(models.Model):
         db_table = "notifications"
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
+        indexes = [
+            # a user's notifications newest first, paged by (created_at, id)
+            models.Index(fields=["user", "created_at", "id"], name="notification_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.full_name}: {self.message[:50]}..."  # Display first 50 characters of the message
 
+#counter rows used to hand out queue numbers, see sequences.py
+class QueueSequence(models.Model):
+    """
+    One counter per scope (e.g. "queue:OPD") and day.
+    Numbers are reserved by incrementing last_value atomically.
+    """
+    scope = models.CharField(max_length=100, help_text="What the numbers are for, e.g. queue:OPD.")
+    day = models.DateField(help_text="Day the counter is valid for, numbering restarts every day.")
+    last_value = models.PositiveIntegerField(default=0, help_text="Last number handed out.")
+
+    class Meta:
+        db_table = "queue_sequences"
+        verbose_name = "Queue Sequence"
+        verbose_name_plural = "Queue Sequences"
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "day"], name="unique_queue_sequence_scope_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} on {self.day}: {self.last_value}"
+
 #queueing system for operations normal queues
 class QueueManagement(models.Model):
     """Queue management model for handling patient queues in operations.
@@ -44,7 +70,8 @@ class QueueManagement(models.Model):
     - FIFO
     """
     patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name="queue_management")
-    queue_number = models.PositiveIntegerField(unique=True)
+    queue_number = models.PositiveIntegerField(help_text="Queue number, restarts every day per department.")
+    queue_date = models.DateField(default=timezone.localdate, help_text="Day the queue number was issued for.")
     notification = models.ForeignKey(Notification, on_delete=models.SET_NULL, null=True, blank=True, related_name="queue_management")
     total_patients = models.PositiveIntegerField(default=0, help_text="Total number of patients in the queue.")
     estimated_wait_time = models.DurationField(null=True, blank=True, help_text="Estimated wait time for the patient.")
@@ -65,110 +92,121 @@ class QueueManagement(models.Model):
         ("cancelled", "Cancelled"),
     ], default="waiting")
     
-    #implementation of FIFO 
-    position_in_queue = models.PositiveIntegerField(default=0, help_text="Position in the queue.")
+    #implementation of FIFO using sparse ordering keys, see queue_engine.py
+    sort_key = models.BigIntegerField(default=0, help_text="Sparse ordering key within the department queue.")
     enqueue_time = models.DateTimeField(help_text="Timestamp when the patient was added to the queue."
                                         ,default=timezone.now)
     dequeue_time = models.DateTimeField(null=True, blank=True, help_text="Timestamp when the patient was removed from the queue.")
     started_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp when the queue started.")
+    served_by = models.ForeignKey(Users, on_delete=models.SET_NULL, null=True, blank=True, related_name="served_queue_entries", help_text="Staff member who called the patient.")
+    flow = models.ForeignKey("PatientFlow", on_delete=models.SET_NULL, null=True, blank=True, related_name="entries", help_text="Patient flow this entry is a stage of.")
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["department", "position_in_queue", "enqueue_time"]
+        ordering = ["department", "sort_key", "enqueue_time"]
         db_table = "queue_management"
         verbose_name = "Queue Management"
         verbose_name_plural = "Queue Management"
-        unique_together = ["department", "queue_number", "patient"] #each patient should have unique queue number when queueing in different departments
+        constraints = [
+            #queue numbers are unique per department and day
+            models.UniqueConstraint(fields=["department", "queue_date", "queue_number"], name="unique_queue_number_per_department_day"),
+        ]
+        indexes = [
+            models.Index(fields=["department", "status", "sort_key"], name="queue_dept_status_key_idx"),
+            models.Index(fields=["department", "started_at"], name="queue_dept_started_idx"),
+        ]
         
     #fifo implementtion
     def save(self, *args, **kwargs):
-        #auto sign the queueung number in each patients
-        if not self.position_in_queue_number:
-            last_position = QueueManagement.objects.filter(
-                department=self.department, status_in_queue =[
-                    'waiting', 'in_progress', 'cancelled'
-                ]).aggregate(
-                    maximum_position = models.Max("position_in_queue", default=0
-                )["position" + 1]
-            )
-        
-        #automaticall assigns the patient queue number
+        from . import event_log, queue_engine, sequences
+
+        #automaticall assigns the patient queue number from the department's daily sequence
         if not self.queue_number:
-            last_queue_number = QueueManagement.objects.filter(
-                department=self.department).aggregate(
-                    maximum_queue_number = models.Max("queue_number", default=0)
+            self.queue_number = sequences.allocator.next_number(
+                sequences.queue_scope(self.department), self.queue_date
             )
-        super().save(*args, **kwargs)
-        self.update_queue_positions()
-    
-    #update the queueu 
-    def update_queue_positions(self):
+
+        #new patients go to the back of the queue, nobody else is touched
+        adding = self._state.adding
+        if adding and not self.sort_key:
+            queue_engine.enqueue(self)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                event_log.record("enqueue", self)
+
+    @property
+    def position_in_queue(self):
         """
-        Update the positions for all waiting patients in the queue.
+        1-based position among the waiting patients, computed on read.
+        Uses the ``queue_rank`` annotation when the row came from
+        ``queue_engine.ranked_queue``.
         """
-        waiting_patients = QueueManagement.objects.filter(
-            department=self.department, status="waiting"
-            ).order_by("enqueue_time")
-        
-        #ensures that each patient has a position in queueu
-        for index, patient in enumerate(waiting_patients, start=1):
-            if patient.position_in_queue != index:
-                patient.position_in_queue = index
-                QueueManagement.objects.filter(id=patient.id).update(position_in_queue=index)
-        
-        
+        if hasattr(self, "queue_rank"):
+            return self.queue_rank
+        from . import queue_engine
+        return queue_engine.rank(self)
+
         #get the patient estimated waiting time
         """
         calculate the estimated waiting time for each patient in the queue.
         """
     def get_estimated_wait_time(self):
+        wait_range = self.get_estimated_wait_range()
+        return wait_range[0] if wait_range else None
+
+    def get_estimated_wait_range(self):
+        """
+        (p50, p90) wait from the time-of-day service quantiles.
+        """
         if self.status != "waiting":
             return None
-        
-        # Calculate average service time
-        completed_queues = QueueManagement.objects.filter(
-            department=self.department, status="completed",
-            started_at__isnull=False, finished_at__isnull=False
-        )
-        total_service_time = sum([q.finished_at - q.started_at for q in completed_queues], timedelta())
-        
-        if completed_queues.count() > 0:
-            avg_service_time = total_service_time / completed_queues.count()
-        else:
-            # Use a default value if no one has completed yet
-            avg_service_time = timedelta(minutes=15) 
+        from . import queue_engine
+        from .wait_model import WaitModel
 
         # Count patients ahead
-        patients_ahead_count = QueueManagement.objects.filter(
-            department=self.department,
-            status__in=["waiting", "in_progress"],
-            position_in_queue__lt=self.position_in_queue
-        ).count()
+        patients_ahead_count = queue_engine.patients_ahead(self)
         
-        return avg_service_time * patients_ahead_count
+        return WaitModel.for_department(self.department).wait_range(patients_ahead_count)
     
-    def started_at(self):
+    def start_service(self):
         """
         The time where the service actually started.
         """
+        from . import event_log
+
         self.status = "in_progress"
         self.started_at = timezone.now()
-        self.save()
+        self.dequeue_time = self.dequeue_time or self.started_at
+        with transaction.atomic():
+            self.save()
+            event_log.record("start", self)
         
         """
         time when the service is completed
         """
-    def completed_at(self):
+    def complete_service(self):
+        from . import event_log
+
+        #an entry that is part of an active patient flow moves on to the next
+        #stage, one of a cancelled flow (still being served) just completes
+        if self.flow_id and PatientFlow.objects.filter(pk=self.flow_id, status="active").exists():
+            from . import flows
+            flows.advance(self)
+            return
+
         self.status = "completed"
-        self.completed_at = timezone.now()
+        self.finished_at = timezone.now()
         
         if self.started_at:
             self.actual_wait_time = self.started_at - self.enqueue_time
-        self.save()
-        #update the patients wueue positions or number 
-        self.update_queue_positions()
+        with transaction.atomic():
+            self.save()
+            event_log.record("complete", self)
+            if self.started_at:
+                ServiceTimeStats.record(self.department, self.finished_at - self.started_at)
         
     def get_next_in_queue(self):
         """
@@ -176,18 +214,284 @@ class QueueManagement(models.Model):
         """
         next_patient = QueueManagement.objects.filter(
             department=self.department, status="waiting"
-        ).order_by("position_in_queue").first()
+        ).order_by("sort_key", "id").first()
         return next_patient
     @classmethod
     def get_queue_by_dept(cls, department):
         """
         Get the queue for a specific department.
         """
-        queue = cls.objects.filter(department=department).order_by("position_in_queue")
+        from . import queue_engine
+        return queue_engine.ranked_queue(department)
         
     def __str__(self):
         return f"Queue {self.queue_number} - Patient: {self.patient.full_name}"
     
+#running service time statistics per department for wait time estimates
+class ServiceTimeStats(models.Model):
+    """
+    Incrementally updated service time statistics for a department.
+    - One row per department, updated each time a service completes.
+    - Keeps a running mean and variance (Welford) and an EWMA that follows
+      the recent pace of the department.
+    """
+    department = models.CharField(max_length=100, unique=True, choices=[
+        ("OPD", "Out Patient Department"),
+        ("Billing", "Billing"),
+        ("Pharmacy", "Pharmacy"),
+        ("Appointment", "Appointment"),
+    ], help_text="Department the statistics belong to.")
+    sample_count = models.PositiveBigIntegerField(default=0, help_text="Number of completed services recorded.")
+    mean_seconds = models.FloatField(default=0.0, help_text="Running mean of the service time in seconds.")
+    m2_seconds = models.FloatField(default=0.0, help_text="Sum of squared deviations from the mean (Welford).")
+    ewma_seconds = models.FloatField(default=0.0, help_text="Exponentially weighted moving average of the service time.")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    #used until a department has completed its first service
+    DEFAULT_SERVICE_TIME = timedelta(minutes=15)
+    EWMA_ALPHA = 0.2
+
+    class Meta:
+        db_table = "service_time_stats"
+        verbose_name = "Service Time Statistics"
+        verbose_name_plural = "Service Time Statistics"
+
+    def add_sample(self, seconds, alpha=EWMA_ALPHA):
+        """
+        Fold one service time into the running statistics.
+        """
+        self.sample_count += 1
+        delta = seconds - self.mean_seconds
+        self.mean_seconds += delta / self.sample_count
+        self.m2_seconds += delta * (seconds - self.mean_seconds)
+        if self.sample_count == 1:
+            self.ewma_seconds = seconds
+        else:
+            self.ewma_seconds = alpha * seconds + (1 - alpha) * self.ewma_seconds
+
+    @property
+    def variance_seconds(self):
+        if self.sample_count < 2:
+            return 0.0
+        return self.m2_seconds / (self.sample_count - 1)
+
+    @property
+    def service_time(self):
+        """
+        Expected duration of the next service in the department.
+        """
+        if not self.sample_count:
+            return self.DEFAULT_SERVICE_TIME
+        return timedelta(seconds=self.ewma_seconds)
+
+    @classmethod
+    def record(cls, department, duration):
+        """
+        Record a completed service. Only the department's single stats row is
+        read and written, so the cost does not grow with the queue history.
+        """
+        return cls.record_many(department, [duration])
+
+    @classmethod
+    def record_many(cls, department, durations):
+        """
+        Record several completed services of a department with one read and
+        one write of its stats row.
+        """
+        seconds = [duration.total_seconds() for duration in durations]
+        seconds = [value for value in seconds if value >= 0]
+        if not seconds:
+            return None
+        with transaction.atomic():
+            cls.objects.get_or_create(department=department)
+            stats = cls.objects.select_for_update().get(department=department)
+            for value in seconds:
+                stats.add_sample(value)
+            stats.save()
+        return stats
+
+    @classmethod
+    def service_time_for(cls, department):
+        """
+        Expected service time for a department, one primary key lookup.
+        """
+        stats = cls.objects.filter(department=department).first()
+        return stats.service_time if stats else cls.DEFAULT_SERVICE_TIME
+
+    def __str__(self):
+        return f"{self.department} service time: {self.service_time} ({self.sample_count} samples)"
+
+    @property
+    def stdev_seconds(self):
+        return self.variance_seconds ** 0.5
+
+
+#a patient's way through several department queues, see flows.py
+class PatientFlow(models.Model):
+    """
+    A patient going through the stages of a flow, e.g. OPD, then Billing,
+    then Pharmacy.
+    - Every stage is a QueueManagement entry pointing back here.
+    - flow_time is the end-to-end time from entering the first stage to
+      completing the last one.
+    """
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name="flows")
+    flow = models.CharField(max_length=50, help_text="Name of the stage graph, a key of QUEUE_FLOWS.")
+    current_stage = models.CharField(max_length=100, help_text="Department the patient is queued in or was last served by.")
+    status = models.CharField(max_length=20, choices=[
+        ("active", "Active"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    ], default="active")
+    stages_completed = models.PositiveSmallIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    flow_time = models.DurationField(null=True, blank=True, help_text="Time from entering the first stage to completing the last.")
+
+    class Meta:
+        db_table = "patient_flows"
+        verbose_name = "Patient Flow"
+        verbose_name_plural = "Patient Flows"
+        indexes = [
+            models.Index(fields=["flow", "status", "started_at"], name="patient_flow_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.flow} flow of {self.patient.user.full_name} ({self.current_stage}, {self.status})"
+
+
+#service time distribution by time of day, rebuilt nightly, see wait_model.py
+class ServiceTimeQuantile(models.Model):
+    """
+    Service time quantiles of a department for one weekday and hour.
+    - Built from completed queue entries by the build_wait_quantiles command.
+    - Read as one cached table, so a lookup is a dict access.
+    """
+    department = models.CharField(max_length=100, help_text="Department the quantiles belong to.")
+    weekday = models.PositiveSmallIntegerField(help_text="Day of the week, 0 is Monday.")
+    hour = models.PositiveSmallIntegerField(help_text="Hour of the day the services started, local time.")
+    sample_count = models.PositiveIntegerField(default=0, help_text="Completed services in the bucket.")
+    p50_seconds = models.FloatField(help_text="Median service time in seconds.")
+    p90_seconds = models.FloatField(help_text="90th percentile service time in seconds.")
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = "service_time_quantiles"
+        verbose_name = "Service Time Quantile"
+        verbose_name_plural = "Service Time Quantiles"
+        constraints = [
+            models.UniqueConstraint(fields=["department", "weekday", "hour"], name="unique_service_quantile_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.department} weekday {self.weekday} {self.hour:02d}h: p50 {self.p50_seconds:.0f}s, p90 {self.p90_seconds:.0f}s"
+
+#append-only history of everything that happens to queue entries, see event_log.py
+class QueueEventEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder of event data. Keeps datetimes at full precision, the
+    Django encoder cuts them to milliseconds and replayed rows would drift.
+    """
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class QueueEvent(models.Model):
+    """
+    Append-only log of queue entry events.
+    - Rows are never updated or deleted; the queue tables are a projection
+      of this log and can be rebuilt from it (see projections.py).
+    - entry_id is not a foreign key so events outlive archived entries.
+    """
+    EVENT_TYPES = [
+        ("enqueue", "Enqueue"),
+        ("call", "Call"),
+        ("start", "Start"),
+        ("complete", "Complete"),
+        ("cancel", "Cancel"),
+        ("transfer", "Transfer"),
+        ("reposition", "Reposition"),
+    ]
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    lane = models.CharField(max_length=20, choices=[
+        ("normal", "Normal Queue"),
+        ("priority", "Priority Queue"),
+    ], help_text="Queue table the entry lives in.")
+    entry_id = models.PositiveBigIntegerField(help_text="Id of the queue entry the event belongs to.")
+    department = models.CharField(max_length=100, help_text="Department of the entry after the event.")
+    patient = models.ForeignKey(PatientProfile, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    data = models.JSONField(default=dict, blank=True, encoder=QueueEventEncoder, help_text="Fields changed by the event.")
+    occurred_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
+        db_table = "queue_events"
+        verbose_name = "Queue Event"
+        verbose_name_plural = "Queue Events"
+        indexes = [
+            models.Index(fields=["department", "occurred_at"], name="queue_event_dept_time_idx"),
+            models.Index(fields=["lane", "entry_id", "id"], name="queue_event_entry_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Queue events are append-only and cannot be changed.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Queue events are append-only and cannot be deleted.")
+
+    def __str__(self):
+        return f"{self.event_type} {self.lane}:{self.entry_id} in {self.department}"
+
+
+#finished queue entries moved out of the hot queue tables, see archive.py
+class QueueHistory(models.Model):
+    """
+    Archive of finished queue entries of both queues.
+    - The nightly archive moves completed and cancelled entries, and anything
+      left from earlier days, here so the queue tables only hold today's
+      active patients.
+    - entry_id keeps the id the entry had in its queue table.
+    """
+    lane = models.CharField(max_length=20, choices=[
+        ("normal", "Normal Queue"),
+        ("priority", "Priority Queue"),
+    ], help_text="Queue table the entry came from.")
+    entry_id = models.PositiveBigIntegerField(help_text="Id of the entry in its queue table.")
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name="queue_history")
+    department = models.CharField(max_length=100, help_text="Department the entry was queued in.")
+    queue_number = models.PositiveIntegerField()
+    queue_date = models.DateField(help_text="Day the queue number was issued for.")
+    status = models.CharField(max_length=50, help_text="Status of the entry when it was archived.")
+    priority_level = models.CharField(max_length=50, blank=True, default="", help_text="Priority level, priority queue only.")
+    enqueue_time = models.DateTimeField()
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    actual_wait_time = models.DurationField(null=True, blank=True)
+    served_by = models.ForeignKey(Users, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-enqueue_time"]
+        db_table = "queue_history"
+        verbose_name = "Queue History"
+        verbose_name_plural = "Queue History"
+        constraints = [
+            models.UniqueConstraint(fields=["lane", "entry_id"], name="unique_queue_history_entry"),
+        ]
+        indexes = [
+            models.Index(fields=["department", "queue_date"], name="queue_history_dept_day_idx"),
+            models.Index(fields=["patient", "enqueue_time"], name="queue_history_patient_idx"),
+            # history pages newest first, keyed by (enqueue_time, lane, entry_id)
+            models.Index(fields=["enqueue_time", "lane", "entry_id"], name="queue_history_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.lane}:{self.entry_id} {self.department} #{self.queue_number} ({self.status})"
+
 #medicine inventory management
 class MedicineInventory(models.Model):
     """Medicine inventory management model.Tracks the available stock of medicines."""
@@ -251,7 +555,11 @@ class AppointmentManagement(models.Model):
         ], default="consultation"
     )
     appointment_time = models.TimeField(help_text="Time of the appointment.")
-    queue_number = models.PositiveIntegerField(unique=True, help_text="Queue number for the appointment.")
+    appointment_end = models.DateTimeField(help_text="End of the appointment, the start plus its duration.")
+    reminder_sent_at = models.DateTimeField(null=True, blank=True, help_text="When the reminder notifications were sent.")
+    appointment_day = models.DateField(help_text="Local day of the appointment, queue numbers restart every day per doctor.")
+    queue_number = models.PositiveIntegerField(help_text="Queue number for the appointment, restarts every day per doctor.")
+    version = models.PositiveIntegerField(default=1, help_text="Row version, incremented by every update.")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     #status of the appointment like scheduled, completed, cancelled, no show
@@ -267,14 +575,62 @@ class AppointmentManagement(models.Model):
         db_table = "appointment_management"
         verbose_name = "Appointment Management"
         verbose_name_plural = "Appointment Management"
+        indexes = [
+            # calendar reads are a date range of one doctor, overlap checks
+            # also read the end from the index
+            models.Index(fields=["doctor", "appointment_date", "appointment_end"], name="appointment_doctor_span_idx"),
+            # the reminder scan only reads appointments still to be reminded
+            models.Index(
+                fields=["appointment_date"],
+                condition=models.Q(status="scheduled", reminder_sent_at__isnull=True),
+                name="appointment_reminder_due_idx",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(appointment_end__gt=models.F("appointment_date")),
+                name="appointment_end_after_start",
+            ),
+            #queue numbers are unique per doctor and day
+            models.UniqueConstraint(fields=["doctor", "appointment_day", "queue_number"], name="unique_appointment_number_per_doctor_day"),
+        ]
 
     def __str__(self):
         return f"Appointment {self.id} - Patient: {self.patient.user.full_name} with Dr. {self.doctor.user.full_name}"
     
     def save(self, *args, **kwargs):
+        from . import bookings, sequences
+
         if self.appointment_date < timezone.now():
             raise ValueError("Appointment date cannot be in the past.")
-        super().save(*args, **kwargs)
+        #a new or moved appointment takes the next number of the doctor's day
+        day = timezone.localdate(self.appointment_date)
+        if day != self.appointment_day:
+            self.appointment_day = day
+            self.queue_number = None
+        if not self.queue_number:
+            self.queue_number = sequences.allocator.next_number(
+                sequences.appointment_scope(self.doctor_id), self.appointment_day
+            )
+        if self.appointment_time is None:
+            self.appointment_time = timezone.localtime(self.appointment_date).time()
+        if self.appointment_end is None:
+            self.appointment_end = self.appointment_date + bookings.default_duration()
+        bookings.check_duration(self.appointment_date, self.appointment_end)
+
+        #no two booked appointments of a doctor overlap, checked under the doctor-day lock
+        with transaction.atomic():
+            if self.status in bookings.BOOKED_STATUSES:
+                bookings.lock_doctor_days(self.doctor_id, [(self.appointment_date, self.appointment_end)])
+                if bookings.overlapping(self.doctor_id, self.appointment_date, self.appointment_end).exclude(pk=self.pk).exists():
+                    raise ValueError("The doctor already has an appointment at this time.")
+            #updates bump the stored version, not the possibly stale one read earlier
+            updating = not self._state.adding
+            if updating:
+                self.version = models.F("version") + 1
+            super().save(*args, **kwargs)
+            if updating:
+                self.refresh_from_db(fields=["version"])
         # This ensures that the appointment date is not in the past.
         # This can be used to check if the appointment is valid or not.
         # This can be used to check if the appointment is scheduled, completed, cancelled, or
@@ -304,73 +660,110 @@ class PriorityQueue(models.Model):
     actual_wait_time = models.DurationField(null=True, blank=True, help_text="Actual wait time for the patient.")
     estimated_wait_time = models.DurationField(null=True, blank=True, help_text="Estimated wait time for the patient.")
     created_at = models.DateTimeField(auto_now_add=True)
-    queue_number = models.PositiveIntegerField(unique=True, help_text="Queue number for the priority patient.")
+    queue_number = models.PositiveIntegerField(help_text="Queue number for the priority patient, restarts every day per department.")
+    queue_date = models.DateField(default=timezone.localdate, help_text="Day the queue number was issued for.")
     
     #priority queue specific fields since priority siya di siya mag-undergo sa fifo
     priority_position = models.PositiveIntegerField(default=0, help_text="Position in the priority queue.")
     skip_normal_queues = models.BooleanField(default=False, help_text="Indicates if the patient should be skipped from the FIFO queue.")
+    status = models.CharField(max_length=50, choices=[
+        ("waiting", "Waiting"),
+        ("in_progress", "In Progress"),
+        ("completed", "Completed"),
+        ("cancelled", "Cancelled"),
+    ], default="waiting")
+    started_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp when the service started.")
+    finished_at = models.DateTimeField(null=True, blank=True, help_text="Timestamp when the service finished.")
+    served_by = models.ForeignKey(Users, on_delete=models.SET_NULL, null=True, blank=True, related_name="served_priority_entries", help_text="Staff member who called the patient.")
 
     class Meta:
         ordering = ["-priority_level", "priority_position", "created_at"]
         db_table = "priority_queue"
         verbose_name = "Priority Queue"
         verbose_name_plural = "Priority Queues"
+        constraints = [
+            models.UniqueConstraint(fields=["department", "queue_date", "queue_number"], name="unique_priority_number_per_department_day"),
+        ]
+        indexes = [
+            models.Index(fields=["department", "status", "priority_level", "priority_position"], name="priority_dept_status_pos_idx"),
+            models.Index(fields=["department", "started_at"], name="priority_dept_started_idx"),
+        ]
         
     def save(self, *args, **kwargs):
-        #auto assign queue number
+        from . import event_log, sequences
+
+        #auto assign queue number from the department's daily priority sequence
         if not self.queue_number:
-            self.queue_number = PriorityQueue.objects.filter(
-                department=self.department
-            ).aggregate(
-                maximum_queue_number = models.Max("queue_number", default=0)
-            )['maximum_queue_number'] + 1
+            self.queue_number = sequences.allocator.next_number(
+                sequences.priority_scope(self.department), self.queue_date
+            )
             
         #auto assign priority positions
         if not self.priority_position:
             self.priority_position = PriorityQueue.objects.filter(
                 department=self.department, priority_level=self.priority_level
             ).count() + 1
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                event_log.record("enqueue", self)
        
     """
     Calculate the estimated waiting time priority lists
     """ 
     def get_estimated_wait_time(self):
+        wait_range = self.get_estimated_wait_range()
+        return wait_range[0] if wait_range else None
+
+    def get_estimated_wait_range(self):
+        """
+        (p50, p90) wait from the time-of-day service quantiles.
+        """
         if self.status != "waiting":
             return None
-        
-        # Calculate average service time
-        completed_queues = QueueManagement.objects.filter(
-            department=self.department, status="completed",
-            started_at__isnull=False, finished_at__isnull=False
-        )
-        total_service_time = sum([q.finished_at - q.started_at for q in completed_queues], timedelta())
-        
-        if completed_queues.count() > 0:
-            avg_service_time = total_service_time / completed_queues.count()
-        else:
-            # Use a default value if no one has completed yet
-            avg_service_time = timedelta(minutes=15) 
+        from .wait_model import WaitModel
             
-        #count the patients in higher priority like seniors, pwd something like that
-        higher_priority_count = PriorityQueue.objects.filter(
-            department=self.department,status_in=[
-                "waitng", "in_progress"],
-            priority_level__in=["pwd", "senior"],
-            priority_position__lt=self.priority_position
+        #count the priority patients (seniors, pwd) served before this one,
+        #in the aged priority order the scheduler uses right now
+        from . import scheduler
+        waiting = PriorityQueue.objects.filter(department=self.department, status="waiting")
+        order = [entry.id for entry in scheduler.priority_order(waiting)]
+        patients_ahead = PriorityQueue.objects.filter(
+            department=self.department, status="in_progress"
         ).count()
+        if self.id in order:
+            patients_ahead += order.index(self.id)
         
-        if self.priority_level == "senior":
-            patients_ahead = higher_priority_count
-        elif self.priority_level == "pwd":
-            patients_ahead = higher_priority_count
-        else: #low priority or just the people in normal queues
-            low_priority_count = PriorityQueue.objects.filter(
-                department=self.department,status_in=[
-                "waitng", "in_progress"]
-            ).count()
-        
-        return avg_service_time * patients_ahead
+        return WaitModel.for_department(self.department).wait_range(patients_ahead)
+
+    def start_service(self):
+        """
+        The time where the service actually started.
+        """
+        from . import event_log
+
+        self.status = "in_progress"
+        self.started_at = timezone.now()
+        with transaction.atomic():
+            self.save()
+            event_log.record("start", self)
+
+    def complete_service(self):
+        """
+        Time when the service is completed, feeds the department stats.
+        """
+        from . import event_log
+
+        self.status = "completed"
+        self.finished_at = timezone.now()
+        if self.started_at:
+            self.actual_wait_time = self.started_at - self.created_at
+        with transaction.atomic():
+            self.save()
+            event_log.record("complete", self)
+            if self.started_at:
+                ServiceTimeStats.record(self.department, self.finished_at - self.started_at)
 
     def __str__(self):
         return f"Priority Queue - Patient: {self.patient.user.full_name} ({self.priority_level})"
@@ -412,4 +805,78 @@ class DoctorAvailability(models.Model):
         unique_together = ["doctor", "date"]
 
     def __str__(self):
-        return f"Dr. {self.doctor.user.full_name} - {self.date} ({'Blocked' if self.is_blocked else 'Available'})"
\ No newline at end of file
+        return f"Dr. {self.doctor.user.full_name} - {self.date} ({'Blocked' if self.is_blocked else 'Available'})"
+
+class DoctorWorkingHours(models.Model):
+    """
+    Weekly working hours of a doctor, one row per interval (e.g. Monday
+    08:00-12:00 and 13:00-17:00). Appointment slots are cut from these,
+    see slots.py; doctors without rows work APPOINTMENT_DEFAULT_WORKING_HOURS.
+    """
+    WEEKDAYS = [
+        (0, "Monday"),
+        (1, "Tuesday"),
+        (2, "Wednesday"),
+        (3, "Thursday"),
+        (4, "Friday"),
+        (5, "Saturday"),
+        (6, "Sunday"),
+    ]
+
+    doctor = models.ForeignKey(GeneralDoctorProfile, on_delete=models.CASCADE, related_name="working_hours")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ["doctor", "weekday", "start_time"]
+        db_table = "doctor_working_hours"
+        verbose_name = "Doctor Working Hours"
+        verbose_name_plural = "Doctor Working Hours"
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "weekday", "start_time"], name="unique_doctor_working_hours"),
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F("start_time")), name="working_hours_end_after_start"),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.user.full_name} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class DoctorDayLock(models.Model):
+    """
+    One row per doctor and day, updated at the start of every booking
+    transaction of that day so overlapping bookings are checked one at a
+    time (see bookings.lock_doctor_days).
+    """
+    doctor = models.ForeignKey(GeneralDoctorProfile, on_delete=models.CASCADE, related_name="day_locks")
+    day = models.DateField()
+    lock_count = models.PositiveIntegerField(default=0, help_text="Times the day was locked for a booking.")
+
+    class Meta:
+        db_table = "doctor_day_locks"
+        verbose_name = "Doctor Day Lock"
+        verbose_name_plural = "Doctor Day Locks"
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "day"], name="unique_doctor_day_lock"),
+        ]
+
+    def __str__(self):
+        return f"Doctor {self.doctor_id} on {self.day}"
+
+
+class CalendarFeedKey(models.Model):
+    """
+    Secret of a doctor's iCalendar feed URL. It is part of the signed feed
+    token (see ical.feed_token), so a new secret revokes the old URL.
+    """
+    doctor = models.OneToOneField(GeneralDoctorProfile, on_delete=models.CASCADE, related_name="calendar_feed_key")
+    secret = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True, help_text="When the secret was last generated.")
+
+    class Meta:
+        db_table = "calendar_feed_keys"
+        verbose_name = "Calendar Feed Key"
+        verbose_name_plural = "Calendar Feed Keys"
+
+    def __str__(self):
+        return f"Calendar feed key of doctor {self.doctor_id}"
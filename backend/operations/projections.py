@@ -0,0 +1,122 @@
+"""
+Projection of the queue event log onto the queue tables.
+
+The queue tables hold the current state of every entry and are kept up to
+date by the same transactions that append the events (see event_log.py).
+``rebuild`` re-derives that state from the log alone in one streaming pass
+over the events, and can either report where the tables drifted from the
+log or write the projected state back.
+"""
+from django.db import transaction
+
+from .models import PriorityQueue, QueueEvent, QueueHistory, QueueManagement
+from . import events
+
+LANE_MODELS = {
+    "normal": QueueManagement,
+    "priority": PriorityQueue,
+}
+
+
+def _fields(model):
+    return {field.attname: field for field in model._meta.concrete_fields}
+
+
+def apply(state, event_type, department, patient_id, data, occurred_at, fields):
+    """
+    Fold one event into the projected state of its entry.
+    """
+    if not state:
+        state["created_at"] = occurred_at
+    state["department"] = department
+    state["patient_id"] = patient_id
+    for attname, value in data.items():
+        if attname in fields:
+            state[attname] = fields[attname].to_python(value)
+    if "updated_at" in fields:
+        state["updated_at"] = occurred_at
+    return state
+
+
+def replay(lane, chunk_size=5000):
+    """
+    Projected state of every entry of a lane, ``{entry_id: {attname: value}}``,
+    from one ordered pass over the lane's events.
+    """
+    fields = _fields(LANE_MODELS[lane])
+    states = {}
+    rows = (
+        QueueEvent.objects.filter(lane=lane)
+        .order_by("id")
+        .values_list("entry_id", "event_type", "department", "patient_id", "data", "occurred_at")
+    )
+    count = 0
+    for entry_id, event_type, department, patient_id, data, occurred_at in rows.iterator(chunk_size=chunk_size):
+        apply(states.setdefault(entry_id, {}), event_type, department, patient_id, data, occurred_at, fields)
+        count += 1
+    return states, count
+
+
+def rebuild(lane, write=True, chunk_size=5000):
+    """
+    Compare the table of a lane with the projection of its events and,
+    when ``write`` is set, bring drifted or missing rows back in line.
+    Rows without any event are left alone, archived entries are not
+    brought back.
+    """
+    model = LANE_MODELS[lane]
+    states, event_count = replay(lane, chunk_size)
+    summary = {
+        "events": event_count, "entries": len(states),
+        "unchanged": 0, "updated": 0, "created": 0, "archived": 0,
+    }
+    departments = set()
+
+    entry_ids = list(states)
+    for start in range(0, len(entry_ids), chunk_size):
+        batch = entry_ids[start:start + chunk_size]
+        existing = model.objects.in_bulk(batch)
+        changed, changed_fields, missing = [], set(), []
+        for entry_id in batch:
+            state = states[entry_id]
+            row = existing.get(entry_id)
+            if row is None:
+                missing.append(model(id=entry_id, **state))
+                continue
+            # updated_at moves on every save, it is not part of the drift check
+            diff = [
+                attname for attname, value in state.items()
+                if attname not in ("updated_at", "created_at") and getattr(row, attname) != value
+            ]
+            if not diff:
+                summary["unchanged"] += 1
+                continue
+            departments.update({row.department, state["department"]})
+            for attname in diff:
+                setattr(row, attname, state[attname])
+            changed.append(row)
+            changed_fields.update(diff)
+        if missing:
+            archived = set(
+                QueueHistory.objects.filter(lane=lane, entry_id__in=[row.id for row in missing])
+                .values_list("entry_id", flat=True)
+            )
+            summary["archived"] += len(archived)
+            missing = [row for row in missing if row.id not in archived]
+        summary["updated"] += len(changed)
+        summary["created"] += len(missing)
+        departments.update(row.department for row in missing)
+
+        if write and (changed or missing):
+            with transaction.atomic():
+                if changed:
+                    model.objects.bulk_update(changed, sorted(changed_fields), batch_size=500)
+                if missing:
+                    model.objects.bulk_create(missing, batch_size=500)
+                    # bulk_create stamps auto_now_add with the current time
+                    model.objects.bulk_update(missing, ["created_at"], batch_size=500)
+
+    if write:
+        for department in departments:
+            events.queue_changed(department)
+    return summary
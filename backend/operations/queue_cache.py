@@ -0,0 +1,96 @@
+"""
+Versioned cache of the queue listings.
+
+Every department has a version counter in the cache that is bumped after
+each committed queue mutation (see events.queue_changed). Serialized
+listings are cached under ``(department, version)``, so a poll for an
+unchanged queue costs one cache lookup, and the version doubles as the
+ETag of the listing.
+
+The service order also changes with no write at all: priority patients
+age and a lane that has waited too long takes the next turn (see
+scheduler.py), and the waits follow the order. So snapshots and ETags are
+also keyed by the current time step of ``QUEUE_SNAPSHOT_STEP_SECONDS``, and
+a listing is at most one step behind the clock.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_SNAPSHOT_STEP_SECONDS = 60
+
+
+def get_step():
+    return getattr(settings, "QUEUE_SNAPSHOT_STEP_SECONDS", DEFAULT_SNAPSHOT_STEP_SECONDS)
+
+
+def time_step(now=None):
+    """
+    Number of the current time step.
+    """
+    return int((time.time() if now is None else now) // get_step())
+
+
+def seconds_to_next_step(now=None):
+    now = time.time() if now is None else now
+    return (time_step(now) + 1) * get_step() - now
+
+
+def _version_key(department):
+    return f"queue:version:{department}"
+
+
+def _snapshot_key(name, department, version, step):
+    return f"queue:snapshot:{name}:{department}:{version}:{step}"
+
+
+def get_version(department):
+    """
+    Current version of a department queue. A missing counter (cold or
+    evicted cache) starts from the clock so it never repeats an old ETag.
+    """
+    version = cache.get(_version_key(department))
+    if version is None:
+        cache.add(_version_key(department), time.time_ns() // 1000, timeout=None)
+        version = cache.get(_version_key(department))
+    return version
+
+
+def bump_version(department):
+    try:
+        return cache.incr(_version_key(department))
+    except ValueError:
+        cache.add(_version_key(department), time.time_ns() // 1000, timeout=None)
+        return cache.get(_version_key(department))
+
+
+def etag(department, version, step=None):
+    step = time_step() if step is None else step
+    return f'"queue-{department}-{version}-{step}"'
+
+
+def etag_matches(if_none_match, current):
+    """
+    Whether an If-None-Match header value matches the current ETag.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == current for tag in tags)
+
+
+def cached_snapshot(name, department, build, version=None):
+    """
+    ``(version, payload)`` for a department listing, building and caching the
+    payload with ``build()`` only when this version has not been cached yet
+    in the current time step.
+    """
+    version = get_version(department) if version is None else version
+    key = _snapshot_key(name, department, version, time_step())
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        # useless once the step is over
+        cache.set(key, payload, timeout=2 * get_step())
+    return version, payload
@@ -0,0 +1,263 @@
+"""
+Queue engine for the department FIFO queues.
+
+Each waiting patient carries a sparse ``sort_key`` instead of a dense
+``position_in_queue``. Keys are spaced ``KEY_GAP`` apart, so enqueue,
+dequeue, cancel and reposition only ever write the row being moved (and
+append its event, see event_log.py).
+A patient's position (rank) is computed on read from the
+``(department, status, sort_key)`` index instead of being stored.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import QueueManagement, ServiceTimeStats
+from . import event_log, events, sequences
+
+# spacing between consecutive keys; leaves room for 16 repeated
+# midpoint insertions at the same spot before a rebalance is needed
+KEY_GAP = 1 << 16
+
+def _waiting(department):
+    return QueueManagement.objects.filter(department=department, status="waiting")
+
+
+def _ahead_filter(entry):
+    # ties on sort_key (two concurrent enqueues) are broken by id
+    return Q(sort_key__lt=entry.sort_key) | Q(sort_key=entry.sort_key, id__lt=entry.id)
+
+
+def tail_key(department):
+    """
+    Key for a new patient at the back of the department queue.
+    """
+    last_key = (
+        _waiting(department).order_by("-sort_key").values_list("sort_key", flat=True).first()
+    )
+    return KEY_GAP if last_key is None else last_key + KEY_GAP
+
+
+def head_key(department):
+    """
+    Key for a patient that should go before everyone else in the queue.
+    """
+    first_key = (
+        _waiting(department).order_by("sort_key").values_list("sort_key", flat=True).first()
+    )
+    return KEY_GAP if first_key is None else first_key - KEY_GAP
+
+
+def enqueue(entry):
+    """
+    Assign a tail key to an unsaved queue entry. The caller saves it.
+    """
+    entry.status = "waiting"
+    entry.sort_key = tail_key(entry.department)
+    return entry
+
+
+def enqueue_many(entries):
+    """
+    Queue several unsaved entries at once: one block of queue numbers and
+    one tail key lookup per department, one bulk insert and one bulk event
+    insert. Entries keep their order at the back of each queue.
+    """
+    by_department = {}
+    for entry in entries:
+        by_department.setdefault(entry.department, []).append(entry)
+    now = timezone.now()
+    with transaction.atomic():
+        for department, group in by_department.items():
+            day = timezone.localdate()
+            numbers = sequences.reserve(sequences.queue_scope(department), len(group), day)
+            first_key = tail_key(department)
+            for index, (entry, number) in enumerate(zip(group, numbers)):
+                entry.status = "waiting"
+                entry.queue_date = day
+                entry.queue_number = number
+                entry.sort_key = first_key + index * KEY_GAP
+                entry.enqueue_time = now
+        QueueManagement.objects.bulk_create(entries, batch_size=500)
+        event_log.record_many("enqueue", entries, occurred_at=now)
+    for department in by_department:
+        events.queue_changed(department)
+    return entries
+
+
+def complete_many(entries):
+    """
+    Complete several waiting or in-service entries with one bulk update,
+    one bulk event insert and one stats update per department.
+    """
+    now = timezone.now()
+    durations = {}
+    for entry in entries:
+        entry.status = "completed"
+        entry.finished_at = now
+        entry.updated_at = now
+        if entry.started_at:
+            entry.actual_wait_time = entry.started_at - entry.enqueue_time
+            durations.setdefault(entry.department, []).append(now - entry.started_at)
+        else:
+            durations.setdefault(entry.department, [])
+    with transaction.atomic():
+        QueueManagement.objects.bulk_update(
+            entries, ["status", "finished_at", "actual_wait_time", "updated_at"], batch_size=500
+        )
+        event_log.record_many("complete", entries, occurred_at=now)
+        for department, samples in durations.items():
+            ServiceTimeStats.record_many(department, samples)
+    for department in durations:
+        events.queue_changed(department)
+    return entries
+
+
+def dequeue(department):
+    """
+    Move the head of the department queue to in_progress and return it.
+    Returns None when nobody is waiting.
+    """
+    now = timezone.now()
+    for entry in _waiting(department).order_by("sort_key", "id")[:5]:
+        with transaction.atomic():
+            # conditional update so two callers never take the same row
+            claimed = QueueManagement.objects.filter(id=entry.id, status="waiting").update(
+                status="in_progress", started_at=now, dequeue_time=now, updated_at=now
+            )
+            if claimed:
+                entry.status = "in_progress"
+                entry.started_at = now
+                entry.dequeue_time = now
+                event_log.record("call", entry, occurred_at=now)
+                events.queue_changed(department, entry)
+                return entry
+    return None
+
+
+def cancel(entry):
+    """
+    Cancel a waiting entry. Patients behind it move up implicitly because
+    their rank is counted on read.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        QueueManagement.objects.filter(id=entry.id).update(
+            status="cancelled", dequeue_time=now, updated_at=now
+        )
+        entry.status = "cancelled"
+        entry.dequeue_time = now
+        event_log.record("cancel", entry, occurred_at=now)
+    events.queue_changed(entry.department, entry)
+    return entry
+
+
+def transfer(entry, department):
+    """
+    Move an entry to the back of another department's queue, with a new
+    queue number from that department's sequence.
+    """
+    previous_department = entry.department
+    now = timezone.now()
+    with transaction.atomic():
+        entry.department = department
+        entry.queue_date = timezone.localdate()
+        entry.queue_number = sequences.allocator.next_number(sequences.queue_scope(department), entry.queue_date)
+        entry.sort_key = tail_key(department)
+        entry.status = "waiting"
+        entry.enqueue_time = now
+        QueueManagement.objects.filter(id=entry.id).update(
+            department=department, queue_date=entry.queue_date, queue_number=entry.queue_number,
+            sort_key=entry.sort_key, status="waiting", enqueue_time=now, updated_at=now,
+        )
+        event_log.record("transfer", entry, occurred_at=now, from_department=previous_department)
+    events.queue_changed(previous_department, entry)
+    events.queue_changed(department, entry)
+    return entry
+
+
+def reposition(entry, after=None):
+    """
+    Move a waiting entry so it is served right after ``after``.
+    When ``after`` is None the entry goes to the front of the queue.
+    """
+    if after is None:
+        new_key = head_key(entry.department)
+    else:
+        following = (
+            _waiting(entry.department)
+            .exclude(id=entry.id)
+            .filter(Q(sort_key__gt=after.sort_key) | Q(sort_key=after.sort_key, id__gt=after.id))
+            .order_by("sort_key", "id")
+            .values_list("sort_key", flat=True)
+            .first()
+        )
+        if following is None:
+            new_key = after.sort_key + KEY_GAP
+        elif following - after.sort_key > 1:
+            new_key = (after.sort_key + following) // 2
+        else:
+            # no integer left between the neighbours, spread the keys out again
+            rebalance(entry.department)
+            after.refresh_from_db(fields=["sort_key"])
+            return reposition(entry, after=after)
+
+    with transaction.atomic():
+        QueueManagement.objects.filter(id=entry.id).update(sort_key=new_key, updated_at=timezone.now())
+        entry.sort_key = new_key
+        event_log.record("reposition", entry)
+    events.queue_changed(entry.department, entry)
+    return entry
+
+
+@transaction.atomic
+def rebalance(department):
+    """
+    Respace the keys of a department queue. Only needed when repeated
+    repositioning has used up the gap between two neighbours.
+    """
+    waiting = list(
+        _waiting(department)
+        .order_by("sort_key", "id")
+        .only("id", "sort_key", "department", "patient_id")
+    )
+    for index, entry in enumerate(waiting, start=1):
+        entry.sort_key = index * KEY_GAP
+    QueueManagement.objects.bulk_update(waiting, ["sort_key"], batch_size=500)
+    event_log.record_many("reposition", waiting)
+    events.queue_changed(department)
+
+
+def rank(entry):
+    """
+    1-based position of a waiting entry, counted from the index.
+    """
+    if entry.status != "waiting":
+        return 0
+    return _waiting(entry.department).filter(_ahead_filter(entry)).count() + 1
+
+
+def patients_ahead(entry):
+    """
+    Number of patients that will be served before this entry, including
+    those currently being served.
+    """
+    if entry.status != "waiting":
+        return 0
+    in_service = QueueManagement.objects.filter(
+        department=entry.department, status="in_progress"
+    ).count()
+    return in_service + rank(entry) - 1
+
+
+def ranked_queue(department):
+    """
+    Waiting entries of a department in service order, each annotated with
+    its 1-based ``queue_rank``.
+    """
+    return (
+        _waiting(department)
+        .annotate(queue_rank=Window(RowNumber(), order_by=[F("sort_key").asc(), F("id").asc()]))
+        .order_by("sort_key", "id")
+    )
@@ -0,0 +1,276 @@
+"""
+Scheduler that decides who is called next in a department.
+
+The FIFO queue (``QueueManagement``) and the PWD/senior queue
+(``PriorityQueue``) are merged into one service order by weighted round
+robin: with the default weights 2:1, two priority patients are called for
+every normal patient, and a lane that is empty simply gives its turn away.
+
+Within the priority lane patients are ordered by an effective priority that
+grows with the time they have waited, so a steady stream of one level cannot
+starve the other. It is computed when the order is read (every call-next and
+listing) rather than stored, so nothing has to rewrite positions as time
+passes. Across lanes, a lane whose first patient has waited longer than
+``QUEUE_LANE_MAX_WAIT_MINUTES`` takes the next turn, which bounds how long
+the round robin can keep a lane waiting.
+
+The scheduler keeps no state of its own. Where the round robin currently
+stands is read back from the last few patients that were called in the
+department, so every worker (and the listing endpoint) agrees on who is next.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import PriorityQueue, QueueManagement
+from . import event_log, events, queue_engine
+
+DEFAULT_WEIGHTS = {"priority": 2, "normal": 1}
+
+# head start in minutes and aging rate per priority level
+DEFAULT_AGING = {
+    "senior": {"base": 5, "rate": 1.0},
+    "pwd": {"base": 0, "rate": 1.0},
+}
+DEFAULT_LANE_MAX_WAIT_MINUTES = 60
+
+LANES = {
+    "priority": PriorityQueue,
+    "normal": QueueManagement,
+}
+
+
+def get_weights():
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(getattr(settings, "QUEUE_INTERLEAVE_WEIGHTS", {}))
+    return {lane: max(int(weight), 0) for lane, weight in weights.items() if lane in LANES}
+
+
+def get_aging():
+    aging = {level: dict(values) for level, values in DEFAULT_AGING.items()}
+    for level, values in getattr(settings, "QUEUE_PRIORITY_AGING", {}).items():
+        aging.setdefault(level, {"base": 0, "rate": 1.0}).update(values)
+    return aging
+
+
+def get_lane_max_wait():
+    minutes = getattr(settings, "QUEUE_LANE_MAX_WAIT_MINUTES", DEFAULT_LANE_MAX_WAIT_MINUTES)
+    return None if minutes is None else timedelta(minutes=minutes)
+
+
+def queued_at(lane, entry):
+    return entry.enqueue_time if lane == "normal" else entry.created_at
+
+
+def effective_priority(entry, now, aging):
+    level = aging.get(entry.priority_level, {"base": 0, "rate": 1.0})
+    waited = (now - entry.created_at).total_seconds() / 60
+    return level["base"] + level["rate"] * waited
+
+
+def priority_order(entries, now=None, aging=None, limit=None):
+    """
+    Waiting priority entries by effective priority at ``now``, highest
+    first. With a limit only the top of a heap is taken.
+    """
+    now = now or timezone.now()
+    aging = aging or get_aging()
+
+    def key(entry):
+        return (-effective_priority(entry, now, aging), entry.priority_position, entry.created_at, entry.id)
+
+    if limit is None:
+        return sorted(entries, key=key)
+    return heapq.nsmallest(limit, entries, key=key)
+
+
+def lane_queryset(lane, department):
+    """
+    Waiting entries of one lane, served by the lane's (department, status,
+    ...) index. The normal lane comes in service order; the priority lane
+    in arrival order, its service order depends on the time of the call
+    (see priority_order).
+    """
+    if lane == "normal":
+        # annotated with queue_rank so positions need no extra query
+        return queue_engine.ranked_queue(department)
+    queryset = LANES[lane].objects.filter(department=department, status="waiting")
+    return queryset.order_by("created_at", "id")
+
+
+def current_run(department, weights):
+    """
+    Lane of the most recent call and how many calls in a row it has had.
+    Only the last ``sum(weights)`` calls per lane are read.
+    """
+    window = max(sum(weights.values()), 1)
+    recent = []
+    for lane, model in LANES.items():
+        started = (
+            model.objects.filter(department=department, started_at__isnull=False)
+            .order_by("-started_at")
+            .values_list("started_at", flat=True)[:window]
+        )
+        recent.extend((started_at, lane) for started_at in started)
+    recent.sort(reverse=True)
+
+    if not recent:
+        return None, 0
+    last_lane = recent[0][1]
+    run = 0
+    for _, lane in recent:
+        if lane != last_lane:
+            break
+        run += 1
+    return last_lane, run
+
+
+def interleave(lanes, weights, last_lane=None, run=0, limit=None, now=None, max_wait=None):
+    """
+    k-way weighted round robin over already ordered lanes.
+
+    ``lanes`` maps a lane name to its entries in service order. A lane keeps
+    the turn until it has been served ``weights[lane]`` times in a row, then
+    the turn passes to the next lane that still has patients. With
+    ``max_wait``, a lane whose first entry has waited that long at ``now``
+    takes the turn; among several such lanes the longest wait goes first.
+    """
+    order = [lane for lane in LANES if lane in lanes]
+    heads = {lane: 0 for lane in order}
+    merged = []
+    limit = sum(len(entries) for entries in lanes.values()) if limit is None else limit
+
+    while len(merged) < limit:
+        available = [lane for lane in order if heads[lane] < len(lanes[lane])]
+        if not available:
+            break
+        overdue = []
+        if max_wait is not None:
+            overdue = [
+                lane for lane in available
+                if now - queued_at(lane, lanes[lane][heads[lane]]) >= max_wait
+            ]
+        if overdue:
+            lane = min(overdue, key=lambda lane: queued_at(lane, lanes[lane][heads[lane]]))
+            if lane != last_lane:
+                run = 0
+        elif last_lane in available and run < weights.get(last_lane, 0):
+            lane = last_lane
+        else:
+            # next lane after the current one in the fixed lane order
+            start = order.index(last_lane) + 1 if last_lane in order else 0
+            rotation = order[start:] + order[:start]
+            lane = next(
+                (candidate for candidate in rotation if candidate in available and weights.get(candidate, 0) > 0),
+                available[0],
+            )
+            if lane != last_lane:
+                run = 0
+        merged.append((lane, lanes[lane][heads[lane]]))
+        heads[lane] += 1
+        last_lane, run = lane, run + 1
+    return merged
+
+
+def next_patients(department, limit=10, weights=None):
+    """
+    The next ``limit`` patients of a department as ``(lane, entry)`` pairs,
+    in the order call-next will serve them. ``limit=None`` returns everyone.
+    """
+    weights = weights or get_weights()
+    now = timezone.now()
+    lanes = {}
+    for lane in LANES:
+        queryset = lane_queryset(lane, department).select_related("patient__user")
+        if lane == "priority":
+            # the hot table only holds today's patients, so the whole
+            # waiting lane is read and its head picked from a heap
+            lanes[lane] = priority_order(queryset, now, limit=limit)
+        else:
+            lanes[lane] = list(queryset[:limit])
+    last_lane, run = current_run(department, weights)
+    return interleave(lanes, weights, last_lane, run, limit, now=now, max_wait=get_lane_max_wait())
+
+
+def _claim_changes(lane, user, now):
+    changes = {"status": "in_progress", "started_at": now, "served_by": user}
+    if lane == "normal":
+        changes.update(dequeue_time=now, updated_at=now)
+    return changes
+
+
+def _claimed(entry, changes, now):
+    for field, value in changes.items():
+        setattr(entry, field, value)
+    event_log.record("call", entry, occurred_at=now)
+
+
+def claim(lane, entry, user=None):
+    """
+    Atomically move a waiting entry to in_progress with a compare-and-swap
+    on its status. Returns False when another caller claimed it first.
+    """
+    now = timezone.now()
+    changes = _claim_changes(lane, user, now)
+    with transaction.atomic():
+        claimed = LANES[lane].objects.filter(id=entry.id, status="waiting").update(**changes)
+        if claimed:
+            _claimed(entry, changes, now)
+    if claimed:
+        events.queue_changed(entry.department, entry)
+    return bool(claimed)
+
+
+def claim_first(candidates, user=None):
+    """
+    Claim the first of the candidates no concurrent caller holds. The
+    candidates are locked with SKIP LOCKED, so callers racing for the head
+    of the queue each take a different row instead of waiting on each
+    other. Needs a database with SKIP LOCKED support.
+    Returns ``(lane, entry)`` or None when every candidate is taken.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        locked = set()
+        for lane, model in LANES.items():
+            ids = [entry.id for entry_lane, entry in candidates if entry_lane == lane]
+            if ids:
+                rows = model.objects.select_for_update(skip_locked=True).filter(id__in=ids, status="waiting")
+                locked.update((lane, entry_id) for entry_id in rows.values_list("id", flat=True))
+        for lane, entry in candidates:
+            if (lane, entry.id) in locked:
+                changes = _claim_changes(lane, user, now)
+                LANES[lane].objects.filter(id=entry.id).update(**changes)
+                _claimed(entry, changes, now)
+                break
+        else:
+            return None
+    events.queue_changed(entry.department, entry)
+    return lane, entry
+
+
+def call_next(department, user=None, weights=None, attempts=5):
+    """
+    Claim the patient the scheduler puts first. When a concurrent caller
+    holds or wins the same row, the next candidate is tried. Uses row locks
+    with SKIP LOCKED where the database has them and a compare-and-swap on
+    the status otherwise (SQLite, which serializes writers anyway).
+    Returns ``(lane, entry)`` or None when both lanes are empty.
+    """
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    for _ in range(attempts):
+        candidates = next_patients(department, limit=attempts, weights=weights)
+        if not candidates:
+            return None
+        if skip_locked:
+            called = claim_first(candidates, user)
+            if called is not None:
+                return called
+            continue
+        for lane, entry in candidates:
+            if claim(lane, entry, user):
+                return lane, entry
+    return None
@@ -0,0 +1,123 @@
+"""
+Queue number allocation.
+
+Numbers come from one ``QueueSequence`` counter row per scope and day
+(for example ``queue:OPD`` on 2025-08-18, or ``appointment:12`` for the
+appointments of doctor 12 on that day). Reserving a number is a single
+``UPDATE ... SET last_value = last_value + n`` on that row, so there is no
+``MAX()`` scan and two workers can never be handed the same number.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import QueueSequence
+
+
+def queue_scope(department):
+    return f"queue:{department}"
+
+
+def priority_scope(department):
+    return f"priority:{department}"
+
+
+def appointment_scope(doctor_id):
+    return f"appointment:{doctor_id}"
+
+
+def reserve(scope, count=1, day=None):
+    """
+    Atomically reserve ``count`` consecutive numbers and return them as a range.
+    """
+    if count < 1:
+        raise ValueError("count must be at least 1.")
+    day = day or timezone.localdate()
+    with transaction.atomic():
+        updated = QueueSequence.objects.filter(scope=scope, day=day).update(
+            last_value=F("last_value") + count
+        )
+        if not updated:
+            try:
+                # savepoint so a lost creation race does not break the outer transaction
+                with transaction.atomic():
+                    QueueSequence.objects.create(scope=scope, day=day, last_value=count)
+            except IntegrityError:
+                QueueSequence.objects.filter(scope=scope, day=day).update(
+                    last_value=F("last_value") + count
+                )
+            else:
+                return range(1, count + 1)
+        last_value = QueueSequence.objects.filter(scope=scope, day=day).values_list(
+            "last_value", flat=True
+        ).get()
+    return range(last_value - count + 1, last_value + 1)
+
+
+def reserve_days(scope, counts):
+    """
+    Atomically reserve numbers on several days at once, ``counts`` maps a
+    day to how many. Returns a range per day, with three statements
+    whatever the number of days.
+    """
+    if not counts:
+        return {}
+    if min(counts.values()) < 1:
+        raise ValueError("count must be at least 1.")
+    with transaction.atomic():
+        QueueSequence.objects.bulk_create(
+            [QueueSequence(scope=scope, day=day) for day in counts], ignore_conflicts=True
+        )
+        QueueSequence.objects.filter(scope=scope, day__in=counts).update(
+            last_value=F("last_value") + Case(
+                *(When(day=day, then=Value(count)) for day, count in counts.items()),
+                output_field=IntegerField(),
+            )
+        )
+        last_values = dict(
+            QueueSequence.objects.filter(scope=scope, day__in=counts).values_list("day", "last_value")
+        )
+    return {day: range(last_values[day] - count + 1, last_values[day] + 1) for day, count in counts.items()}
+
+
+class BlockAllocator:
+    """
+    Hands out numbers from blocks reserved ahead of time, so a worker only
+    touches the counter row once every ``block_size`` tickets.
+
+    Numbers left in a block when the process exits are never issued, and
+    numbers from different workers interleave, so tickets are unique and
+    increasing per worker but may have gaps.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, "QUEUE_NUMBER_BLOCK_SIZE", 1)
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def next_number(self, scope, day=None):
+        day = day or timezone.localdate()
+        if self.block_size == 1 or connection.in_atomic_block:
+            # a block reserved inside the caller's transaction would be rolled
+            # back with it while still cached here, so reserve exactly one
+            return reserve(scope, 1, day)[0]
+        with self._lock:
+            block = self._blocks.get((scope, day))
+            if not block:
+                block = iter(reserve(scope, self.block_size, day))
+                self._blocks = {
+                    key: value for key, value in self._blocks.items() if key[1] == day
+                }
+                self._blocks[(scope, day)] = block
+            number = next(block, None)
+            if number is None:
+                del self._blocks[(scope, day)]
+        if number is None:
+            return self.next_number(scope, day)
+        return number
+
+
+allocator = BlockAllocator()
@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from .models import AppointmentManagement, QueueManagement, PriorityQueue, Notification, Messaging
+from .models import AppointmentManagement, QueueManagement, PriorityQueue, Notification, Messaging, PatientFlow
 from backend.users.models import User
+from . import streams
 
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer for dashboard statistics"""
@@ -12,26 +13,105 @@ class DashboardStatsSerializer(serializers.Serializer):
     pending_assessment = serializers.IntegerField()
 
 class AppointmentSerializer(serializers.ModelSerializer):
+    patient_id = serializers.IntegerField(read_only=True)
     patient_name = serializers.CharField(source='patient.user.full_name', read_only=True)
     doctor_name = serializers.CharField(source='doctor.user.full_name', read_only=True)
     
     class Meta:
         model = AppointmentManagement
-        fields = ['appointment_id', 'patient_name', 'doctor_name', 'appointment_date', 'status', 'appointment_type']
+        fields = ['appointment_id', 'patient_id', 'patient_name', 'doctor_name', 'appointment_date', 'status', 'appointment_type', 'version']
+
+def estimated_wait_minutes(context, lane, entry):
+    """Look up a batch estimate passed in the serializer context as 'estimated_waits'"""
+    wait = context.get('estimated_waits', {}).get((lane, entry.id))
+    return round(wait.total_seconds() / 60) if wait is not None else None
+
+def estimated_wait_range(context, lane, entry):
+    """Look up a batch (p50, p90) estimate passed in the context as 'estimated_wait_ranges'"""
+    wait_range = context.get('estimated_wait_ranges', {}).get((lane, entry.id))
+    if wait_range is None:
+        return None
+    p50, p90 = wait_range
+    return {'p50_minutes': round(p50.total_seconds() / 60), 'p90_minutes': round(p90.total_seconds() / 60)}
+
+def stream_token(lane, entry):
+    """Token of the entry's live position stream, to hand to the patient"""
+    return streams.entry_token(entry.department, lane, entry.id)
 
 class QueueSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.user.full_name', read_only=True)
+    estimated_wait_minutes = serializers.SerializerMethodField()
+    estimated_wait_range = serializers.SerializerMethodField()
+    stream_token = serializers.SerializerMethodField()
     
     class Meta:
         model = QueueManagement
-        fields = ['queue_number', 'patient_name', 'department', 'status', 'position_in_queue', 'enqueue_time']
+        fields = ['queue_number', 'patient_name', 'department', 'status', 'position_in_queue', 'enqueue_time', 'estimated_wait_minutes', 'estimated_wait_range', 'stream_token']
+
+    def get_estimated_wait_minutes(self, obj):
+        return estimated_wait_minutes(self.context, 'normal', obj)
+
+    def get_estimated_wait_range(self, obj):
+        return estimated_wait_range(self.context, 'normal', obj)
+
+    def get_stream_token(self, obj):
+        return stream_token('normal', obj)
 
 class PriorityQueueSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.user.full_name', read_only=True)
+    estimated_wait_minutes = serializers.SerializerMethodField()
+    estimated_wait_range = serializers.SerializerMethodField()
+    stream_token = serializers.SerializerMethodField()
     
     class Meta:
         model = PriorityQueue
-        fields = ['queue_number', 'patient_name', 'priority_level', 'department', 'priority_position']
+        fields = ['queue_number', 'patient_name', 'priority_level', 'department', 'priority_position', 'estimated_wait_minutes', 'estimated_wait_range', 'stream_token']
+
+    def get_estimated_wait_minutes(self, obj):
+        return estimated_wait_minutes(self.context, 'priority', obj)
+
+    def get_estimated_wait_range(self, obj):
+        return estimated_wait_range(self.context, 'priority', obj)
+
+    def get_stream_token(self, obj):
+        return stream_token('priority', obj)
+
+class ScheduledPatientSerializer(serializers.Serializer):
+    """Entry of the merged normal/priority service order, fed with {'lane', 'order', 'entry'}"""
+    lane = serializers.CharField()
+    order = serializers.IntegerField()
+    id = serializers.IntegerField(source='entry.id')
+    queue_number = serializers.IntegerField(source='entry.queue_number')
+    patient_name = serializers.CharField(source='entry.patient.user.full_name')
+    department = serializers.CharField(source='entry.department')
+    status = serializers.CharField(source='entry.status')
+    priority_level = serializers.SerializerMethodField()
+    estimated_wait_minutes = serializers.SerializerMethodField()
+    estimated_wait_range = serializers.SerializerMethodField()
+    stream_token = serializers.SerializerMethodField()
+
+    def get_priority_level(self, obj):
+        return getattr(obj['entry'], 'priority_level', None)
+
+    def get_estimated_wait_minutes(self, obj):
+        return estimated_wait_minutes(self.context, obj['lane'], obj['entry'])
+
+    def get_estimated_wait_range(self, obj):
+        return estimated_wait_range(self.context, obj['lane'], obj['entry'])
+
+    def get_stream_token(self, obj):
+        return stream_token(obj['lane'], obj['entry'])
+
+class PatientFlowSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.user.full_name', read_only=True)
+    flow_time_minutes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PatientFlow
+        fields = ['id', 'flow', 'patient_name', 'current_stage', 'status', 'stages_completed', 'started_at', 'finished_at', 'flow_time_minutes']
+
+    def get_flow_time_minutes(self, obj):
+        return round(obj.flow_time.total_seconds() / 60) if obj.flow_time is not None else None
 
 class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
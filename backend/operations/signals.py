@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from backend.users.models import PatientProfile, User
+
+from .models import AppointmentManagement, DoctorAvailability, DoctorWorkingHours, PriorityQueue, QueueManagement
+from . import events, patient_search, slots
+
+
+@receiver(post_save, sender=QueueManagement)
+@receiver(post_save, sender=PriorityQueue)
+@receiver(post_delete, sender=QueueManagement)
+@receiver(post_delete, sender=PriorityQueue)
+def queue_entry_changed(sender, instance, **kwargs):
+    """
+    Any saved or deleted queue entry is reported as a queue change.
+    Bulk ``update()`` calls in queue_engine and scheduler report their
+    changes themselves since they send no signals.
+    """
+    events.queue_changed(instance.department, instance)
+
+
+@receiver(post_save, sender=AppointmentManagement)
+@receiver(post_delete, sender=AppointmentManagement)
+@receiver(post_save, sender=DoctorAvailability)
+@receiver(post_delete, sender=DoctorAvailability)
+@receiver(post_save, sender=DoctorWorkingHours)
+@receiver(post_delete, sender=DoctorWorkingHours)
+def doctor_schedule_changed(sender, instance, **kwargs):
+    """
+    Bookings, blocked dates and working hours change a doctor's free slots.
+    """
+    slots.invalidate(instance.doctor_id)
+
+
+@receiver(post_save, sender=PatientProfile)
+def patient_profile_saved(sender, instance, **kwargs):
+    """
+    Keep the patient search index in step with patients.
+    """
+    patient_search.index_patient(instance.id)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # a new user has no patient profile yet, it is indexed with the profile,
+    # and saves like the last_login update on every login change no indexed field
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not {"full_name", "email"} & set(update_fields):
+        return
+    if not created and instance.role == User.Role.PATIENT:
+        profile_id = PatientProfile.objects.filter(user_id=instance.id).values_list("id", flat=True).first()
+        if profile_id is not None:
+            patient_search.index_patient(profile_id)
+
+
+@receiver(post_delete, sender=PatientProfile)
+def patient_profile_deleted(sender, instance, **kwargs):
+    patient_search.remove_patient(instance.id)
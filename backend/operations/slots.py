@@ -0,0 +1,305 @@
+"""
+Free appointment slots of doctors.
+
+A doctor's day is a bitmap, an int with one bit per APPOINTMENT_SLOT_MINUTES
+since local midnight (48 bits for 30-minute slots). The free slots of a day
+are the bits of the doctor's working hours on that weekday, none on a
+blocked date, minus the slots taken by booked appointments. Everything
+after that is bit arithmetic: the lowest set bit is the first free slot.
+
+Day bitmaps are cached a month per entry per doctor, under a version that
+is bumped once a change to the doctor's appointments, blocked dates or
+working hours is committed (see signals.py). Thirty days of slots are two
+cache reads; months missing from the cache are built for all requested
+doctors together with one query per table. Writes that send no signals (bulk_create, update())
+must call ``invalidate`` themselves.
+"""
+import calendar
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .appointment_calendar import local_midnight
+from .models import AppointmentManagement, DoctorAvailability, DoctorWorkingHours
+
+SLOT_TIMEOUT = 60 * 60
+# longest lookup one request may ask for, in days
+MAX_WINDOW_DAYS = 62
+# appointments in these statuses take their slot
+BOOKED_STATUSES = ("scheduled", "completed")
+
+
+def slot_minutes():
+    return getattr(settings, "APPOINTMENT_SLOT_MINUTES", 30)
+
+
+def _minutes(value):
+    if isinstance(value, str):
+        value = datetime.strptime(value, "%H:%M").time()
+    return value.hour * 60 + value.minute
+
+
+def hours_mask(start, end):
+    """
+    Bits of the slots that lie completely within ``[start, end)``.
+    """
+    size = slot_minutes()
+    first = -(-_minutes(start) // size)
+    last = _minutes(end) // size
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def requested_window(params):
+    """
+    ``(start, end)`` days, end exclusive, from ``start`` (YYYY-MM-DD,
+    default today) and ``days`` (default 30). Raises ValueError for invalid
+    parameters.
+    """
+    try:
+        start = datetime.strptime(params["start"], "%Y-%m-%d").date() if params.get("start") else timezone.localdate()
+    except ValueError:
+        raise ValueError("Invalid start date, use YYYY-MM-DD")
+    try:
+        days = int(params.get("days", 30))
+    except ValueError:
+        raise ValueError("Invalid days")
+    if not 1 <= days <= MAX_WINDOW_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_WINDOW_DAYS}")
+    return start, start + timedelta(days=days)
+
+
+def slot_index(when):
+    local = timezone.localtime(when)
+    return (local.hour * 60 + local.minute) // slot_minutes()
+
+
+def span_mask(start, end):
+    """
+    Bits of the slots of the start's day that ``[start, end)`` overlaps.
+    """
+    size = slot_minutes() * 60
+    local = timezone.localtime(start)
+    offset = local.hour * 3600 + local.minute * 60 + local.second + local.microsecond / 1e6
+    first = int(offset // size)
+    last = int(-(-(offset + (end - start).total_seconds()) // size))
+    return ((1 << (last - first)) - 1) << first
+
+
+def slot_start(day, index):
+    return local_midnight(day) + timedelta(minutes=index * slot_minutes())
+
+
+def bits(mask):
+    """
+    Indexes of the set bits, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def weekly_masks(doctor_ids):
+    """
+    ``{doctor_id: [mask of Monday, ..., mask of Sunday]}``.
+    """
+    masks = defaultdict(lambda: [0] * 7)
+    for doctor_id, weekday, start, end in DoctorWorkingHours.objects.filter(
+        doctor_id__in=doctor_ids
+    ).values_list("doctor_id", "weekday", "start_time", "end_time"):
+        masks[doctor_id][weekday] |= hours_mask(start, end)
+
+    default = [0] * 7
+    for weekday, intervals in getattr(settings, "APPOINTMENT_DEFAULT_WORKING_HOURS", {}).items():
+        for start, end in intervals:
+            default[weekday] |= hours_mask(start, end)
+    return {doctor_id: masks[doctor_id] if doctor_id in masks else default for doctor_id in doctor_ids}
+
+
+def build_masks(doctor_ids, start, end):
+    """
+    ``{(doctor_id, day): free mask}`` for the days from ``start`` up to,
+    not including, ``end``, read from the database.
+    """
+    weekly = weekly_masks(doctor_ids)
+    blocked = set(
+        DoctorAvailability.objects.filter(
+            doctor_id__in=doctor_ids, date__gte=start, date__lt=end, is_blocked=True
+        ).values_list("doctor_id", "date")
+    )
+    booked = defaultdict(int)
+    for doctor_id, appointment_date, appointment_end in AppointmentManagement.objects.filter(
+        doctor_id__in=doctor_ids,
+        appointment_date__gte=local_midnight(start),
+        appointment_date__lt=local_midnight(end),
+        status__in=BOOKED_STATUSES,
+    ).values_list("doctor_id", "appointment_date", "appointment_end"):
+        booked[(doctor_id, timezone.localdate(appointment_date))] |= span_mask(appointment_date, appointment_end)
+
+    masks = {}
+    for offset in range((end - start).days):
+        day = start + timedelta(days=offset)
+        for doctor_id in doctor_ids:
+            key = (doctor_id, day)
+            masks[key] = 0 if key in blocked else weekly[doctor_id][day.weekday()] & ~booked[key]
+    return masks
+
+
+def _version_key(doctor_id):
+    return f"slots:version:{doctor_id}"
+
+
+def _month_key(doctor_id, version, year, month):
+    return f"slots:month:{doctor_id}:{version}:{year}-{month:02d}"
+
+
+def _month_days(year, month):
+    start = date(year, month, 1)
+    return [start + timedelta(days=offset) for offset in range(calendar.monthrange(year, month)[1])]
+
+
+def get_versions(doctor_ids):
+    """
+    Current slot version of each doctor. Missing counters start from the
+    clock so they never repeat an old version.
+    """
+    keys = {_version_key(doctor_id): doctor_id for doctor_id in doctor_ids}
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        seed = time.time_ns() // 1000
+        for key in keys.keys() - versions.keys():
+            cache.add(key, seed, timeout=None)
+        versions.update(cache.get_many(keys.keys() - versions.keys()))
+    return {keys[key]: version for key, version in versions.items()}
+
+
+def invalidate(doctor_id):
+    """
+    Drop the cached slots of a doctor once the current transaction commits.
+    """
+    def bump():
+        try:
+            cache.incr(_version_key(doctor_id))
+        except ValueError:
+            cache.add(_version_key(doctor_id), time.time_ns() // 1000, timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def day_masks(doctor_ids, start, end):
+    """
+    Free masks like ``build_masks``, from the cache where possible. The
+    cache holds whole months, one entry per doctor and month.
+    """
+    doctor_ids = list(dict.fromkeys(doctor_ids))
+    days = [start + timedelta(days=offset) for offset in range((end - start).days)]
+    months = sorted({(day.year, day.month) for day in days})
+    versions = get_versions(doctor_ids)
+    keys = {
+        _month_key(doctor_id, versions[doctor_id], year, month): (doctor_id, year, month)
+        for doctor_id in doctor_ids
+        for year, month in months
+    }
+    month_masks = {keys[key]: masks for key, masks in cache.get_many(keys).items()}
+
+    missing = {key: month for key, month in keys.items() if month not in month_masks}
+    if missing:
+        # the versions were read first, so a change committed meanwhile
+        # only leaves its stale masks under an old version
+        first = min((year, month) for _, year, month in missing.values())
+        last = max((year, month) for _, year, month in missing.values())
+        built = build_masks(
+            list({doctor_id for doctor_id, _, _ in missing.values()}),
+            _month_days(*first)[0],
+            _month_days(*last)[-1] + timedelta(days=1),
+        )
+        fresh = {
+            key: [built[(doctor_id, day)] for day in _month_days(year, month)]
+            for key, (doctor_id, year, month) in missing.items()
+        }
+        cache.set_many(fresh, timeout=SLOT_TIMEOUT)
+        month_masks.update((missing[key], masks) for key, masks in fresh.items())
+
+    return {
+        (doctor_id, day): month_masks[(doctor_id, day.year, day.month)][day.day - 1]
+        for doctor_id in doctor_ids
+        for day in days
+    }
+
+
+def _bookable(day, mask, now):
+    """
+    A day's mask without the slots that have already started.
+    """
+    today = timezone.localdate(now)
+    if day < today:
+        return 0
+    if day > today:
+        return mask
+    local = timezone.localtime(now)
+    seconds = local.hour * 3600 + local.minute * 60 + local.second + (local.microsecond > 0)
+    first = -(-seconds // (slot_minutes() * 60))
+    return mask & ~((1 << first) - 1)
+
+
+def free_slots(doctor_id, start, end, now=None):
+    """
+    ``{day: [slot start, ...]}`` of a doctor for every day from ``start`` up
+    to, not including, ``end``.
+    """
+    now = now or timezone.now()
+    masks = day_masks([doctor_id], start, end)
+    return {
+        day: [slot_start(day, index) for index in bits(_bookable(day, mask, now))]
+        for (_, day), mask in sorted(masks.items(), key=lambda item: item[0][1])
+    }
+
+
+def first_free_slot(doctor_ids, start, end, now=None):
+    """
+    ``(doctor_id, slot start)`` of the earliest free slot of any of the
+    doctors between ``start`` and ``end``, or None.
+    """
+    now = now or timezone.now()
+    masks = day_masks(doctor_ids, start, end)
+    best = None
+    for (doctor_id, day), mask in masks.items():
+        mask = _bookable(day, mask, now)
+        if mask:
+            candidate = (day, (mask & -mask).bit_length() - 1, doctor_id)
+            best = candidate if best is None else min(best, candidate)
+    if best is None:
+        return None
+    day, index, doctor_id = best
+    return doctor_id, slot_start(day, index)
+
+
+def is_open(doctor_id, start, end):
+    """
+    Whether ``[start, end)`` lies within the doctor's working hours on a
+    day that is not blocked, whatever is booked then. Read from the
+    database rather than the cached bitmaps.
+    """
+    day = timezone.localdate(start)
+    if DoctorAvailability.objects.filter(doctor_id=doctor_id, date=day, is_blocked=True).exists():
+        return False
+    needed = span_mask(start, end)
+    return weekly_masks([doctor_id])[doctor_id][day.weekday()] & needed == needed
+
+
+def is_free(doctor_id, when, end=None):
+    """
+    Whether the slots from ``when`` to ``end``, by default the slot ``when``
+    falls in, are free for the doctor.
+    """
+    day = timezone.localdate(when)
+    mask = day_masks([doctor_id], day, day + timedelta(days=1))[(doctor_id, day)]
+    needed = span_mask(when, end) if end else 1 << slot_index(when)
+    return mask & needed == needed
@@ -0,0 +1,195 @@
+"""
+Server-sent event streams of the department queues.
+
+These are async Django views and need an ASGI server (see backend/asgi.py)
+to hold thousands of idle connections per worker. Every stream waits on an
+event-broker subscription, so an idle subscriber costs no database work and
+no polling. They are read-only and only expose queue numbers, positions and
+statuses, so like the lobby displays they do not require a login.
+
+A patient's own stream is addressed by a signed token of the entry (see
+``entry_token``) rather than its id, so nobody can walk the sequential ids
+and follow other patients. Staff hand the token out with the queue number.
+"""
+import asyncio
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.core import signing
+from django.http import Http404, StreamingHttpResponse
+
+from .estimates import DepartmentSnapshot
+from .models import QueueManagement
+from . import events, queue_cache, scheduler
+
+# comment line sent when nothing happened, keeps proxies from closing the stream
+HEARTBEAT_SECONDS = 15
+SALT = "operations.streams"
+
+# latest positions per department, shared by all streams of this worker
+_positions = {}
+_position_locks = defaultdict(asyncio.Lock)
+
+
+def _departments():
+    return dict(QueueManagement._meta.get_field("department").choices)
+
+
+def entry_token(department, lane, entry_id):
+    """
+    Token of a queue entry's stream URL.
+    """
+    return signing.dumps([department, lane, entry_id], salt=SALT)
+
+
+def entry_from_token(token):
+    """
+    ``(department, lane, entry_id)`` of a stream token, or None when the
+    token is not valid.
+    """
+    try:
+        department, lane, entry_id = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if department not in _departments() or lane not in scheduler.LANES or not isinstance(entry_id, int):
+        return None
+    return department, lane, entry_id
+
+
+def sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def event_stream(generator):
+    response = StreamingHttpResponse(generator, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def build_positions(department):
+    """
+    ``{"lane:id": {...}}`` for every waiting patient of the department.
+    """
+    snapshot = DepartmentSnapshot.take(department)
+    return {
+        f"{lane}:{entry.id}": {
+            "position": order,
+            "queue_number": entry.queue_number,
+            "estimated_wait_minutes": round(p50.total_seconds() / 60),
+            "estimated_wait_range": {
+                "p50_minutes": round(p50.total_seconds() / 60),
+                "p90_minutes": round(p90.total_seconds() / 60),
+            },
+        }
+        for order, ((lane, entry), (p50, p90)) in enumerate(
+            zip(snapshot.order, snapshot.estimated_wait_ranges()), start=1
+        )
+    }
+
+
+def _current(cached, version, step):
+    return cached is not None and cached[0] >= version and cached[1] == step
+
+
+async def positions_for(department, version):
+    """
+    Positions at a queue version, built at most once per worker, version and
+    time step however many patient streams are waiting on it.
+    """
+    step = queue_cache.time_step()
+    cached = _positions.get(department)
+    if _current(cached, version, step):
+        return cached[2]
+    async with _position_locks[department]:
+        cached = _positions.get(department)
+        if _current(cached, version, step):
+            return cached[2]
+        _, positions = await sync_to_async(queue_cache.cached_snapshot)(
+            "positions", department, lambda: build_positions(department), version
+        )
+        _positions[department] = (version, step, positions)
+    return positions
+
+
+def entry_status(lane, entry_id):
+    return (
+        scheduler.LANES[lane].objects.filter(id=entry_id).values_list("status", flat=True).first()
+    )
+
+
+async def department_stream(request, department):
+    """
+    Stream of a department queue: one ``queue`` event per committed change.
+    """
+    if department not in _departments():
+        raise Http404("Unknown department.")
+
+    async def stream():
+        broker = events.get_broker()
+        subscription = broker.subscribe(events.department_channel(department))
+        try:
+            version = queue_cache.get_version(department)
+            yield sse("queue", {"department": department, "version": version}, version)
+            while True:
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse("queue", message, message["version"])
+        finally:
+            broker.unsubscribe(subscription)
+
+    return event_stream(stream())
+
+
+async def entry_stream(request, token):
+    """
+    Stream of one patient's place in a department queue. Sends a
+    ``position`` event whenever the position or estimate changes and a
+    final event with the new status once the patient is called or leaves.
+    """
+    entry = entry_from_token(token)
+    if entry is None:
+        raise Http404("Unknown queue entry.")
+    department, lane, entry_id = entry
+    status = await sync_to_async(entry_status)(lane, entry_id)
+    if status is None:
+        raise Http404("Queue entry not found.")
+
+    key = f"{lane}:{entry_id}"
+
+    async def stream():
+        broker = events.get_broker()
+        subscription = broker.subscribe(events.department_channel(department))
+        try:
+            version = queue_cache.get_version(department)
+            last_state = None
+            while True:
+                positions = await positions_for(department, version)
+                if key in positions:
+                    state = {"status": "waiting", **positions[key]}
+                else:
+                    state = {"status": await sync_to_async(entry_status)(lane, entry_id)}
+                if state != last_state:
+                    yield sse("position", state, version)
+                    last_state = state
+                if state["status"] != "waiting":
+                    break
+
+                message = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                if message is None:
+                    # no change, but the position may have aged
+                    yield ": keepalive\n\n"
+                    continue
+                version = message["version"]
+        finally:
+            broker.unsubscribe(subscription)
+
+    return event_stream(stream())
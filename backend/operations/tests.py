@@ -1,3 +1,448 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from backend.users.models import GeneralDoctorProfile, PatientProfile, User
+from .models import AppointmentManagement, DoctorAvailability, Notification, PriorityQueue, QueueHistory, QueueManagement
+from . import archive, booking_stress, bookings, patient_search, projections, queue_cache, reminders, slots
+
+
+def make_user(name, role):
+    return User.objects.create_user(
+        email=f"{name}@example.com", password="pass1234", full_name=name.title(), role=role
+    )
+
+
+def make_patient(name):
+    return PatientProfile.objects.create(user=make_user(name, User.Role.PATIENT))
+
+
+def make_doctor(name="doctor"):
+    return GeneralDoctorProfile.objects.create(user=make_user(name, User.Role.DOCTOR), license_number=f"{name}-license")
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class CallNextTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patients = [make_patient(f"patient{i}") for i in range(4)]
+
+    def call_next(self, user, department="OPD"):
+        return client_for(user).post(reverse("queue_call_next"), {"department": department}, format="json")
+
+    def test_patient_cannot_call_next(self):
+        entry = QueueManagement.objects.create(patient=self.patients[0], department="OPD")
+        response = self.call_next(self.patients[1].user)
+        self.assertEqual(response.status_code, 403)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "waiting")
+        self.assertIsNone(entry.served_by_id)
+
+    def test_staff_call_next_claims_entry(self):
+        entry = QueueManagement.objects.create(patient=self.patients[0], department="OPD")
+        response = self.call_next(self.doctor.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], entry.id)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "in_progress")
+        self.assertEqual(entry.served_by_id, self.doctor.user_id)
+        self.assertEqual(self.call_next(self.doctor.user).status_code, 404)
+
+    def test_call_next_interleaves_lanes(self):
+        normal = [QueueManagement.objects.create(patient=patient, department="OPD") for patient in self.patients]
+        appointment = AppointmentManagement.objects.create(
+            patient=self.patients[0], doctor=self.doctor,
+            appointment_date=timezone.now() + timedelta(days=1),
+        )
+        priority = [
+            PriorityQueue.objects.create(
+                appointment_id=appointment, patient=patient, department="OPD", priority_level="pwd"
+            )
+            for patient in self.patients[:3]
+        ]
+        called = []
+        while (response := self.call_next(self.doctor.user)).status_code == 200:
+            called.append((response.data["lane"], response.data["id"]))
+        # two priority patients for every normal one, each lane in its own order
+        expected = ["priority", "priority", "normal", "priority", "normal", "normal", "normal"]
+        self.assertEqual([lane for lane, _ in called], expected)
+        self.assertEqual([entry_id for lane, entry_id in called if lane == "priority"], [entry.id for entry in priority])
+        self.assertEqual([entry_id for lane, entry_id in called if lane == "normal"], [entry.id for entry in normal])
+
+
+class QueueListingTests(TestCase):
+
+    def test_patient_cannot_list_queue(self):
+        patient = make_patient("patient")
+        QueueManagement.objects.create(patient=patient, department="OPD")
+        response = client_for(patient.user).get(reverse("doctor_queue_patients"), {"department": "OPD"})
+        self.assertEqual(response.status_code, 403)
+
+        response = client_for(make_user("nurse", User.Role.NURSE)).get(reverse("doctor_queue_patients"), {"department": "OPD"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["normal_queue"][0]["stream_token"])
+
+
+@mock.patch.object(queue_cache, "seconds_to_next_step", return_value=30)
+@mock.patch.object(queue_cache, "time_step", return_value=1)
+class NotModifiedTests(TestCase):
+    """
+    The time step is pinned, so the ETags only change with the queue.
+    """
+
+    def setUp(self):
+        self.patient = make_patient("patient")
+        QueueManagement.objects.create(patient=self.patient, department="OPD")
+
+    def check_not_modified(self, client, url, params=None):
+        response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        other = make_patient("other")
+        # the version is bumped once the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            QueueManagement.objects.create(patient=other, department="OPD")
+        response = client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_display_board(self, *mocks):
+        self.check_not_modified(self.client, reverse("queue_display_board", args=["OPD"]))
+
+    def test_queue_listing(self, *mocks):
+        nurse = make_user("nurse", User.Role.NURSE)
+        self.check_not_modified(client_for(nurse), reverse("doctor_queue_patients"), {"department": "OPD"})
+
+
+class QueueFlowViewTests(TestCase):
+
+    def setUp(self):
+        self.nurse = make_user("nurse", User.Role.NURSE)
+        self.patient = make_patient("patient")
+
+    def test_patient_cannot_start_or_advance_flows(self):
+        client = client_for(self.patient.user)
+        response = client.post(reverse("queue_flow_start"), {"patient_id": self.patient.id}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        entry = QueueManagement.objects.create(patient=self.patient, department="OPD")
+        response = client.post(reverse("queue_flow_advance"), {"entry_ids": [entry.id]}, format="json")
+        self.assertEqual(response.status_code, 403)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, "waiting")
+
+    def test_flow_start_needs_a_patient(self):
+        client = client_for(self.nurse)
+        doctor = make_doctor()
+        # a profile whose user is not a patient
+        not_patient = PatientProfile.objects.create(user=doctor.user)
+        response = client.post(reverse("queue_flow_start"), {"patient_id": not_patient.id}, format="json")
+        self.assertEqual(response.status_code, 404)
+        response = client.post(reverse("queue_flow_start"), {"patient_id": "x"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        response = client.post(reverse("queue_flow_start"), {"patient_id": self.patient.id}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["department"], "OPD")
+
+
+class ArchiveTests(TestCase):
+
+    def test_archive_moves_finished_entries(self):
+        patients = [make_patient(f"patient{i}") for i in range(3)]
+        entries = [QueueManagement.objects.create(patient=patient, department="OPD") for patient in patients]
+        entries[0].start_service()
+        entries[0].complete_service()
+
+        moved = archive.archive()
+        self.assertEqual(moved, {"normal": 1, "priority": 0})
+        self.assertFalse(QueueManagement.objects.filter(id=entries[0].id).exists())
+        archived = QueueHistory.objects.get(lane="normal", entry_id=entries[0].id)
+        self.assertEqual(archived.status, "completed")
+        self.assertEqual(archived.queue_number, entries[0].queue_number)
+
+        # history reads both sides, newest first
+        rows, next_cursor = archive.history(department="OPD")
+        self.assertIsNone(next_cursor)
+        self.assertEqual([row["entry_id"] for row in rows], [entry.id for entry in reversed(entries)])
+        self.assertEqual([row["archived"] for row in rows], [False, False, True])
+        self.assertEqual(archive.archive(), {"normal": 0, "priority": 0})
+
+
+class ProjectionTests(TestCase):
+
+    def test_rebuild_after_archive(self):
+        patients = [make_patient(f"patient{i}") for i in range(3)]
+        done, drifted, lost = [QueueManagement.objects.create(patient=patient, department="OPD") for patient in patients]
+        done.start_service()
+        done.complete_service()
+        drifted.start_service()
+        self.assertEqual(archive.archive(), {"normal": 1, "priority": 0})
+
+        # changes the event log does not know about
+        QueueManagement.objects.filter(id=drifted.id).update(status="cancelled")
+        archive.delete_rows(QueueManagement, [lost.id])
+
+        summary = projections.rebuild("normal", write=False)
+        self.assertEqual(
+            {key: summary[key] for key in ("entries", "unchanged", "updated", "created", "archived")},
+            {"entries": 3, "unchanged": 0, "updated": 1, "created": 1, "archived": 1},
+        )
+        self.assertFalse(QueueManagement.objects.filter(id=lost.id).exists())
+
+        projections.rebuild("normal")
+        self.assertEqual(QueueManagement.objects.get(id=drifted.id).status, "in_progress")
+        restored = QueueManagement.objects.get(id=lost.id)
+        self.assertEqual((restored.status, restored.queue_number), ("waiting", lost.queue_number))
+        # the archived entry stays in the history table only
+        self.assertFalse(QueueManagement.objects.filter(id=done.id).exists())
+
+        summary = projections.rebuild("normal")
+        self.assertEqual((summary["unchanged"], summary["updated"], summary["created"]), (2, 0, 0))
+
+
+class PaginationTests(TestCase):
+
+    def test_keyset_walk_has_no_duplicates_or_gaps(self):
+        doctor = make_doctor()
+        Notification.objects.bulk_create([Notification(user=doctor.user, message=f"message {i}") for i in range(23)])
+        # ties on created_at, which the id has to break
+        base = timezone.now() - timedelta(hours=1)
+        for notification in Notification.objects.all():
+            Notification.objects.filter(id=notification.id).update(created_at=base + timedelta(minutes=notification.id % 4))
+        expected = list(Notification.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+        client = client_for(doctor.user)
+        seen, cursor, pages = [], None, 0
+        while True:
+            params = {"page_size": 5, **({"cursor": cursor} if cursor else {})}
+            response = client.get(reverse("doctor_notifications"), params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            pages += 1
+            if pages == 2:
+                # a new notification goes to the front and shifts nothing
+                Notification.objects.create(user=doctor.user, message="newer")
+            cursor = response.data["next"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 5)
+
+        response = client.get(reverse("doctor_notifications"), {"cursor": "not a cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+class AppointmentUpdateTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient("patient")
+        self.duration = bookings.default_duration()
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        _, self.start = slots.first_free_slot([self.doctor.id], tomorrow, tomorrow + timedelta(days=14))
+        result, = bookings.book_many(self.doctor.id, [{
+            "patient_id": self.patient.id, "appointment_date": self.start,
+            "appointment_end": self.start + self.duration, "appointment_type": "consultation",
+        }])
+        self.appointment = AppointmentManagement.objects.get(appointment_id=result["appointment_id"])
+
+    def move(self, start, **extra):
+        data = {
+            "appointment_date": start.isoformat(),
+            "appointment_end": (start + self.duration).isoformat(),
+            **extra,
+        }
+        return client_for(self.doctor.user).patch(
+            reverse("appointment_update", args=[self.appointment.appointment_id]), data, format="json"
+        )
+
+    def test_version_is_required_and_checked(self):
+        later = self.start + self.duration
+        self.assertEqual(self.move(later).status_code, 428)
+        response = self.move(later, version=self.appointment.version + 1)
+        self.assertEqual(response.status_code, 409)
+
+        response = self.move(later, version=self.appointment.version)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["version"], self.appointment.version + 1)
+        self.assertEqual(response["ETag"], bookings.appointment_etag(self.appointment.appointment_id, response.data["version"]))
+        # the version read before the move is stale now
+        self.assertEqual(self.move(self.start, version=self.appointment.version).status_code, 409)
+
+    def test_move_needs_an_open_slot(self):
+        lunch = timezone.localtime(self.start).replace(hour=12, minute=0)
+        self.assertEqual(self.move(lunch, version=self.appointment.version).status_code, 409)
+
+        next_day = timezone.localdate(self.start) + timedelta(days=1)
+        _, other_start = slots.first_free_slot([self.doctor.id], next_day, next_day + timedelta(days=14))
+        DoctorAvailability.objects.create(doctor=self.doctor, date=timezone.localdate(other_start))
+        self.assertEqual(self.move(other_start, version=self.appointment.version).status_code, 409)
+
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.appointment_date, self.start)
+
+
+class BulkAppointmentTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patient = make_patient("patient")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        _, self.start = slots.first_free_slot([self.doctor.id], tomorrow, tomorrow + timedelta(days=14))
+
+    def post(self, data):
+        return client_for(self.doctor.user).post(reverse("doctor_create_appointments_bulk"), data, format="json")
+
+    def recur(self, **recurrence):
+        return self.post({
+            "patient_id": self.patient.id,
+            "recurrence": {"start": timezone.localtime(self.start).isoformat(), **recurrence},
+        })
+
+    def test_recurrence_fields_are_validated(self):
+        response = self.recur(count="abc", every_days=0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], {"recurrence": {
+            "count": ["count must be a whole number"],
+            "every_days": ["every_days must be at least 1"],
+        }})
+        response = self.recur(count=bookings.MAX_BATCH_SIZE + 1)
+        self.assertEqual(response.data["errors"]["recurrence"]["count"], [f"count must be between 1 and {bookings.MAX_BATCH_SIZE}"])
+        self.assertEqual(self.recur().data["errors"]["recurrence"]["count"], ["count is required"])
+        self.assertFalse(AppointmentManagement.objects.exists())
+
+        response = self.recur(count="2")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+
+    def test_appointment_fields_are_validated(self):
+        when = timezone.localtime(self.start).isoformat()
+        response = self.post({"appointments": [
+            {"patient_id": self.patient.id, "appointment_date": when},
+            {"patient_id": "x", "appointment_date": "tomorrow", "duration_minutes": -5},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        first, second = response.data["errors"]["appointments"]
+        self.assertEqual(first, {})
+        self.assertEqual(set(second), {"patient_id", "appointment_date", "duration_minutes"})
+        self.assertEqual(self.post({}).data["errors"], {"appointments": ["appointments or recurrence is required"]})
+
+
+class ReminderTests(TestCase):
+
+    def test_send_due_reminds_once(self):
+        doctor = make_doctor()
+        patient = make_patient("patient")
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        _, start = slots.first_free_slot([doctor.id], tomorrow, tomorrow + timedelta(days=14))
+        bookings.book_many(doctor.id, [{
+            "patient_id": patient.id, "appointment_date": start,
+            "appointment_end": start + bookings.default_duration(), "appointment_type": "consultation",
+        }])
+        now = timezone.now()
+        window = start - now + timedelta(hours=1)
+
+        self.assertEqual(reminders.send_due(now, window), 1)
+        notifications = Notification.objects.order_by("user_id")
+        self.assertEqual([n.user_id for n in notifications], sorted([patient.user_id, doctor.user_id]))
+        for notification in notifications:
+            self.assertFalse(notification.is_read)
+            self.assertIsNotNone(notification.created_at)
+            self.assertTrue(notification.message.startswith("Reminder: "))
+        self.assertIn("Dr. Doctor", notifications.get(user=patient.user).message)
+
+        self.assertEqual(reminders.send_due(now, window), 0)
+        self.assertEqual(Notification.objects.count(), 2)
+
+
+class PatientSearchTests(TestCase):
+
+    def test_exact_name_past_the_candidate_cap(self):
+        for i in range(6):
+            make_patient(f"jonathan{i}")
+        # indexed last, so past the first CANDIDATES prefix matches
+        jo = make_patient("jo")
+        with mock.patch.object(patient_search, "CANDIDATES", 5):
+            self.assertEqual(patient_search.search_ids("jo")[0], jo.id)
+            self.assertEqual(len(patient_search.search_ids("jo", limit=20)), 6)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Threads with their own database connections book the same slots of a
+    doctor at the same time (see booking_stress.py). The rows must be
+    committed for the threads to see each other, hence a
+    TransactionTestCase.
+    """
+    THREADS = 8
+
+    def setUp(self):
+        self.doctor = make_doctor()
+        self.patients = [make_patient(f"patient{i}") for i in range(self.THREADS)]
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        _, self.start = slots.first_free_slot([self.doctor.id], tomorrow, tomorrow + timedelta(days=14))
+
+    def book_concurrently(self, spans, use_save):
+        """
+        Every thread books every ``(start, end)`` of ``spans``. Returns the
+        ids of the bookings that succeeded.
+        """
+        bookers = booking_stress.run_bookers(
+            self.doctor.id, {patient.id: spans for patient in self.patients}, use_save
+        )
+        self.assertEqual([failure for booker in bookers for failure in booker.failures], [])
+        return [appointment_id for booker in bookers for appointment_id in booker.booked]
+
+    def assert_no_overlaps(self):
+        stored = list(
+            AppointmentManagement.objects.filter(doctor=self.doctor, status__in=bookings.BOOKED_STATUSES)
+            .order_by("appointment_date")
+            .values_list("appointment_date", "appointment_end")
+        )
+        for (_, previous_end), (start, _) in zip(stored, stored[1:]):
+            self.assertGreaterEqual(start, previous_end)
+        return stored
+
+    def check_one_winner(self, use_save):
+        end = self.start + bookings.default_duration()
+        booked = self.book_concurrently([(self.start, end)], use_save)
+        self.assertEqual(len(booked), 1)
+        self.assertEqual(len(self.assert_no_overlaps()), 1)
+
+    def check_overlapping_spans(self, use_save):
+        duration = bookings.default_duration()
+        # one- and two-slot appointments, overlapping without starting together
+        spans = [
+            (self.start + duration * n, self.start + duration * (n + 1 + n % 2))
+            for n in range(6)
+        ]
+        booked = self.book_concurrently(spans, use_save)
+        stored = self.assert_no_overlaps()
+        self.assertEqual(len(booked), len(stored))
+
+    def test_book_many_one_winner(self):
+        self.check_one_winner(use_save=False)
+
+    def test_save_one_winner(self):
+        self.check_one_winner(use_save=True)
+
+    def test_book_many_no_overlaps(self):
+        self.check_overlapping_spans(use_save=False)
+
+    def test_save_no_overlaps(self):
+        self.check_overlapping_spans(use_save=True)
@@ -1,11 +1,28 @@
 from django.urls import path
-from . import views
+from . import boards, ical, streams, views
 
 urlpatterns = [
     # Dashboard statistics
     path('dashboard/stats/', views.doctor_dashboard_stats, name='doctor_dashboard_stats'),
     path('appointments/', views.doctor_appointments, name='doctor_appointments'),
+    path('appointments/calendar/', views.doctor_appointment_calendar, name='doctor_appointment_calendar'),
+    path('appointments/<int:appointment_id>/', views.appointment_update, name='appointment_update'),
+    path('appointments/feed/', views.doctor_calendar_feed_url, name='doctor_calendar_feed_url'),
+
+    # iCalendar feeds for calendar apps (no login, the signed token is the key)
+    path('calendar/<str:token>.ics', ical.doctor_feed, name='doctor_calendar_feed'),
     path('queue/patients/', views.doctor_queue_patients, name='doctor_queue_patients'),
+    path('queue/call-next/', views.queue_call_next, name='queue_call_next'),
+    path('queue/history/', views.queue_history, name='queue_history'),
+    path('queue/flows/', views.queue_flow_start, name='queue_flow_start'),
+    path('queue/flows/advance/', views.queue_flow_advance, name='queue_flow_advance'),
+
+    # Public lobby display boards (no login, long-poll with ?wait=)
+    path('queue/board/<str:department>/', boards.display_board, name='queue_display_board'),
+
+    # Live queue updates (server-sent events, served under ASGI)
+    path('queue/stream/<str:department>/', streams.department_stream, name='queue_department_stream'),
+    path('queue/stream/entry/<str:token>/', streams.entry_stream, name='queue_entry_stream'),
     path('notifications/', views.doctor_notifications, name='doctor_notifications'),
     # path('pending-assessments/', views.doctor_pending_assessments, name='doctor_pending_assessments'),
     
@@ -13,4 +30,8 @@ urlpatterns = [
     path('blocked-dates/', views.doctor_blocked_dates, name='doctor_blocked_dates'),
     path('block-date/', views.doctor_block_date, name='doctor_block_date'),
     path('create-appointment/', views.doctor_create_appointment, name='doctor_create_appointment'),
+    path('patients/search/', views.patient_typeahead, name='patient_typeahead'),
+    path('appointments/bulk/', views.doctor_create_appointments_bulk, name='doctor_create_appointments_bulk'),
+    path('doctors/<int:doctor_id>/slots/', views.doctor_free_slots, name='doctor_free_slots'),
+    path('slots/first-free/', views.first_free_slot, name='first_free_slot'),
 ]
@@ -4,12 +4,49 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Count, Q
+from django.urls import reverse
 from django.utils import timezone
 from datetime import datetime, timedelta
 
 from .models import AppointmentManagement, QueueManagement, PriorityQueue, Notification, Messaging, DoctorAvailability
-from backend.users.models import User
+from backend import pagination
+from backend.users.models import GeneralDoctorProfile, PatientProfile, User
 from .serializers import DashboardStatsSerializer
+from . import appointment_calendar, archive, bookings, flows, ical, patient_search, queue_cache, scheduler, slots, streams
+from .estimates import DepartmentSnapshot
+
+STAFF_ROLES = (User.Role.DOCTOR, User.Role.NURSE, User.Role.ADMIN)
+
+def staff_only(request, action):
+    """
+    403 response for users who are not doctors, nurses or admins, else None
+    """
+    if request.user.role not in STAFF_ROLES:
+        return Response({
+            'error': f'Only staff can {action}'
+        }, status=status.HTTP_403_FORBIDDEN)
+    return None
+
+def whole_number(data, field, errors, default=None, maximum=None):
+    """
+    data[field], or default when it is missing, as a whole number from 1 to maximum.
+    Adds a message to errors[field] and returns None when it is not one
+    """
+    value = data.get(field, default)
+    if value in (None, ''):
+        errors[field] = [f'{field} is required']
+        return None
+    if isinstance(value, int) and not isinstance(value, bool):
+        number = value
+    elif isinstance(value, str) and value.strip().isdigit():
+        number = int(value)
+    else:
+        errors[field] = [f'{field} must be a whole number']
+        return None
+    if number < 1 or (maximum is not None and number > maximum):
+        errors[field] = [f'{field} must be between 1 and {maximum}' if maximum else f'{field} must be at least 1']
+        return None
+    return number
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -44,7 +81,8 @@ def doctor_dashboard_stats(request):
         
         # Priority queue - patients with special needs
         priority_queue = PriorityQueue.objects.filter(
-            department='OPD'
+            department='OPD',
+            status='waiting'
         ).count()
         
         total_patients = normal_queue + priority_queue
@@ -81,19 +119,43 @@ def doctor_dashboard_stats(request):
 def doctor_appointments(request):
     """
     Get appointments for the current doctor
+    - year and month, or start and end (YYYY-MM-DD), select a date range
+    - Without a range, every appointment from today on
+    - Pages of page_size (default 100, at most 500) in date order, the next one with cursor
     """
     try:
-        doctor = request.user
-        today = timezone.now().date()
-        
-        appointments = AppointmentManagement.objects.filter(
-            doctor__user=doctor,
-            appointment_date__date__gte=today
-        ).order_by('appointment_date')
+        doctor_profile = getattr(request.user, 'doctor_profile', None)
+        if doctor_profile is None:
+            return Response(pagination.page([], None), status=status.HTTP_200_OK)
+
+        try:
+            date_range = appointment_calendar.requested_range(request.query_params)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if date_range:
+            appointments = appointment_calendar.appointments_between(doctor_profile.id, *date_range)
+        else:
+            appointments = AppointmentManagement.objects.filter(
+                doctor_id=doctor_profile.id,
+                appointment_date__gte=appointment_calendar.local_midnight(timezone.localdate())
+            )
+        try:
+            appointments, next_cursor = pagination.paginate(
+                appointments.select_related('patient__user', 'doctor__user'),
+                request.query_params, ('appointment_date', 'appointment_id'),
+                default_size=100, max_size=500,
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         from .serializers import AppointmentSerializer
         serializer = AppointmentSerializer(appointments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(pagination.page(serializer.data, next_cursor), status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
@@ -102,53 +164,367 @@ def doctor_appointments(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def doctor_queue_patients(request):
+def doctor_appointment_calendar(request):
     """
-    Get patients in queue for the current doctor
+    Per-day appointment counts of the current doctor for a calendar grid
+    - year and month, or start and end (YYYY-MM-DD); defaults to this month
+    - Each day has its total and counts by status and by type
     """
     try:
-        # Get normal queue patients
-        normal_queue = QueueManagement.objects.filter(
-            department='OPD',
-            status='waiting'
-        ).order_by('position_in_queue')
-        
-        # Get priority queue patients
-        priority_queue = PriorityQueue.objects.filter(
-            department='OPD'
-        ).order_by('priority_position')
-        
-        from .serializers import QueueSerializer, PriorityQueueSerializer
-        
-        normal_serializer = QueueSerializer(normal_queue, many=True)
-        priority_serializer = PriorityQueueSerializer(priority_queue, many=True)
-        
+        try:
+            date_range = appointment_calendar.requested_range(request.query_params)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if date_range is None:
+            today = timezone.localdate()
+            date_range = appointment_calendar.month_range(today.year, today.month)
+        start, end = date_range
+
+        doctor_profile = getattr(request.user, 'doctor_profile', None)
+        days = appointment_calendar.day_counts(doctor_profile.id if doctor_profile else None, start, end)
+        return Response({
+            'start': start.isoformat(),
+            'end': (end - timedelta(days=1)).isoformat(),
+            'total': sum(day['total'] for day in days),
+            'days': days,
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to fetch appointment calendar: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def doctor_calendar_feed_url(request):
+    """
+    Address of the current doctor's iCalendar feed, to subscribe to from a calendar app
+    - POST generates a new address, the old one stops working
+    """
+    try:
+        doctor_profile = getattr(request.user, 'doctor_profile', None)
+        if doctor_profile is None:
+            return Response({
+                'error': 'Only doctors have a calendar feed'
+            }, status=status.HTTP_403_FORBIDDEN)
+        secret = ical.feed_secret(doctor_profile.id, regenerate=request.method == 'POST')
+        path = reverse('doctor_calendar_feed', args=[ical.feed_token(doctor_profile.id, secret)])
         return Response({
-            'normal_queue': normal_serializer.data,
-            'priority_queue': priority_serializer.data
+            'url': request.build_absolute_uri(path)
         }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to get calendar feed: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def queue_patients_payload(department):
+    """
+    Serialized normal, priority and merged queues of a department
+    """
+    # one snapshot of the department in service order, with the estimated
+    # wait of every patient computed in a single pass
+    snapshot = DepartmentSnapshot.take(department)
+    context = {
+        'estimated_waits': snapshot.wait_by_entry(),
+        'estimated_wait_ranges': snapshot.range_by_entry(),
+    }
+
+    # Get normal queue patients
+    normal_queue = [entry for lane, entry in snapshot.order if lane == 'normal']
+    
+    # Get priority queue patients
+    priority_queue = [entry for lane, entry in snapshot.order if lane == 'priority']
+    
+    from .serializers import QueueSerializer, PriorityQueueSerializer, ScheduledPatientSerializer
+    
+    normal_serializer = QueueSerializer(normal_queue, many=True, context=context)
+    priority_serializer = PriorityQueueSerializer(priority_queue, many=True, context=context)
+
+    # merged service order, the first entry is who call-next will claim
+    next_patients = [
+        {'lane': lane, 'order': order, 'entry': entry}
+        for order, (lane, entry) in enumerate(snapshot.order[:10], start=1)
+    ]
+    
+    return {
+        'normal_queue': normal_serializer.data,
+        'priority_queue': priority_serializer.data,
+        'next_patients': ScheduledPatientSerializer(next_patients, many=True, context=context).data
+    }
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def doctor_queue_patients(request):
+    """
+    Get patients in queue for the current doctor
+    - Answers If-None-Match with 304 while the department queue is unchanged
+    - Otherwise serves the listing cached for the current queue version
+    - Pages of page_size (default 100, at most 500) of each queue in service order, the next one with cursor
+    - Staff only, the entries carry the stream tokens to hand to their patients
+    """
+    try:
+        forbidden = staff_only(request, 'list queue patients')
+        if forbidden:
+            return forbidden
+        department = request.query_params.get('department', 'OPD')
+        if department not in dict(QueueManagement._meta.get_field('department').choices):
+            return Response({
+                'error': 'Invalid department'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = pagination.page_size(request.query_params, default=100, maximum=500)
+            cursor = request.query_params.get('cursor')
+            normal_start, priority_start = pagination.decode_cursor(cursor, keys=('normal', 'priority')) if cursor else (0, 0)
+            if not all(isinstance(start, int) and start >= 0 for start in (normal_start, priority_start)):
+                raise ValueError('Invalid cursor')
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        version = queue_cache.get_version(department)
+        etag = queue_cache.etag(department, version)
+        if queue_cache.etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        version, payload = queue_cache.cached_snapshot(
+            'patients', department, lambda: queue_patients_payload(department), version=version
+        )
+        # the waits need the whole queue, so pages are slices of the cached
+        # snapshot by service position rather than database reads
+        normal_end, priority_end = normal_start + size, priority_start + size
+        more = normal_end < len(payload['normal_queue']) or priority_end < len(payload['priority_queue'])
+        payload = {
+            **payload,
+            'normal_queue': payload['normal_queue'][normal_start:normal_end],
+            'priority_queue': payload['priority_queue'][priority_start:priority_end],
+            'next': pagination.encode_cursor([normal_end, priority_end]) if more else None,
+        }
+        return Response(payload, status=status.HTTP_200_OK, headers={
+            'ETag': etag,
+            'Cache-Control': 'private, no-cache',
+        })
         
     except Exception as e:
         return Response({
             'error': f'Failed to fetch queue patients: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def queue_call_next(request):
+    """
+    Call the next patient of a department (normal and priority queues merged)
+    and claim them for the current user
+    """
+    try:
+        forbidden = staff_only(request, 'call patients')
+        if forbidden:
+            return forbidden
+        department = request.data.get('department', 'OPD')
+        if department not in dict(QueueManagement._meta.get_field('department').choices):
+            return Response({
+                'error': 'Invalid department'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        called = scheduler.call_next(department, user=request.user)
+        if called is None:
+            return Response({
+                'message': 'No patients waiting'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        lane, entry = called
+        from .serializers import ScheduledPatientSerializer
+        serializer = ScheduledPatientSerializer({'lane': lane, 'order': 1, 'entry': entry})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to call next patient: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def queue_flow_start(request):
+    """
+    Start a patient flow (e.g. OPD -> Billing -> Pharmacy) and queue the
+    patient at its first stage
+    """
+    try:
+        forbidden = staff_only(request, 'start patient flows')
+        if forbidden:
+            return forbidden
+        flow = request.data.get('flow', 'outpatient')
+        if flow not in flows.get_flows():
+            return Response({
+                'error': 'Invalid flow'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            patient_id = int(request.data.get('patient_id'))
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'patient_id is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        patient = PatientProfile.objects.select_related('user').filter(
+            id=patient_id, user__role=User.Role.PATIENT
+        ).first()
+        if patient is None:
+            return Response({
+                'error': 'Patient not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        patient_flow, entry = flows.start(patient, flow)
+
+        from .serializers import PatientFlowSerializer
+        return Response({
+            'flow': PatientFlowSerializer(patient_flow).data,
+            'queue_number': entry.queue_number,
+            'department': entry.department,
+            'stream_token': streams.entry_token(entry.department, 'normal', entry.id),
+        }, status=status.HTTP_201_CREATED)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to start patient flow: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def queue_flow_advance(request):
+    """
+    Complete the current stage of one or more queue entries and queue each
+    patient at their next stage, all in one transaction
+    - entry_ids: queue entries to complete (up to 500)
+    - to: optional next department, when the stage allows several
+    """
+    try:
+        forbidden = staff_only(request, 'advance patient flows')
+        if forbidden:
+            return forbidden
+        entry_ids = request.data.get('entry_ids') or []
+        try:
+            if not isinstance(entry_ids, list) or not entry_ids or len(entry_ids) > 500:
+                raise ValueError
+            entry_ids = [int(entry_id) for entry_id in entry_ids]
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'entry_ids must be a list of 1 to 500 queue entry ids'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = list(QueueManagement.objects.filter(id__in=entry_ids))
+        found = {entry.id for entry in entries}
+        missing = [entry_id for entry_id in entry_ids if entry_id not in found]
+        if missing:
+            return Response({
+                'error': f'Queue entries not found: {missing}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            next_entries = flows.advance_many(entries, to=request.data.get('to'))
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {
+                'entry_id': entry.id,
+                'next_department': next_entry.department if next_entry else None,
+                'next_queue_number': next_entry.queue_number if next_entry else None,
+                'flow_completed': next_entry is None,
+            }
+            for entry, next_entry in zip(entries, next_entries)
+        ]
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to advance patient flows: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def queue_history(request):
+    """
+    Queue entries of both queues, active and archived, newest first
+    - Filters: department, patient, status, start and end (YYYY-MM-DD)
+    - Pages of page_size (default 100, at most 500), the next one with cursor
+    - Patients only see their own entries
+    """
+    try:
+        params = request.query_params
+        department = params.get('department')
+        if department and department not in dict(QueueManagement._meta.get_field('department').choices):
+            return Response({
+                'error': 'Invalid department'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        dates = {}
+        for name in ('start', 'end'):
+            if params.get(name):
+                try:
+                    dates[name] = datetime.strptime(params[name], '%Y-%m-%d').date()
+                except ValueError:
+                    return Response({
+                        'error': f'Invalid {name} date, use YYYY-MM-DD'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            size = pagination.page_size(params, default=100, maximum=500)
+            cursor = archive.decode_history_cursor(params['cursor']) if params.get('cursor') else None
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        patient_id = params.get('patient')
+        if request.user.role == User.Role.PATIENT:
+            patient_id = getattr(getattr(request.user, 'patient_profile', None), 'id', None)
+            if patient_id is None:
+                return Response(pagination.page([], None), status=status.HTTP_200_OK)
+
+        entries, next_cursor = archive.history(
+            department=department,
+            patient_id=patient_id,
+            status=params.get('status'),
+            limit=size,
+            after=cursor,
+            **dates,
+        )
+        return Response(pagination.page(entries, next_cursor), status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to fetch queue history: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def doctor_notifications(request):
     """
-    Get notifications for the current doctor
+    Get notifications for the current doctor, newest first
+    - Pages of page_size (default 10, at most 100), the next one with cursor
     """
     try:
         doctor = request.user
         
-        notifications = Notification.objects.filter(
-            user=doctor
-        ).order_by('-created_at')[:10]  # Get last 10 notifications
+        try:
+            notifications, next_cursor = pagination.paginate(
+                Notification.objects.filter(user=doctor), request.query_params,
+                ('created_at', 'id'), descending=True, default_size=10, max_size=100,
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
         
         from .serializers import NotificationSerializer
         serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(pagination.page(serializer.data, next_cursor), status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
@@ -247,39 +623,70 @@ def doctor_create_appointment(request):
     try:
         doctor = request.user
         
-        # Get patient by name (in a real app, you'd have patient selection)
+        # Patient picked from the search (patients/search/), by id
+        patient_id = request.data.get('patient_id')
         patient_name = request.data.get('patient_name')
         appointment_date = request.data.get('appointment_date')
         appointment_type = request.data.get('appointment_type', 'consultation')
         notes = request.data.get('notes', '')
         
-        if not all([patient_name, appointment_date]):
+        if not (patient_id or patient_name) or not appointment_date:
             return Response({
-                'error': 'Patient name and appointment date are required'
+                'error': 'Patient and appointment date are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # For now, create a mock patient or find existing one
-        # In a real app, you'd have proper patient selection
-        from backend.users.models import PatientProfile
-        
-        # Try to find existing patient or create a placeholder
-        patient_profile = PatientProfile.objects.filter(
-            user__full_name__icontains=patient_name
-        ).first()
+        if patient_id:
+            patient_profile = PatientProfile.objects.filter(id=patient_id).first()
+        else:
+            # a name is only accepted when it matches exactly one patient
+            matches = patient_search.search(patient_name, limit=5)
+            exact = [profile for profile in matches if profile.user.full_name.casefold() == patient_name.strip().casefold()]
+            if len(exact) == 1:
+                matches = exact
+            if len(matches) > 1:
+                return Response({
+                    'error': 'Several patients match this name, book by patient_id',
+                    'matches': [
+                        {'id': profile.id, 'full_name': profile.user.full_name, 'email': profile.user.email}
+                        for profile in matches
+                    ]
+                }, status=status.HTTP_400_BAD_REQUEST)
+            patient_profile = matches[0] if matches else None
         
         if not patient_profile:
             return Response({
                 'error': 'Patient not found. Please ensure the patient is registered.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create appointment
-        appointment = AppointmentManagement.objects.create(
-            patient=patient_profile,
-            doctor=doctor.doctor_profile,
-            appointment_date=appointment_date,
-            appointment_type=appointment_type,
-            status='scheduled'
-        )
+        try:
+            appointment_date = bookings.parse_appointment_date(appointment_date)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if appointment_date < timezone.now():
+            return Response({
+                'error': 'Appointment date cannot be in the past'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if not slots.is_free(doctor.doctor_profile.id, appointment_date):
+            return Response({
+                'error': 'The doctor has no free slot at this time'
+            }, status=status.HTTP_409_CONFLICT)
+
+        # Create appointment, refused when it overlaps another one of the doctor
+        try:
+            appointment = AppointmentManagement.objects.create(
+                patient=patient_profile,
+                doctor=doctor.doctor_profile,
+                appointment_date=appointment_date,
+                appointment_type=appointment_type,
+                status='scheduled'
+            )
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Appointment created successfully',
@@ -289,4 +696,288 @@ def doctor_create_appointment(request):
     except Exception as e:
         return Response({
             'error': f'Failed to create appointment: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def doctor_create_appointments_bulk(request):
+    """
+    Create several appointments for the current doctor in one transaction
+    - appointments: list of {patient_id, appointment_date, appointment_type}
+    - or recurrence: {start, count, every_days (default 7)} for one patient
+    - patient_id, appointment_type and duration_minutes at the top level are the defaults
+    - all_or_nothing: create nothing unless every appointment can be booked
+    - Returns one result per appointment, or 400 with errors per field (per appointment under appointments)
+    """
+    try:
+        doctor_profile = getattr(request.user, 'doctor_profile', None)
+        if doctor_profile is None:
+            return Response({
+                'error': 'Only doctors can book appointments'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        data = request.data
+        # field -> messages, like a serializer's errors
+        errors = {}
+        defaults = {'appointment_type': data.get('appointment_type', 'consultation')}
+        for field in ('patient_id', 'duration_minutes'):
+            defaults[field] = whole_number(data, field, errors) if data.get(field) not in (None, '') else None
+
+        items = []
+        if data.get('recurrence'):
+            recurrence = data['recurrence']
+            recurrence_errors = {}
+            if not isinstance(recurrence, dict):
+                errors['recurrence'] = ['recurrence must be an object with start, count and every_days']
+            else:
+                count = whole_number(recurrence, 'count', recurrence_errors, maximum=bookings.MAX_BATCH_SIZE)
+                every_days = whole_number(recurrence, 'every_days', recurrence_errors, default=7)
+                try:
+                    start = bookings.parse_appointment_date(recurrence.get('start'))
+                except ValueError as e:
+                    recurrence_errors['start'] = [str(e)]
+                if recurrence_errors:
+                    errors['recurrence'] = recurrence_errors
+                else:
+                    items = [
+                        {**defaults, 'appointment_date': date}
+                        for date in bookings.recurrence_dates(start, count, every_days)
+                    ]
+            if defaults['patient_id'] is None and 'patient_id' not in errors:
+                errors['patient_id'] = ['patient_id is required']
+        elif isinstance(data.get('appointments'), list) and data['appointments']:
+            item_errors = []
+            for appointment in data['appointments']:
+                errors_here = {}
+                if not isinstance(appointment, dict):
+                    item_errors.append({'non_field_errors': ['Each appointment must be an object']})
+                    continue
+                item = {**defaults, 'appointment_type': appointment.get('appointment_type', defaults['appointment_type'])}
+                for field in ('patient_id', 'duration_minutes'):
+                    if appointment.get(field) not in (None, ''):
+                        item[field] = whole_number(appointment, field, errors_here)
+                if item['patient_id'] is None and 'patient_id' not in errors_here and 'patient_id' not in errors:
+                    errors_here['patient_id'] = ['patient_id is required']
+                try:
+                    item['appointment_date'] = bookings.parse_appointment_date(appointment.get('appointment_date'))
+                except ValueError as e:
+                    errors_here['appointment_date'] = [str(e)]
+                item_errors.append(errors_here)
+                items.append(item)
+            if any(item_errors):
+                errors['appointments'] = item_errors
+        else:
+            errors['appointments'] = ['appointments or recurrence is required']
+
+        if errors:
+            return Response({
+                'error': 'Invalid appointments',
+                'errors': errors,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        for item in items:
+            duration = item.pop('duration_minutes')
+            if duration is not None:
+                item['appointment_end'] = item['appointment_date'] + timedelta(minutes=duration)
+        try:
+            results = bookings.book_many(doctor_profile.id, items, all_or_nothing=bool(data.get('all_or_nothing')))
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        created = sum(result['status'] == 'created' for result in results)
+        return Response({
+            'created': created,
+            'rejected': len(results) - created,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_409_CONFLICT)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to create appointments: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def appointment_update(request, appointment_id):
+    """
+    Change an appointment's status, type or time
+    - The version read with the appointment goes in the body as version, or as its ETag in If-Match
+    - 409 when the appointment changed since, or its new time is taken, outside the doctor's hours or on a blocked date
+    - Doctors change their own appointments, nurses and admins any appointment
+    """
+    try:
+        if request.user.role == User.Role.DOCTOR:
+            doctor_profile = getattr(request.user, 'doctor_profile', None)
+            if doctor_profile is None:
+                return Response({
+                    'error': 'Doctor profile not found'
+                }, status=status.HTTP_403_FORBIDDEN)
+            doctor_id = doctor_profile.id
+        elif request.user.role in (User.Role.NURSE, User.Role.ADMIN):
+            doctor_id = None
+        else:
+            return Response({
+                'error': 'Only staff can change appointments'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        data = {key: request.data[key] for key in request.data}
+        try:
+            version = data.pop('version', None)
+            if version is not None:
+                version = int(version)
+            elif request.headers.get('If-Match'):
+                version = bookings.version_from_etag(appointment_id, request.headers['If-Match'])
+            for field in ('appointment_date', 'appointment_end'):
+                if field in data:
+                    data[field] = bookings.parse_appointment_date(data[field])
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if version is None:
+            return Response({
+                'error': 'version or If-Match is required'
+            }, status=status.HTTP_428_PRECONDITION_REQUIRED)
+
+        try:
+            version = bookings.update_appointment(appointment_id, data, version, doctor_id=doctor_id)
+        except AppointmentManagement.DoesNotExist:
+            return Response({
+                'error': 'Appointment not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        except bookings.Conflict as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'message': 'Appointment updated successfully',
+            'appointment_id': appointment_id,
+            'version': version,
+        }, status=status.HTTP_200_OK, headers={'ETag': bookings.appointment_etag(appointment_id, version)})
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to update appointment: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def doctor_free_slots(request, doctor_id):
+    """
+    Free appointment slots of a doctor, per day
+    - start (YYYY-MM-DD, default today) and days (default 30)
+    """
+    try:
+        if not GeneralDoctorProfile.objects.filter(id=doctor_id).exists():
+            return Response({
+                'error': 'Doctor not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        try:
+            start, end = slots.requested_window(request.query_params)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        free = slots.free_slots(doctor_id, start, end)
+        return Response({
+            'doctor_id': doctor_id,
+            'slot_minutes': slots.slot_minutes(),
+            'days': [
+                {'date': day.isoformat(), 'slots': [timezone.localtime(slot).strftime('%H:%M') for slot in day_slots]}
+                for day, day_slots in free.items()
+            ],
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to fetch free slots: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def first_free_slot(request):
+    """
+    Earliest free slot of any available doctor with a specialization
+    - specialization (required), start (YYYY-MM-DD, default today) and days (default 30)
+    """
+    try:
+        specialization = request.query_params.get('specialization')
+        if not specialization:
+            return Response({
+                'error': 'Specialization is required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = slots.requested_window(request.query_params)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        doctor_ids = list(GeneralDoctorProfile.objects.filter(
+            specialization__iexact=specialization,
+            available_for_consultation=True
+        ).values_list('id', flat=True))
+        found = slots.first_free_slot(doctor_ids, start, end) if doctor_ids else None
+        if found is None:
+            return Response({
+                'error': f'No free {specialization} slot in this period'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        doctor_id, slot = found
+        doctor = GeneralDoctorProfile.objects.select_related('user').get(id=doctor_id)
+        return Response({
+            'doctor_id': doctor_id,
+            'doctor_name': doctor.user.full_name,
+            'specialization': doctor.specialization,
+            'start': timezone.localtime(slot).isoformat(),
+            'slot_minutes': slots.slot_minutes(),
+        }, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to find a free slot: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def patient_typeahead(request):
+    """
+    Patients whose name or email words start with the words typed so far, best match first
+    - q: the text typed so far, limit (default 10, at most 20)
+    - Staff only
+    """
+    try:
+        if request.user.role == User.Role.PATIENT:
+            return Response({
+                'error': 'Only staff can search patients'
+            }, status=status.HTTP_403_FORBIDDEN)
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({
+                'error': 'Invalid limit'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        patients = patient_search.search(request.query_params.get('q', ''), limit)
+        return Response([
+            {
+                'id': profile.id,
+                'full_name': profile.user.full_name,
+                'email': profile.user.email,
+                'date_of_birth': profile.user.date_of_birth,
+            }
+            for profile in patients
+        ], status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({
+            'error': f'Failed to search patients: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,197 @@
+"""
+Time-of-day aware wait estimates.
+
+Service times at 9am and at 3pm differ a lot, so one running average per
+department misjudges waits for most of the day. ``rebuild`` turns the
+completed entries of the last weeks (archived and still in the queue
+tables) into p50/p90 service times per department, weekday and hour. It
+streams the rows in chunks into fixed-width histograms, so memory does not
+grow with the history. The table is read once into the cache; a lookup is a
+dict access.
+
+A wait is the sum of the service times of everyone ahead, each taken from
+the bucket of the hour it is expected to start in. The range runs from the
+sum of medians to that plus the combined p90 spread, which grows with the
+square root of the number of patients ahead as independent services do.
+Buckets with too few samples fall back to the department's running
+statistics (ServiceTimeStats).
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import QueueHistory, ServiceTimeQuantile, ServiceTimeStats
+from . import scheduler
+
+# histogram resolution, longer services share the last bin
+BIN_SECONDS = 15
+MAX_BINS = 4 * 60 * 60 // BIN_SECONDS
+# fewer services than this in a bucket are not trusted
+MIN_SAMPLES = 10
+# p90 of a normal distribution, used to derive a spread from the running stats
+Z90 = 1.2816
+
+TABLE_KEY = "queue:service-quantiles"
+TABLE_TIMEOUT = 24 * 60 * 60
+
+
+def completed_services(since, chunk_size=5000):
+    """
+    ``(department, started_at, finished_at)`` of every service completed
+    since ``since``, archived or not.
+    """
+    sources = [
+        QueueHistory.objects.filter(status="completed", finished_at__gte=since),
+        *(
+            model.objects.filter(status="completed", finished_at__gte=since)
+            for model in scheduler.LANES.values()
+        ),
+    ]
+    for queryset in sources:
+        rows = queryset.filter(started_at__isnull=False).values_list("department", "started_at", "finished_at")
+        yield from rows.iterator(chunk_size=chunk_size)
+
+
+def histograms(rows, chunk_size=5000):
+    """
+    ``{(department, weekday, hour): Counter(bin: count)}`` of the rows,
+    folded in one chunk at a time.
+    """
+    counts = Counter()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        starts = [timezone.localtime(started_at) for _, started_at, _ in chunk]
+        bins = [
+            min(int((finished_at - started_at).total_seconds()) // BIN_SECONDS, MAX_BINS)
+            for _, started_at, finished_at in chunk
+        ]
+        counts.update(
+            (department, start.weekday(), start.hour, bin_)
+            for (department, _, _), start, bin_ in zip(chunk, starts, bins)
+            if bin_ >= 0
+        )
+
+    buckets = defaultdict(Counter)
+    for (department, weekday, hour, bin_), count in counts.items():
+        buckets[(department, weekday, hour)][bin_] = count
+    return buckets
+
+
+def quantile(histogram, q):
+    """
+    Quantile of a binned distribution, at the middle of the bin it falls in.
+    """
+    target = q * sum(histogram.values())
+    seen = 0
+    for bin_ in sorted(histogram):
+        seen += histogram[bin_]
+        if seen >= target:
+            return (bin_ + 0.5) * BIN_SECONDS
+    return (max(histogram) + 0.5) * BIN_SECONDS
+
+
+def rebuild(weeks=12, chunk_size=5000):
+    """
+    Replace the quantile table with one built from the last ``weeks`` of
+    completed services. Returns the number of buckets written.
+    """
+    since = timezone.now() - timedelta(weeks=weeks)
+    buckets = histograms(completed_services(since, chunk_size), chunk_size)
+    built_at = timezone.now()
+    rows = [
+        ServiceTimeQuantile(
+            department=department,
+            weekday=weekday,
+            hour=hour,
+            sample_count=sum(histogram.values()),
+            p50_seconds=quantile(histogram, 0.5),
+            p90_seconds=quantile(histogram, 0.9),
+            built_at=built_at,
+        )
+        for (department, weekday, hour), histogram in buckets.items()
+    ]
+    with transaction.atomic():
+        ServiceTimeQuantile.objects.all().delete()
+        ServiceTimeQuantile.objects.bulk_create(rows, batch_size=500)
+    cache.delete(TABLE_KEY)
+    return len(rows)
+
+
+def load_table():
+    return {
+        (department, weekday, hour): (p50, p90)
+        for department, weekday, hour, p50, p90 in ServiceTimeQuantile.objects.filter(
+            sample_count__gte=MIN_SAMPLES
+        ).values_list("department", "weekday", "hour", "p50_seconds", "p90_seconds")
+    }
+
+
+def get_table():
+    """
+    ``{(department, weekday, hour): (p50, p90)}`` of the trusted buckets,
+    read from the database at most once per build and cache timeout.
+    """
+    return cache.get_or_set(TABLE_KEY, load_table, TABLE_TIMEOUT)
+
+
+def fallback_quantiles(stats):
+    """
+    (p50, p90) in seconds from a department's running statistics.
+    """
+    if stats is None or not stats.sample_count:
+        p50 = ServiceTimeStats.DEFAULT_SERVICE_TIME.total_seconds()
+        # no spread known yet
+        return p50, p50 * 1.5
+    p50 = stats.service_time.total_seconds()
+    return p50, p50 + Z90 * stats.stdev_seconds
+
+
+class WaitModel:
+    """
+    Service time quantiles of one department, looked up by the time a
+    service starts.
+    """
+
+    def __init__(self, department, table, stats):
+        self.department = department
+        self.table = table
+        self.fallback = fallback_quantiles(stats)
+
+    @classmethod
+    def for_department(cls, department):
+        return cls(department, get_table(), ServiceTimeStats.objects.filter(department=department).first())
+
+    def quantiles_at(self, when):
+        local = timezone.localtime(when)
+        return self.table.get((self.department, local.weekday(), local.hour), self.fallback)
+
+    def wait_ranges(self, count, ahead=0, now=None):
+        """
+        ``(p50, p90)`` waits of ``count`` consecutive patients, the first of
+        whom has ``ahead`` services before them, in one pass.
+        """
+        now = now or timezone.now()
+        median = 0.0
+        spread = 0.0
+        ranges = []
+        for position in range(ahead + count):
+            if position >= ahead:
+                ranges.append((
+                    timedelta(seconds=median),
+                    timedelta(seconds=median + math.sqrt(spread)),
+                ))
+            p50, p90 = self.quantiles_at(now + timedelta(seconds=median))
+            median += p50
+            spread += (p90 - p50) ** 2
+        return ranges
+
+    def wait_range(self, ahead, now=None):
+        return self.wait_ranges(1, ahead, now)[0]
@@ -125,6 +125,19 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Queue versions and cached listings live here. The local-memory default is
+# per process; set CACHE_BACKEND/CACHE_LOCATION to a shared cache (e.g.
+# django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "medisync"),
+    }
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -218,4 +231,55 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
-DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
\ No newline at end of file
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
+
+# Queue management
+# Queue numbers are reserved from a per-department daily counter. Workers can
+# reserve them in blocks to touch the counter row less often (see
+# backend/operations/sequences.py); numbers left in a block are skipped.
+QUEUE_NUMBER_BLOCK_SIZE = int(os.getenv("QUEUE_NUMBER_BLOCK_SIZE", "1"))
+
+# How many patients each lane gets in a row when the normal and priority
+# (PWD/senior) queues are merged into one service order.
+QUEUE_INTERLEAVE_WEIGHTS = {"priority": 2, "normal": 1}
+
+# Aging of the priority queue: a waiting patient's effective priority is the
+# level's head start in minutes plus minutes waited times the level's rate,
+# so nobody is passed over indefinitely by a later arrival of another level.
+QUEUE_PRIORITY_AGING = {
+    "senior": {"base": 5, "rate": 1.0},
+    "pwd": {"base": 0, "rate": 1.0},
+}
+
+# A lane whose first patient has waited this many minutes gets the next call
+# whatever the interleave weights say. None disables the bound.
+QUEUE_LANE_MAX_WAIT_MINUTES = 60
+
+# The order above changes as time passes, so cached queue listings and their
+# ETags are renewed at least this often (see backend/operations/queue_cache.py).
+QUEUE_SNAPSHOT_STEP_SECONDS = 60
+
+# Patient flows: the department stages a patient goes through, each listing
+# where they can go next (the first is the default). Completing a stage
+# queues the patient at the next one (see backend/operations/flows.py).
+QUEUE_FLOWS = {
+    "outpatient": {"OPD": ["Billing"], "Billing": ["Pharmacy"], "Pharmacy": []},
+    "appointment": {"Appointment": ["OPD"], "OPD": ["Billing"], "Billing": ["Pharmacy"], "Pharmacy": []},
+}
+
+# Doctor appointment slots (see backend/operations/slots.py): the length of a
+# slot, and the working hours per weekday (0 = Monday) of doctors that have no
+# DoctorWorkingHours rows.
+APPOINTMENT_SLOT_MINUTES = 30
+APPOINTMENT_DEFAULT_WORKING_HOURS = {
+    weekday: [("08:00", "12:00"), ("13:00", "17:00")] for weekday in range(5)
+}
+
+# How far ahead appointment reminders go out (see backend/operations/reminders.py).
+APPOINTMENT_REMINDER_HOURS = 24
+
+# Broker that fans queue changes out to the live queue streams. The in-process
+# broker only reaches streams served by the same ASGI worker; swap in a class
+# with the same subscribe/unsubscribe/publish methods backed by an external
+# pub/sub to share events between workers.
+QUEUE_EVENT_BROKER = "backend.operations.events.InProcessBroker"